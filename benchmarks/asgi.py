@@ -0,0 +1,188 @@
+"""
+Load test: the read-heavy endpoints served by the WSGI handler with the sync
+views vs the ASGI handler with the sync views (each run in a worker thread)
+and with the async views.
+
+Builds a synthetic graph in a SQLite file, then replays the same mix of
+feed, post list, post detail and comment list requests against each
+deployment in its own process, with N requests in flight at once: a pool of
+N threads calling the WSGI application (like gunicorn with N threads) or N
+concurrent tasks on one event loop calling the ASGI application (like a
+single uvicorn worker). The servers are driven in-process, so the numbers
+measure Django and the views rather than an HTTP stack.
+
+SQLite answers in microseconds where MySQL needs a network round trip;
+--db-latency adds that much wall time (time.sleep, which releases the GIL
+like a socket wait) to every statement.
+
+    python -m benchmarks.asgi --requests 2000 --concurrency 32 --db-latency 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import setup, summarize, timed, wrap_queries, wsgi_environ, call_wsgi
+
+MODES = ('wsgi', 'asgi_sync_views', 'asgi')
+
+
+#build the graph in the database file and return the request mix as (path, query, token) triples
+def prepare(args):
+    from rest_framework.authtoken.models import Token
+    from posts.models import Post, Comment
+    from posts import threads
+    from users.models import User
+    from benchmarks import graph
+
+    shape = graph.generate(users=args.users, posts=args.posts, avg_following=args.avg_following)
+    rng = random.Random(5)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    commented = rng.sample(post_ids, min(len(post_ids), 200))
+    Comment.objects.bulk_create(
+        [Comment(post_id=post_id, author_id=rng.choice(user_ids), content=f'comment {n}')
+         for post_id in commented for n in range(rng.randrange(1, 30))],
+        batch_size=graph.BATCH_SIZE,
+    )
+    threads.fill_top_level_paths(graph.BATCH_SIZE)
+    tokens = [Token.objects.create(user_id=user_id).key for user_id in rng.sample(user_ids, min(len(user_ids), 100))]
+
+    mix = []
+    for n in range(args.requests):
+        token = tokens[n % len(tokens)]
+        kind = n % 4
+        if kind == 0:
+            mix.append(('/api/feed/', '', token))
+        elif kind == 1:
+            mix.append(('/api/posts/', '', token))
+        elif kind == 2:
+            mix.append((f'/api/posts/{rng.choice(post_ids)}/', '', token))
+        else:
+            mix.append((f'/api/posts/{rng.choice(commented)}/comments/', '', token))
+    return shape, mix
+
+
+#sleep for every statement on every connection, standing in for the database round trip
+def add_db_latency(seconds):
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    wrap_queries(delay)
+
+
+def run_wsgi(mix, concurrency):
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+
+    def call(request):
+        path, query, token = request
+        return call_wsgi(application, wsgi_environ('GET', path, query, token))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, mix))
+
+
+def run_asgi(mix, concurrency):
+    from django.core.asgi import get_asgi_application
+    application = get_asgi_application()
+
+    async def call(request, slots):
+        path, query, token = request
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'bench'), (b'authorization', f'Token {token}'.encode())],
+            'server': ('bench', 80), 'client': ('127.0.0.1', 0),
+        }
+        received = False
+        status = []
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait() #the client never disconnects early
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        async with slots:
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            return status[0], time.perf_counter() - start
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(call(request, slots) for request in mix))
+
+    return asyncio.run(main())
+
+
+#one deployment, in a child process so each gets its own settings and url routing
+def serve(args):
+    os.environ['ASYNC_READ_VIEWS'] = 'True' if args.serve == 'asgi' else 'False'
+    setup()
+    if args.db_latency:
+        add_db_latency(args.db_latency / 1000)
+    with open(args.mix) as f:
+        mix = [tuple(request) for request in json.load(f)]
+    run = run_wsgi if args.serve == 'wsgi' else run_asgi
+    run(mix[:args.concurrency * 2], args.concurrency) #warm up: imports, url resolving, token cache
+    results, elapsed = timed(run, mix, args.concurrency)
+    errors = sum(1 for status, _ in results if status != 200)
+    print(json.dumps(dict(
+        summarize([latency for _, latency in results]),
+        requests_per_second=round(len(results) / elapsed, 1), errors=errors,
+    )))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--avg-following', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32, help='requests in flight at once')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='milliseconds added to every statement')
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--mix', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['BENCHMARK_DB'] = os.path.join(workdir, 'benchmark.sqlite3')
+        setup()
+        (shape, mix), setup_seconds = timed(prepare, args)
+        mix_path = os.path.join(workdir, 'mix.json')
+        with open(mix_path, 'w') as f:
+            json.dump(mix, f)
+
+        results = {}
+        for mode in MODES:
+            command = [sys.executable, '-m', 'benchmarks.asgi', '--serve', mode, '--mix', mix_path,
+                       '--concurrency', str(args.concurrency), '--db-latency', str(args.db_latency)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True, env=os.environ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(json.dumps({
+        'benchmark': 'asgi',
+        'graph': shape,
+        'setup_seconds': round(setup_seconds, 2),
+        'params': {key: value for key, value in vars(args).items() if key not in ('serve', 'mix')},
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
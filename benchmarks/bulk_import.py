@@ -0,0 +1,103 @@
+"""
+Bulk import benchmark: load throughput of the `import_data` command.
+
+Writes a synthetic JSONL file of --users users, each following
+--avg-following others and writing --posts-per-user posts, with
+--likes-per-post likes and --comments-per-post comments (every other one a
+reply) per post, then imports it into an empty database. Reports rows/s of
+the load itself and the seconds spent deriving counters, comment reply
+counts and the search index afterwards (timelines are skipped; see
+benchmarks.feed for those).
+
+    python -m benchmarks.bulk_import --users 20000 --avg-following 20
+    BENCHMARK_DB=/tmp/import.sqlite3 python -m benchmarks.bulk_import --defer-constraints
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from benchmarks.common import setup
+
+
+def write_records(path, args):
+    rng = random.Random(5)
+    usernames = [f'user{i}' for i in range(args.users)]
+    rows = 0
+    with open(path, 'w') as out:
+        def write(record):
+            nonlocal rows
+            out.write(json.dumps(record) + '\n')
+            rows += 1
+
+        for username in usernames:
+            write({'type': 'user', 'username': username, 'email': f'{username}@example.com', 'bio': 'synthetic'})
+        for username in usernames:
+            for following in rng.sample(usernames, args.avg_following):
+                if following != username:
+                    write({'type': 'follow', 'follower': username, 'following': following})
+        post_id = comment_id = 0
+        for username in usernames:
+            for _ in range(args.posts_per_user):
+                post_id += 1
+                write({'type': 'post', 'id': post_id, 'author': username, 'content': f'synthetic post {post_id} by {username}'})
+                for liker in rng.sample(usernames, args.likes_per_post):
+                    write({'type': 'like', 'user': liker, 'post': post_id})
+                for n in range(args.comments_per_post):
+                    comment_id += 1
+                    parent = comment_id - 1 if n % 2 else None
+                    write({'type': 'comment', 'id': comment_id, 'post': post_id, 'author': rng.choice(usernames), 'content': 'nice', 'parent': parent})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--avg-following', type=int, default=20)
+    parser.add_argument('--posts-per-user', type=int, default=5)
+    parser.add_argument('--likes-per-post', type=int, default=5)
+    parser.add_argument('--comments-per-post', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--defer-constraints', action='store_true')
+    args = parser.parse_args()
+
+    setup()
+    from users import importer
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'records.jsonl')
+        rows = write_records(path, args)
+        load = importer.Importer(batch_size=args.batch_size)
+        if args.defer_constraints:
+            from django.db import connection
+            with connection.constraint_checks_disabled():
+                for record in importer.records(path):
+                    load.add(record)
+                load.finish()
+        else:
+            for record in importer.records(path):
+                load.add(record)
+            load.finish()
+        load_seconds = time.perf_counter() - load.started
+
+    derived = {}
+    for step, _ in load.derive(timelines=False):
+        derived[step] = round(time.perf_counter() - load.started - load_seconds - sum(derived.values()), 2)
+
+    print(json.dumps({
+        'benchmark': 'bulk_import',
+        'params': vars(args),
+        'results': {
+            'rows': rows,
+            'written': dict(load.written),
+            'load_seconds': round(load_seconds, 2),
+            'rows_per_second': round(sum(load.written.values()) / load_seconds),
+            'derive_seconds': derived,
+        },
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
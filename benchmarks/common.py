@@ -0,0 +1,77 @@
+import io
+import os
+import sys
+import time
+import django
+
+
+#configure django for a benchmark run and create the schema
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+#wrap every statement on every connection with `wrapper` (see execute_wrappers in the django docs). connections
+#are reopened after each request, so the wrapper is installed once per connection object, not per connect
+def wrap_queries(wrapper):
+    from django.db.backends.signals import connection_created
+
+    def install(sender, connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+
+
+#WSGI environ for one request; body is raw bytes sent as JSON
+def wsgi_environ(method, path, query='', token=None, body=b''):
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'bench', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+        'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+    return environ
+
+
+#call a WSGI application and return (status code, elapsed seconds)
+def call_wsgi(application, environ):
+    status = []
+    start = time.perf_counter()
+    response = application(environ, lambda line, headers: status.append(int(line.split()[0])))
+    b''.join(response)
+    response.close() #sends request_finished, which closes the thread's connection
+    return status[0], time.perf_counter() - start
+
+
+#percentile over an already sorted list of samples
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+#summary of a list of latencies in seconds, reported in milliseconds
+def summarize(latencies):
+    samples = sorted(latencies)
+    return {
+        'n': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+#run fn and return (result, elapsed seconds)
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
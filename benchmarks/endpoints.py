@@ -0,0 +1,292 @@
+"""
+Endpoint benchmark: every route in posts/urls.py and users/urls.py under concurrent load.
+
+Builds a synthetic graph in a SQLite file (zipf-distributed follows, likes
+and comments), then drives each endpoint in turn with N requests in flight
+through the WSGI application, like gunicorn with N threads. For every
+endpoint it reports throughput, p50/p95/p99 latency, database queries per
+request and the number of error responses as JSON.
+
+Endpoints run in a fixed order (reads, then writes, deletes last) and every
+request comes from a seeded generator, so two checkouts run the same
+workload. Save one run and compare another against it:
+
+    python -m benchmarks.endpoints --output before.json
+    python -m benchmarks.endpoints --compare before.json
+
+Set DJANGO_SETTINGS_MODULE to run against another database instead, e.g. a
+throwaway MySQL schema; the graph is written into it.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import setup, summarize, timed, wrap_queries, wsgi_environ, call_wsgi
+
+PASSWORD = 'benchmark-password'
+
+#(method, url name) in the order they run; each has a request builder in plan()
+ENDPOINTS = (
+    ('GET', 'user-list'),
+    ('GET', 'user-detail'),
+    ('GET', 'followers-list'),
+    ('GET', 'following-list'),
+    ('GET', 'user-recommendations'),
+    ('GET', 'profile'),
+    ('GET', 'user-export'),
+    ('GET', 'post-list'),
+    ('GET', 'post-detail'),
+    ('GET', 'post-likes-list'),
+    ('GET', 'comment-list'),
+    ('GET', 'comment-threads'),
+    ('GET', 'comment-detail'),
+    ('GET', 'comment-thread'),
+    ('GET', 'user-feed'),
+    ('POST', 'login'),
+    ('POST', 'register'),
+    ('PUT', 'profile'),
+    ('POST', 'post-create'),
+    ('PATCH', 'post-update'),
+    ('POST', 'comment-create'),
+    ('PATCH', 'comment-update'),
+    ('POST', 'toggle-like'),
+    ('POST', 'follow-user'),
+    ('POST', 'unfollow-user'),
+    ('DELETE', 'comment-delete'),
+    ('DELETE', 'post-delete'),
+)
+
+queries = threading.local()
+
+
+def count_query(execute, sql, params, many, context):
+    queries.n += 1
+    return execute(sql, params, many, context)
+
+
+#the requests sent to each endpoint, as (path, json body, token) triples; writes act on rows owned by the
+#client sending them, deletes and unfollows never repeat a row
+def plan(args):
+    from django.contrib.auth.hashers import make_password
+    from django.urls import reverse
+    from rest_framework.authtoken.models import Token
+    from posts.models import Post, Comment, Like
+    from users.models import User, Follow
+
+    rng = random.Random(9)
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+    comments = list(Comment.objects.order_by('id').values_list('id', 'post_id', 'author_id'))
+    liked = sorted(set(Like.objects.values_list('post_id', flat=True)))
+
+    clients = rng.sample(user_ids, min(args.clients, len(user_ids)))
+    User.objects.filter(id__in=clients).update(password=make_password(PASSWORD)) #one hash for all of them
+    usernames = dict(User.objects.filter(id__in=clients).values_list('id', 'username'))
+    tokens = {user_id: Token.objects.create(user_id=user_id).key for user_id in clients}
+    own_posts = list(Post.objects.filter(author_id__in=clients).order_by('id').values_list('id', 'author_id'))
+    own_comments = [comment for comment in comments if comment[2] in tokens]
+    follows = list(Follow.objects.filter(follower_id__in=clients).order_by('id').values_list('follower_id', 'following_id'))
+    following = set(Follow.objects.filter(follower_id__in=clients).values_list('follower_id', 'following_id'))
+    for rows in (own_posts, own_comments, follows):
+        rng.shuffle(rows)
+
+    def client():
+        return rng.choice(clients)
+
+    def new_follow():
+        while True:
+            pair = (client(), rng.choice(user_ids))
+            if pair[0] != pair[1] and pair not in following:
+                following.add(pair)
+                return pair
+
+    #a bodiless request from any client to the url with args drawn from `choices`
+    def any_client(name, *choices):
+        return lambda i: (reverse(name, args=[choice() for choice in choices]), None, tokens[client()])
+
+    def comment_detail(i):
+        comment_id, post_id, _ = rng.choice(comments)
+        return reverse('comment-detail', args=[post_id, comment_id]), None, tokens[client()]
+
+    def comment_thread(i):
+        comment_id, post_id, _ = rng.choice(comments)
+        return reverse('comment-thread', args=[post_id, comment_id]), None, tokens[client()]
+
+    def update_post(i):
+        post_id, author_id = rng.choice(own_posts)
+        return reverse('post-update', args=[post_id]), {'content': f'edited post {i}'}, tokens[author_id]
+
+    def update_comment(i):
+        comment_id, post_id, author_id = rng.choice(own_comments)
+        return reverse('comment-update', args=[post_id, comment_id]), {'content': f'edited comment {i}'}, tokens[author_id]
+
+    def follow(i):
+        follower_id, following_id = new_follow()
+        return reverse('follow-user', args=[following_id]), None, tokens[follower_id]
+
+    def unfollow(i):
+        follower_id, following_id = follows[i]
+        return reverse('unfollow-user', args=[following_id]), None, tokens[follower_id]
+
+    def delete_comment(i):
+        comment_id, post_id, author_id = own_comments[i]
+        return reverse('comment-delete', args=[post_id, comment_id]), None, tokens[author_id]
+
+    def delete_post(i):
+        post_id, author_id = own_posts[i]
+        return reverse('post-delete', args=[post_id]), None, tokens[author_id]
+
+    builders = {
+        ('GET', 'user-list'): any_client('user-list'),
+        ('GET', 'user-detail'): any_client('user-detail', lambda: rng.choice(user_ids)),
+        ('GET', 'followers-list'): any_client('followers-list', lambda: rng.choice(user_ids)),
+        ('GET', 'following-list'): any_client('following-list', lambda: rng.choice(user_ids)),
+        ('GET', 'user-recommendations'): any_client('user-recommendations'),
+        ('GET', 'profile'): any_client('profile'),
+        ('GET', 'user-export'): any_client('user-export'),
+        ('GET', 'post-list'): any_client('post-list'),
+        ('GET', 'post-detail'): any_client('post-detail', lambda: rng.choice(post_ids)),
+        ('GET', 'post-likes-list'): any_client('post-likes-list', lambda: rng.choice(liked)),
+        ('GET', 'comment-list'): any_client('comment-list', lambda: rng.choice(comments)[1]),
+        ('GET', 'comment-threads'): any_client('comment-threads', lambda: rng.choice(comments)[1]),
+        ('GET', 'comment-detail'): comment_detail,
+        ('GET', 'comment-thread'): comment_thread,
+        ('GET', 'user-feed'): any_client('user-feed'),
+        ('POST', 'login'): lambda i: (reverse('login'), {'username': usernames[client()], 'password': PASSWORD}, None),
+        ('POST', 'register'): lambda i: (
+            reverse('register'), {'username': f'new{i}', 'email': f'new{i}@example.com', 'password': PASSWORD}, None),
+        ('PUT', 'profile'): lambda i: (reverse('profile'), {'bio': f'bio {i}', 'location': 'benchmark'}, tokens[client()]),
+        ('POST', 'post-create'): lambda i: (reverse('post-create'), {'content': f'benchmark post {i}'}, tokens[client()]),
+        ('PATCH', 'post-update'): update_post,
+        ('POST', 'comment-create'): lambda i: (
+            reverse('comment-create', args=[rng.choice(post_ids)]), {'content': f'benchmark comment {i}'}, tokens[client()]),
+        ('PATCH', 'comment-update'): update_comment,
+        ('POST', 'toggle-like'): any_client('toggle-like', lambda: rng.choice(post_ids)),
+        ('POST', 'follow-user'): follow,
+        ('POST', 'unfollow-user'): unfollow,
+        ('DELETE', 'comment-delete'): delete_comment,
+        ('DELETE', 'post-delete'): delete_post,
+    }
+    n = args.requests
+    limits = {
+        ('POST', 'unfollow-user'): len(follows),
+        ('DELETE', 'comment-delete'): len(own_comments),
+        ('DELETE', 'post-delete'): len(own_posts),
+    }
+    return {endpoint: [builders[endpoint](i) for i in range(min(n, limits.get(endpoint, n)))] for endpoint in ENDPOINTS}
+
+
+#send the requests with `concurrency` in flight; returns (status, seconds, queries) per request
+def run(application, requests, concurrency, method):
+    def call(request):
+        path, body, token = request
+        body = json.dumps(body).encode() if body is not None else b''
+        queries.n = 0
+        status, elapsed = call_wsgi(application, wsgi_environ(method, path, token=token, body=body))
+        return status, elapsed, queries.n
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, requests))
+
+
+def measure(application, requests, concurrency, method):
+    results, elapsed = timed(run, application, requests, concurrency, method)
+    return dict(
+        summarize([latency for _, latency, _ in results]),
+        requests_per_second=round(len(results) / elapsed, 1) if results else 0.0,
+        queries_per_request=round(sum(n for _, _, n in results) / len(results), 2) if results else 0.0,
+        errors=sum(1 for status, _, _ in results if status >= 400),
+    )
+
+
+#per endpoint: throughput and p95 as a ratio of the baseline's, queries per request as a difference
+def compare(results, baseline):
+    def ratio(new, old):
+        return round(new / old, 3) if old else None
+
+    return {
+        name: {
+            'requests_per_second': ratio(result['requests_per_second'], baseline[name]['requests_per_second']),
+            'p95_ms': ratio(result['p95_ms'], baseline[name]['p95_ms']),
+            'queries_per_request': round(result['queries_per_request'] - baseline[name]['queries_per_request'], 2),
+        }
+        for name, result in results.items() if name in baseline
+    }
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--avg-following', type=int, default=30)
+    parser.add_argument('--avg-likes', type=int, default=5, help='likes per post on average, zipf-distributed')
+    parser.add_argument('--avg-comments', type=int, default=1, help='comments per post on average, zipf-distributed')
+    parser.add_argument('--skew', type=float, default=1.1, help='zipf exponent of follows, likes and comments')
+    parser.add_argument('--clients', type=int, default=100, help='users sending authenticated requests')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=16, help='requests in flight at once')
+    parser.add_argument('--endpoint', action='append', help='only run these url names (repeatable)')
+    parser.add_argument('--no-response-cache', action='store_true', help='set RESPONSE_CACHE_SECONDS to 0')
+    parser.add_argument('--output', help='also write the report to this file')
+    parser.add_argument('--compare', help='report of an earlier run to compare against')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['BENCHMARK_DB'] = os.path.join(workdir, 'benchmark.sqlite3') #shared by the worker threads
+        setup()
+        from django.conf import settings
+        from django.core.wsgi import get_wsgi_application
+        from benchmarks import graph
+
+        if args.no_response_cache:
+            settings.RESPONSE_CACHE_SECONDS = 0
+
+        def build():
+            shape = graph.generate(users=args.users, posts=args.posts, avg_following=args.avg_following, skew=args.skew)
+            shape.update(graph.add_engagement(avg_likes=args.avg_likes, avg_comments=args.avg_comments, skew=args.skew))
+            return shape, plan(args)
+
+        (shape, requests), setup_seconds = timed(build)
+        application = get_wsgi_application()
+        wrap_queries(count_query)
+        run(application, requests[('GET', 'user-list')][:args.concurrency], args.concurrency, 'GET') #warm up
+
+        results = {}
+        for method, name in ENDPOINTS:
+            if not args.endpoint or name in args.endpoint:
+                results[f'{method} {name}'] = measure(application, requests[(method, name)], args.concurrency, method)
+
+    report = {
+        'benchmark': 'endpoints',
+        'revision': revision(),
+        'graph': shape,
+        'setup_seconds': round(setup_seconds, 2),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': results,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report['compare'] = compare(results, json.load(f)['results'])
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
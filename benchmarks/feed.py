@@ -0,0 +1,126 @@
+"""
+Feed benchmark: the original pull-everything feed query vs the hybrid push/pull engine.
+
+Builds a synthetic graph with skewed follower counts, then reads the first
+pages of the feed for a sample of users: the old query paged by COUNT and
+OFFSET, the same query paged by KeysetPagination, and the hybrid engine
+through KeysetPagination as FeedView serves it (both read values_list()
+rows, as FAST_LIST_SERIALIZATION does).
+
+The hybrid engine reads one chunk from the viewer's timeline plus one from
+every pulled author the viewer follows, one query each on the author's
+(author, created_at, id) index. Those chunks are merged by created_at; one
+query over several authors would sort all of their posts, and a UNION of
+per-author LIMIT queries isn't accepted by SQLite. Its queries per page
+therefore grow with the pulled authors a viewer follows. At the default
+FEED_PULL_THRESHOLD of 10000 those are few; at this benchmark's --threshold,
+meant to exercise the pull path on a small graph, they are many. On the
+default graph viewers follow 14 pulled authors: the hybrid engine takes
+16 queries and 16ms a page at p50 against 1 query and 3ms for the pull
+query paged by keyset, and 6 queries and 7ms against 2ms with
+--threshold 1000 (4 pulled authors per viewer). Each extra query is about
+a millisecond of ORM overhead, so on a graph this small the pull query
+wins; the timeline pays off when the followed authors' posts no longer
+fit a newest-first walk of the posts index.
+
+    python -m benchmarks.feed --users 2000 --posts 50000 --threshold 200
+"""
+
+import argparse
+import json
+import random
+from urllib.parse import parse_qs, urlsplit
+from benchmarks.common import setup, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--posts', type=int, default=50000)
+    parser.add_argument('--avg-following', type=int, default=50)
+    parser.add_argument('--skew', type=float, default=1.1, help='zipf exponent of follower popularity')
+    parser.add_argument('--threshold', type=int, default=200, help='FEED_PULL_THRESHOLD for the hybrid engine')
+    parser.add_argument('--viewers', type=int, default=100, help='users whose feeds are read')
+    parser.add_argument('--pages', type=int, default=3)
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.db.models import Count
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from users.models import User, Follow
+    from posts.models import Post
+    from posts.feed import HybridFeed
+    from posts.pagination import KeysetPagination
+    from posts.rows import post_rows
+    from posts import timeline
+    from benchmarks import graph
+
+    settings.FEED_PULL_THRESHOLD = args.threshold
+    settings.FEED_CHUNK_SIZE = args.page_size
+    shape, setup_seconds = timed(
+        graph.generate, users=args.users, posts=args.posts, avg_following=args.avg_following, skew=args.skew
+    )
+
+    def pull_query(user):
+        following_ids = user.following.values_list('following__id', flat=True)
+        return Post.objects.filter(author_id__in=following_ids).order_by('-created_at')
+
+    def pull_page(user, page, cursor):#what FeedView ran before timelines existed
+        queryset = pull_query(user)
+        queryset.count()
+        offset = (page - 1) * args.page_size
+        return list(queryset[offset:offset + args.page_size]), None
+
+    #a page through the paginator FeedView uses, and the cursor of the next one
+    def keyset_page(queryset, cursor):
+        params = {'page_size': args.page_size}
+        if cursor:
+            params['cursor'] = cursor
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get('/feed/', params)))
+        next_link = paginator.get_next_link()
+        return page, next_link and parse_qs(urlsplit(next_link).query)['cursor'][0]
+
+    def pull_keyset_page(user, page, cursor):
+        return keyset_page(post_rows.rows(pull_query(user).order_by('-created_at', '-id')), cursor)
+
+    def hybrid_page(user, page, cursor):
+        return keyset_page(post_rows.rows(HybridFeed(user)), cursor)
+
+    viewers = random.Random(7).sample(list(User.objects.all()), min(args.viewers, args.users))
+    results = {}
+    for name, read_page in (('pull_query', pull_page), ('pull_keyset', pull_keyset_page), ('hybrid', hybrid_page)):
+        latencies, queries = [], 0
+        for user in viewers:
+            cursor = None
+            for page in range(1, args.pages + 1):
+                with CaptureQueriesContext(connection) as captured:
+                    (_, cursor), elapsed = timed(read_page, user, page, cursor)
+                latencies.append(elapsed)
+                queries += len(captured)
+        results[name] = dict(summarize(latencies), queries_per_page=round(queries / len(latencies), 2))
+
+    #every strategy must return the same posts (compared as sets, the old query has no tie-break on created_at)
+    for user in viewers[:10]:
+        first_page = {p.id for p in pull_page(user, 1, None)[0]}
+        assert first_page == {p.id for p in hybrid_page(user, 1, None)[0]} == {p.id for p in pull_keyset_page(user, 1, None)[0]}, user.id
+
+    pulled = [len(timeline.followed_pulled_author_ids(user.id)) for user in viewers]
+    follower_counts = Follow.objects.values('following_id').annotate(n=Count('id')).order_by('-n')
+    print(json.dumps({
+        'benchmark': 'feed',
+        'graph': dict(shape, pulled_authors=len(timeline.pulled_author_ids()), max_followers=follower_counts[0]['n'],
+                    pulled_authors_per_viewer=round(sum(pulled) / len(pulled), 2)),
+        'setup_seconds': round(setup_seconds, 2),
+        'params': vars(args),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Follow graph benchmark: the in-process CSR index (users/graph.py) vs the Follow table.
+
+Builds a synthetic graph with zipf-distributed follows, then reports the
+index's build time and memory (against the same edges held as Python sets)
+and the latency of each lookup the API makes, answered both ways: a page of
+followers and of followings with its count, "does A follow B", and mutual
+friend counts for a page of users. Index lookups are timed without the log
+read that precedes them by default; `log_read` times that read on its own.
+
+    python -m benchmarks.follow_graph --users 20000 --avg-following 50
+"""
+
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+from benchmarks.common import setup, summarize, timed
+
+
+#peak bytes allocated while building the two directions as {user id: set of ids}, the obvious alternative
+def sets_footprint(pairs):
+    tracemalloc.start()
+    following, followers = {}, {}
+    for follower_id, following_id in pairs:
+        following.setdefault(follower_id, set()).add(following_id)
+        followers.setdefault(following_id, set()).add(follower_id)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--avg-following', type=int, default=50)
+    parser.add_argument('--skew', type=float, default=1.1, help='zipf exponent of follower popularity')
+    parser.add_argument('--samples', type=int, default=500, help='lookups timed per operation and strategy')
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from users import counters
+    from users.graph import follow_graph
+    from users.models import User, Follow
+    from benchmarks import graph
+
+    shape, setup_seconds = timed(graph.generate, users=args.users, posts=0, avg_following=args.avg_following, skew=args.skew)
+    settings.FOLLOW_GRAPH_SYNC_SECONDS = 3600 #lookups alone; log_read below times the read they'd add
+
+    gc.collect()
+    _, build_seconds = timed(follow_graph.sync_if_stale)
+    stats = follow_graph.stats()
+    pairs = list(Follow.objects.values_list('follower_id', 'following_id').iterator())
+    python_sets = sets_footprint(pairs)
+    del pairs
+
+    rng = random.Random(7)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    viewers = [rng.choice(user_ids) for _ in range(args.samples)]
+    pages = [rng.sample(user_ids, args.page_size) for _ in range(args.samples)]
+    edges = [(rng.choice(user_ids), rng.choice(user_ids)) for _ in range(args.samples)]
+    viewer_users = {user.id: user for user in User.objects.filter(id__in=viewers)}
+    size = args.page_size
+
+    def sql_mutual_counts(viewer_id, page):
+        settings.FOLLOW_GRAPH_INDEX = False
+        try:
+            return counters.mutual_friend_counts(viewer_users[viewer_id], page)
+        finally:
+            settings.FOLLOW_GRAPH_INDEX = True
+
+    #operation -> (index lookup, the same answer from the Follow table), each taking a sample index
+    operations = {
+        'followers_page': (
+            lambda i: (len(follow_graph.followers_of(viewers[i])), follow_graph.followers_of(viewers[i])[:size]),
+            lambda i: (
+                Follow.objects.filter(following_id=viewers[i]).count(),
+                list(Follow.objects.filter(following_id=viewers[i]).order_by('follower_id').values_list('follower_id', flat=True)[:size]),
+            ),
+        ),
+        'following_page': (
+            lambda i: (len(follow_graph.following_of(viewers[i])), follow_graph.following_of(viewers[i])[:size]),
+            lambda i: (
+                Follow.objects.filter(follower_id=viewers[i]).count(),
+                list(Follow.objects.filter(follower_id=viewers[i]).order_by('following_id').values_list('following_id', flat=True)[:size]),
+            ),
+        ),
+        'follows': (
+            lambda i: follow_graph.follows(*edges[i]),
+            lambda i: Follow.objects.filter(follower_id=edges[i][0], following_id=edges[i][1]).exists(),
+        ),
+        'mutual_counts': (
+            lambda i: follow_graph.mutual_counts(viewers[i], pages[i]),
+            lambda i: sql_mutual_counts(viewers[i], pages[i]),
+        ),
+    }
+
+    results = {}
+    for name, (index, table) in operations.items():
+        for i in range(args.samples):
+            assert index(i) == table(i), (name, i)
+        index_latency = [timed(index, i)[1] for i in range(args.samples)]
+        table_latency = [timed(table, i)[1] for i in range(args.samples)]
+        results[name] = {
+            'index': summarize(index_latency), 'table': summarize(table_latency),
+            'speedup': round(sum(table_latency) / sum(index_latency), 1),
+        }
+
+    def log_read(i):
+        follow_graph.expire()
+        follow_graph.sync_if_stale()
+    results['log_read'] = summarize([timed(log_read, i)[1] for i in range(args.samples)])
+
+    print(json.dumps({
+        'benchmark': 'follow_graph',
+        'graph': shape,
+        'setup_seconds': round(setup_seconds, 2),
+        'params': vars(args),
+        'index': {
+            'build_seconds': round(build_seconds, 3),
+            'edges': stats['edges'],
+            'bytes': stats['bytes'],
+            'bytes_per_edge': round(stats['bytes'] / stats['edges'], 2) if stats['edges'] else None,
+            'python_sets_bytes': python_sets,
+        },
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
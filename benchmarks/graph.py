@@ -0,0 +1,150 @@
+import io
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from users.models import User, Profile, Follow
+from posts.models import Post, Comment, Like, TimelineEntry
+from posts import threads, timeline
+
+BATCH_SIZE = 5000
+
+
+#let bulk_create keep explicit created_at values instead of stamping every row with now()
+@contextmanager
+def explicit_timestamps(*models):
+    fields = [model._meta.get_field('created_at') for model in models]
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+#zipf-like weights so a few accounts attract most of the followers
+def popularity_weights(n, skew):
+    return [1.0 / (rank ** skew) for rank in range(1, n + 1)]
+
+
+#build a synthetic social graph with skewed follower counts; returns a dict describing it
+def generate(users=1000, posts=10000, avg_following=50, skew=1.1, days=30, seed=42):
+    rng = random.Random(seed)
+    password = make_password(None) #unusable password, hashing per user would dominate setup
+
+    User.objects.bulk_create(
+        [User(username=f'user{i}', email=f'user{i}@example.com', password=password) for i in range(users)],
+        batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in user_ids], batch_size=BATCH_SIZE)
+
+    #every user follows a handful of accounts picked by popularity rank
+    weights = popularity_weights(len(user_ids), skew)
+    follows = set()
+    for follower_id in user_ids:
+        wanted = max(1, int(rng.expovariate(1 / avg_following)))
+        for following_id in rng.choices(user_ids, weights=weights, k=wanted):
+            if following_id != follower_id:
+                follows.add((follower_id, following_id))
+    Follow.objects.bulk_create(
+        [Follow(follower_id=a, following_id=b) for a, b in follows], batch_size=BATCH_SIZE
+    )
+    set_follow_counts(follows)
+
+    #posts are spread over the last `days` days, authored uniformly
+    now = timezone.now()
+    with explicit_timestamps(Post):
+        Post.objects.bulk_create(
+            [
+                Post(
+                    author_id=rng.choice(user_ids),
+                    content=f'synthetic post {i}',
+                    created_at=now - timedelta(seconds=rng.randrange(days * 86400)),
+                )
+                for i in range(posts)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    fill_timelines()
+    return {'users': len(user_ids), 'follows': len(follows), 'posts': posts}
+
+
+#likes and comments with skewed per-post counts (a few posts attract most of them), with the post counters
+#and popularity scores they imply; returns a dict describing them
+def add_engagement(avg_likes=5, avg_comments=1, skew=1.1, seed=43):
+    from django.core.management import call_command
+    rng = random.Random(seed)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    posts = list(Post.objects.values_list('id', 'created_at'))
+    weights = popularity_weights(len(posts), skew)
+    rng.shuffle(posts) #popularity rank is unrelated to post age
+
+    likes = set()
+    for post_index in rng.choices(range(len(posts)), weights=weights, k=avg_likes * len(posts)):
+        likes.add((rng.choice(user_ids), posts[post_index][0]))
+    with explicit_timestamps(Like):
+        Like.objects.bulk_create(
+            [Like(user_id=user_id, post_id=post_id, created_at=timezone.now()) for user_id, post_id in likes],
+            batch_size=BATCH_SIZE,
+        )
+
+    created_at = dict(posts)
+    comments = []
+    for post_index in rng.choices(range(len(posts)), weights=weights, k=avg_comments * len(posts)):
+        post_id = posts[post_index][0]
+        comments.append(Comment(
+            post_id=post_id, author_id=rng.choice(user_ids), content=f'synthetic comment {len(comments)}',
+            created_at=created_at[post_id] + timedelta(seconds=rng.randrange(86400)),
+        ))
+    with explicit_timestamps(Comment):
+        Comment.objects.bulk_create(comments, batch_size=BATCH_SIZE)
+    threads.fill_top_level_paths(BATCH_SIZE)
+
+    like_count, comment_count = Counter(post_id for _, post_id in likes), Counter(c.post_id for c in comments)
+    Post.objects.bulk_update(
+        [Post(id=post_id, like_count=like_count[post_id], comment_count=comment_count[post_id])
+         for post_id in set(like_count) | set(comment_count)],
+        Post.COUNTER_FIELDS, batch_size=BATCH_SIZE,
+    )
+    call_command('recompute_popularity', batch_size=BATCH_SIZE, verbosity=0, stdout=io.StringIO())
+    return {
+        'likes': len(likes), 'comments': len(comments),
+        'max_likes': max(like_count.values(), default=0), 'max_comments': max(comment_count.values(), default=0),
+    }
+
+
+#store the denormalized follower/following counts for bulk-created follow edges
+def set_follow_counts(follows):
+    follower_count, following_count = Counter(), Counter()
+    for follower_id, following_id in follows:
+        following_count[follower_id] += 1
+        follower_count[following_id] += 1
+    users = [
+        User(id=user_id, follower_count=follower_count[user_id], following_count=following_count[user_id])
+        for user_id in set(follower_count) | set(following_count)
+    ]
+    User.objects.bulk_update(users, User.COUNTER_FIELDS, batch_size=BATCH_SIZE)
+
+
+#materialize timelines the way the write path would, in bulk
+def fill_timelines():
+    pulled = timeline.pulled_author_ids()
+    followers = {}
+    for follower_id, following_id in Follow.objects.values_list('follower_id', 'following_id').iterator():
+        followers.setdefault(following_id, []).append(follower_id)
+
+    batch = []
+    posts = Post.objects.exclude(author_id__in=pulled).values_list('id', 'author_id', 'created_at')
+    for post_id, author_id, created_at in posts.iterator():
+        for follower_id in followers.get(author_id, ()):
+            batch.append(TimelineEntry(user_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at))
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, batch_size=BATCH_SIZE)
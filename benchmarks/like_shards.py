@@ -0,0 +1,86 @@
+"""
+Like counter shard benchmark: like throughput on one post by number of workers.
+
+--likes users each like the same post once through POST
+/api/posts/<id>/like/, from 1, 2, 4, ... up to --max-workers threads calling
+the WSGI application, first with like_count updated on the post row
+(LIKE_COUNTER_SHARDS=0) and then with --shards counter shards. Every run
+likes a fresh post and afterwards folds the shards and checks like_count
+against the likes table.
+
+Row locks only matter on a database that has them. The default SQLite file
+takes one lock for every write, so there every mode runs one like at a time
+and the numbers show what the shards cost rather than what they save; run it
+against a scratch MySQL database for the contended case:
+
+    python -m benchmarks.like_shards --likes 2000 --max-workers 16 --shards 8
+    DJANGO_SETTINGS_MODULE=social_media_api.settings DB_NAME=scratch python -m benchmarks.like_shards
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import setup, summarize, timed, wsgi_environ, call_wsgi
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--likes', type=int, default=1000, help='likes per run, one per user')
+    parser.add_argument('--max-workers', type=int, default=8)
+    parser.add_argument('--shards', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.setdefault('BENCHMARK_DB', os.path.join(workdir, 'benchmark.sqlite3')) #shared by the worker threads
+        setup()
+        from django.conf import settings
+        from django.contrib.auth.hashers import make_password
+        from django.core.wsgi import get_wsgi_application
+        from django.urls import reverse
+        from rest_framework.authtoken.models import Token
+        from posts.models import Post, Like
+        from posts import like_shards
+        from users.models import User, Profile
+
+        settings.LIKE_SHARD_COMPACT_SECONDS = 0 #folded after each run instead
+        password = make_password(None)
+        users = User.objects.bulk_create(
+            [User(username=f'fan{i}', email=f'fan{i}@example.com', password=password) for i in range(args.likes)]
+        )
+        Profile.objects.bulk_create([Profile(user=user) for user in users])
+        tokens = [token.key for token in Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])]
+        application = get_wsgi_application()
+
+        workers = [1]
+        while workers[-1] * 2 <= args.max_workers:
+            workers.append(workers[-1] * 2)
+
+        results = {}
+        for mode, shards in (('post_row', 0), ('sharded', args.shards)):
+            settings.LIKE_COUNTER_SHARDS = shards
+            results[mode] = {}
+            for n in workers:
+                post = Post.objects.create(author=users[0], content=f'{mode} with {n} workers')
+                path = reverse('toggle-like', args=[post.id])
+                with ThreadPoolExecutor(max_workers=n) as pool:
+                    responses, elapsed = timed(lambda: list(pool.map(lambda token: call_wsgi(application, wsgi_environ('POST', path, token=token)), tokens)))
+                like_shards.compact()
+                post.refresh_from_db()
+                results[mode][n] = dict(
+                    summarize([latency for _, latency in responses]),
+                    likes_per_second=round(len(responses) / elapsed, 1),
+                    errors=sum(1 for status, _ in responses if status >= 400),
+                    like_count_matches=post.like_count == Like.objects.filter(post=post).count(),
+                )
+
+    print(json.dumps({
+        'benchmark': 'like_shards',
+        'params': dict(vars(args), workers=workers, database=settings.DATABASES['default']['ENGINE']),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
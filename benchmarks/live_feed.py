@@ -0,0 +1,132 @@
+"""
+Live feed benchmark: idle event streams held by one ASGI worker, and fan-out.
+
+Opens --connections streams on GET /api/feed/live/ through the ASGI
+application in this process (spread over --viewers users who all follow
+one author), then has the author publish --posts posts. Reports how long
+the streams took to open, the memory each idle stream holds (traced Python
+allocations, and the process's peak RSS), and for every post how long it
+took to reach the first, median and last stream.
+
+    python -m benchmarks.live_feed --connections 20000 --posts 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from benchmarks.common import setup, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--viewers', type=int, default=100)
+    parser.add_argument('--posts', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['BENCHMARK_DB'] = os.path.join(workdir, 'benchmark.sqlite3')
+        os.environ['ASYNC_READ_VIEWS'] = 'True' #routes the stream, as asgi.py does
+        setup()
+        from django.conf import settings
+        from django.contrib.auth.hashers import make_password
+        from django.core.asgi import get_asgi_application
+        from django.urls import reverse
+        from rest_framework.authtoken.models import Token
+        from posts.models import Post
+        from users.models import User, Profile, Follow
+
+        settings.LIVE_FEED_HEARTBEAT_SECONDS = 3600 #idle streams stay idle
+        settings.SLOW_REQUEST_MS = 10 ** 9 #streams last until the end, and opening thousands at once queues them
+        password = make_password(None)
+        author, *viewers = User.objects.bulk_create(
+            [User(username=f'user{i}', email=f'user{i}@example.com', password=password) for i in range(args.viewers + 1)]
+        )
+        Profile.objects.bulk_create([Profile(user=user) for user in (author, *viewers)])
+        Follow.objects.bulk_create([Follow(follower=viewer, following=author) for viewer in viewers])
+        tokens = [Token.objects.create(user=viewer).key for viewer in viewers]
+        application = get_asgi_application()
+        path = reverse('user-feed-live')
+
+        async def run():
+            received = {} #post id -> arrival times
+            arrived = asyncio.Event()
+            disconnect = asyncio.Event()
+            opened = []
+
+            async def connect(i):
+                scope = {
+                    'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                    'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                    'headers': [(b'host', b'bench'), (b'accept', b'text/event-stream'),
+                                (b'authorization', f'Token {tokens[i % len(tokens)]}'.encode())],
+                    'server': ('bench', 80), 'client': ('127.0.0.1', 0),
+                }
+                requested = False
+
+                async def receive():
+                    nonlocal requested
+                    if not requested:
+                        requested = True
+                        return {'type': 'http.request', 'body': b'', 'more_body': False}
+                    await disconnect.wait()
+                    return {'type': 'http.disconnect'}
+
+                async def send(message):
+                    body = message.get('body', b'')
+                    if body.startswith(b'retry:'):
+                        opened.append(time.perf_counter())
+                    for line in body.split(b'\n'):
+                        if line.startswith(b'data: {"id"'):
+                            times = received.setdefault(json.loads(line[6:])['id'], [])
+                            times.append(time.perf_counter())
+                            if len(times) == args.connections:
+                                arrived.set()
+
+                await application(scope, receive, send)
+
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            tasks = [asyncio.create_task(connect(i)) for i in range(args.connections)]
+            while len(opened) < args.connections:
+                await asyncio.sleep(0.05)
+            open_seconds = time.perf_counter() - start
+            per_stream = (tracemalloc.get_traced_memory()[0] - before) / args.connections
+            tracemalloc.stop()
+
+            fan_out = []
+            for i in range(args.posts):
+                arrived.clear()
+                published = time.perf_counter()
+                post = await asyncio.to_thread(Post.objects.create, author=author, content=f'live post {i}')
+                await arrived.wait()
+                fan_out.append([t - published for t in received[post.id]])
+
+            disconnect.set()
+            await asyncio.gather(*tasks)
+            return open_seconds, per_stream, fan_out
+
+        open_seconds, per_stream, fan_out = asyncio.run(run())
+
+    print(json.dumps({
+        'benchmark': 'live_feed',
+        'params': vars(args),
+        'results': {
+            'streams_opened_per_second': round(args.connections / open_seconds, 1),
+            'traced_bytes_per_idle_stream': round(per_stream),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'first_stream': summarize([min(latencies) for latencies in fan_out]),
+            'median_stream': summarize([sorted(latencies)[len(latencies) // 2] for latencies in fan_out]),
+            'last_stream': summarize([max(latencies) for latencies in fan_out]),
+        },
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
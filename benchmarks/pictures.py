@@ -0,0 +1,106 @@
+"""
+Profile picture benchmark: uploads per second through PUT /api/users/profile/.
+
+Encodes one photo-sized JPEG (--width x --height, noisy so it compresses
+like a photo), then has --clients users upload it --uploads times in total
+with --concurrency requests in flight through the WSGI application. Runs
+twice: with the variants rendered inside the request
+(PROFILE_PICTURE_WORKERS=0) and by the pipeline's process pool
+(--workers processes), where it also reports how long the pool took to
+render and store every variant after the last response.
+
+    python -m benchmarks.pictures --uploads 200 --concurrency 8 --workers 4
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.common import setup, summarize, timed, wsgi_environ, call_wsgi
+
+BOUNDARY = 'BenchmarkBoundary'
+
+
+def photo(width, height):
+    from PIL import Image
+    rng = random.Random(3)
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.frombytes('RGB', (width // 4, height // 4), rng.randbytes(width // 4 * height // 4 * 3))
+    image = Image.blend(image, noise.resize((width, height)), 0.3)
+    encoded = io.BytesIO()
+    image.save(encoded, 'JPEG', quality=90)
+    return encoded.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=3000)
+    parser.add_argument('--height', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--uploads', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='pipeline processes')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['BENCHMARK_DB'] = os.path.join(workdir, 'benchmark.sqlite3') #shared by the worker threads
+        setup()
+        from django.conf import settings
+        from django.contrib.auth.hashers import make_password
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.wsgi import get_wsgi_application
+        from django.test.client import encode_multipart
+        from django.urls import reverse
+        from rest_framework.authtoken.models import Token
+        from users.models import User, Profile
+        from users.pictures import pipeline
+
+        settings.MEDIA_ROOT = os.path.join(workdir, 'media')
+        password = make_password(None)
+        users = User.objects.bulk_create(
+            [User(username=f'user{i}', email=f'user{i}@example.com', password=password) for i in range(args.clients)]
+        )
+        Profile.objects.bulk_create([Profile(user=user) for user in users])
+        tokens = [Token.objects.create(user=user).key for user in users]
+
+        upload = photo(args.width, args.height)
+        body = encode_multipart(BOUNDARY, {'profile_picture': SimpleUploadedFile('photo.jpg', upload, 'image/jpeg')})
+        application = get_wsgi_application()
+
+        def put(i):
+            environ = wsgi_environ('PUT', reverse('profile'), token=tokens[i % len(tokens)], body=body)
+            environ['CONTENT_TYPE'] = f'multipart/form-data; boundary={BOUNDARY}'
+            return call_wsgi(application, environ)
+
+        results = {}
+        for mode, workers in (('in_request', 0), ('pipeline', args.workers)):
+            settings.PROFILE_PICTURE_WORKERS = workers
+            if workers:
+                put(0) #start the pool outside the measurement
+                pipeline.wait()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                responses, elapsed = timed(lambda: list(pool.map(put, range(args.uploads))))
+            drained = time.perf_counter()
+            pipeline.wait()
+            drained = time.perf_counter() - drained
+            results[mode] = dict(
+                summarize([latency for _, latency in responses]),
+                uploads_per_second=round(len(responses) / elapsed, 1),
+                rendered_per_second=round(len(responses) / (elapsed + drained), 1),
+                seconds_rendering_after_last_response=round(drained, 2),
+                errors=sum(1 for status, _ in responses if status >= 400),
+            )
+
+    print(json.dumps({
+        'benchmark': 'pictures',
+        'params': dict(vars(args), upload_bytes=len(upload), variants=settings.PROFILE_PICTURE_VARIANTS, format=settings.PROFILE_PICTURE_FORMAT),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
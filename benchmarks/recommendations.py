@@ -0,0 +1,92 @@
+"""
+Recommendation benchmark: "people you may know" on a power-law follow graph.
+
+Builds a synthetic graph with zipf-distributed follows, turns the --hubs
+most followed accounts into hubs that follow --hub-following others (as
+aggregator accounts do, and the walk's worst case), then ranks
+recommendations from scratch (empty cache) for a random sample of users and
+for the users following the most accounts, whose two-hop neighbourhoods are
+the largest. Reports latency against RECOMMENDATION_TIME_BUDGET_MS, how often
+the walk ran out of time, and the same for the unpruned walk
+(RECOMMENDATION_MAX_DEGREE, _MAX_SOURCES and the time budget lifted).
+
+    python -m benchmarks.recommendations --users 20000 --avg-following 50
+"""
+
+import argparse
+import json
+import random
+import time
+from benchmarks.common import setup, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--avg-following', type=int, default=50)
+    parser.add_argument('--skew', type=float, default=1.1, help='zipf exponent of follower popularity')
+    parser.add_argument('--hubs', type=int, default=20)
+    parser.add_argument('--hub-following', type=int, default=5000, help='accounts each hub follows')
+    parser.add_argument('--samples', type=int, default=200, help='users ranked per group')
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.core.cache import cache
+    from users import recommendations
+    from users.graph import follow_graph
+    from users.models import User, Follow
+    from benchmarks import graph
+
+    shape, setup_seconds = timed(graph.generate, users=args.users, posts=0, avg_following=args.avg_following, skew=args.skew)
+    rng = random.Random(11)
+    user_ids = list(User.objects.values_list('id', flat=True))
+    hubs = User.objects.order_by('-follower_count').values_list('id', flat=True)[:args.hubs]
+    Follow.objects.bulk_create(
+        [Follow(follower_id=hub, following_id=other) for hub in hubs for other in rng.sample(user_ids, args.hub_following) if other != hub],
+        batch_size=graph.BATCH_SIZE, ignore_conflicts=True,
+    )
+    settings.FOLLOW_GRAPH_SYNC_SECONDS = 3600 #the walk alone, without the log reads around it
+    follow_graph.sync_if_stale()
+
+    groups = {
+        'random': rng.sample(user_ids, min(args.samples, len(user_ids))),
+        'most_following': list(User.objects.order_by('-following_count').values_list('id', flat=True)[:args.samples]),
+    }
+    limits = {
+        'pruned': {},
+        'unpruned': {'RECOMMENDATION_MAX_DEGREE': 10 ** 9, 'RECOMMENDATION_MAX_SOURCES': 10 ** 9, 'RECOMMENDATION_TIME_BUDGET_MS': 10 ** 6},
+    }
+
+    results = {}
+    for mode, overrides in limits.items():
+        defaults = {name: getattr(settings, name) for name in overrides}
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        try:
+            for group, users in groups.items():
+                cache.clear()
+                latencies = [timed(recommendations.for_user, user_id, settings.RECOMMENDATION_LIMIT)[1] for user_id in users]
+                incomplete = sum(
+                    1 for user_id in users
+                    if not follow_graph.two_hop_counts(
+                        user_id, settings.RECOMMENDATION_MAX_SOURCES, settings.RECOMMENDATION_MAX_DEGREE,
+                        time.perf_counter() + settings.RECOMMENDATION_TIME_BUDGET_MS / 1000,
+                    )[1]
+                )
+                results[f'{mode}_{group}'] = dict(summarize(latencies), max_ms=round(max(latencies) * 1000, 3), out_of_time=incomplete)
+        finally:
+            for name, value in defaults.items():
+                setattr(settings, name, value)
+
+    print(json.dumps({
+        'benchmark': 'recommendations',
+        'graph': shape,
+        'setup_seconds': round(setup_seconds, 2),
+        'params': dict(vars(args), time_budget_ms=settings.RECOMMENDATION_TIME_BUDGET_MS),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Search benchmark: `content__icontains` scans vs the inverted index.
+
+Generates posts whose words follow a zipf distribution over a synthetic
+vocabulary, indexes them, then times the first page of results for rare,
+common, multi-term and prefix queries with both strategies.
+
+    python -m benchmarks.search --posts 1000000
+
+Posting counts are cached (SEARCH_FREQUENCY_CACHE_SECONDS), so only the
+first run of each query pays for counting. At 1M posts the index wins on
+the rare and ranked queries. For a single common term or prefix both
+strategies fill the page within the first hundred posts and take about a
+millisecond; the index's extra time there is building its EXISTS probes
+in Python, not the SQL. 'w12 w250' runs slower through the index
+because `icontains` matches substrings: '%w12%' also hits w120..w1299,
+so the scan fills its page after about 4k posts, while the index returns
+only the posts containing both words and walks about 11k.
+"""
+
+import argparse
+import json
+import random
+from benchmarks.common import setup, summarize, timed
+
+QUERIES = {
+    'rare_term': 'w4800',
+    'common_term': 'w3',
+    'two_terms': 'w12 w250',
+    'prefix': 'w48',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--authors', type=int, default=500)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--words', type=int, default=12, help='words per post')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.hashers import make_password
+    from django.db.models.signals import post_save
+    from posts.models import Post
+    from posts import search, signals
+    from users.models import User
+    from benchmarks.graph import BATCH_SIZE, popularity_weights
+
+    def generate():
+        rng = random.Random(11)
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=f'author{i}', email=f'author{i}@example.com', password=password) for i in range(args.authors)]
+        )
+        author_ids = list(User.objects.values_list('id', flat=True))
+        vocabulary = [f'w{i}' for i in range(args.vocabulary)]
+        weights = popularity_weights(args.vocabulary, 1.0)
+        for start in range(0, args.posts, BATCH_SIZE):
+            count = min(BATCH_SIZE, args.posts - start)
+            Post.objects.bulk_create([
+                Post(author_id=rng.choice(author_ids), content=' '.join(rng.choices(vocabulary, weights=weights, k=args.words)))
+                for _ in range(count)
+            ])
+        search.index_posts(Post.objects.values_list('id', 'content').iterator(chunk_size=BATCH_SIZE), batch_size=BATCH_SIZE)
+
+    post_save.disconnect(signals.index_post_content, sender=Post) #indexed in bulk above
+    _, setup_seconds = timed(generate)
+
+    def scan_page(query):#what SearchFilter/FeedView did before: every term as content__icontains
+        queryset = Post.objects.all()
+        for term in query.split():
+            queryset = queryset.filter(content__icontains=term)
+        return list(queryset.order_by('-created_at', '-id')[:args.page_size])
+
+    def index_page(query):
+        parsed = search.PostSearch(query)
+        return list(parsed.rank(parsed.filter(Post.objects.all()))[:args.page_size])
+
+    results = {}
+    for name, query in QUERIES.items():
+        results[name] = {'query': query}
+        for strategy, read_page in (('icontains_scan', scan_page), ('inverted_index', index_page)):
+            latencies = [timed(read_page, query)[1] for _ in range(args.repeat)]
+            results[name][strategy] = summarize(latencies)
+
+    print(json.dumps({
+        'benchmark': 'search',
+        'setup_seconds': round(setup_seconds, 2),
+        'params': vars(args),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Serializer benchmark: DRF ModelSerializers vs the values_list() row path (posts/rows.py).
+
+Builds a synthetic graph, then for posts, comments and likes times pages of
+--page-size rows both ways: serialization alone (instances or rows already
+fetched) and fetch + serialize + JSON render, the work of a list request
+after pagination. Reports rows per second and checks both paths render the
+same bytes.
+
+    python -m benchmarks.serializers --page-size 100 --repeat 200
+"""
+
+import argparse
+import json
+from benchmarks.common import setup, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200, help='timed pages per path')
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.renderers import JSONRenderer
+    from posts.models import Post, Comment, Like
+    from posts.serializers import PostSerializer, CommentSerializer, LikeSerializer
+    from posts import rows
+    from benchmarks import graph
+
+    def build():
+        shape = graph.generate(users=args.users, posts=args.posts, avg_following=20)
+        shape.update(graph.add_engagement(avg_likes=args.page_size // 10 or 1, avg_comments=args.page_size // 20 or 1))
+        return shape
+
+    shape, setup_seconds = timed(build)
+    renderer = JSONRenderer()
+    #the list queries of the views, newest first; likes and comments of the most engaged posts so a page is full
+    most_liked = Post.objects.order_by('-like_count').values_list('id', flat=True).first()
+    most_commented = Post.objects.order_by('-comment_count').values_list('id', flat=True).first()
+    lists = {
+        'post': (Post.objects.select_related('author').order_by('-created_at', '-id'), PostSerializer, rows.post_rows),
+        'comment': (
+            Comment.objects.filter(post_id=most_commented).select_related('author').order_by('-created_at', '-id'),
+            CommentSerializer, rows.comment_rows,
+        ),
+        'like': (
+            Like.objects.filter(post_id=most_liked).select_related('user').order_by('-created_at', '-id'),
+            LikeSerializer, rows.like_rows,
+        ),
+    }
+
+    results = {}
+    for name, (queryset, serializer_class, row_serializer) in lists.items():
+        instances = list(queryset[:args.page_size])
+        values = list(row_serializer.rows(queryset)[:args.page_size])
+        assert renderer.render(serializer_class(instances, many=True).data) == renderer.render(row_serializer.serialize(values)), name
+
+        paths = {
+            'drf_serialize': lambda: serializer_class(instances, many=True).data,
+            'rows_serialize': lambda: row_serializer.serialize(values),
+            'drf_request': lambda: renderer.render(serializer_class(list(queryset[:args.page_size]), many=True).data),
+            'rows_request': lambda: renderer.render(row_serializer.serialize(row_serializer.rows(queryset)[:args.page_size])),
+        }
+        results[name] = {'rows_per_page': len(instances)}
+        for path, run in paths.items():
+            run() #warm up
+            latencies = [timed(run)[1] for _ in range(args.repeat)]
+            results[name][path] = dict(
+                summarize(latencies), rows_per_second=round(len(instances) * len(latencies) / sum(latencies)),
+            )
+        for step in ('serialize', 'request'):
+            results[name][f'{step}_speedup'] = round(
+                results[name][f'rows_{step}']['rows_per_second'] / results[name][f'drf_{step}']['rows_per_second'], 2
+            )
+
+    print(json.dumps({
+        'benchmark': 'serializers',
+        'graph': shape,
+        'setup_seconds': round(setup_seconds, 2),
+        'params': vars(args),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Settings for running the benchmarks against a local SQLite stand-in.
+
+Reuses the project settings and only swaps the database, so the numbers
+reflect the real middleware, REST framework and app configuration.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+#the project settings read these from .env; benchmarks don't need real values
+for name, value in {
+    'SECRET_KEY': 'benchmark-only-secret-key',
+    'ALLOWED_HOSTS': '*',
+    'DB_NAME': 'benchmark',
+    'DB_USER': '',
+    'DB_PASSWORD': '',
+    'DB_HOST': '',
+    'DB_PORT': '',
+}.items():
+    os.environ.setdefault(name, value)
+
+from social_media_api.settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCHMARK_DB', ':memory:'),
+        'OPTIONS': {
+            'timeout': 30, #concurrent writers wait for the lock instead of failing
+            'transaction_mode': 'IMMEDIATE', #take the write lock at BEGIN, two transactions can't deadlock upgrading to it
+            'init_command': 'PRAGMA journal_mode=WAL;', #readers don't wait for the writer
+        },
+    }
+}
+
+#the endpoint benchmarks send far more writes per user than the write throttles allow; benchmarks.throttling measures them
+REST_FRAMEWORK = dict(REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={})  # noqa: F405
+
+#the response cache and replica pins refuse per-process caches; files stand in for the cache server the workers share
+CACHES = dict(CACHES, shared={  # noqa: F405
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(prefix='benchmark-cache-'),
+})
+atexit.register(shutil.rmtree, CACHES['shared']['LOCATION'], ignore_errors=True)
+RESPONSE_CACHE_ALIAS = 'shared'
@@ -0,0 +1,82 @@
+"""
+Write throttle benchmark: cost of one throttle check per request.
+
+Times allow_request of the token bucket throttles the write views use
+(WriteBucketThrottle: the view's scope, then the writes budget) against DRF's own
+UserRateThrottle and ScopedRateThrottle on the local memory cache, for
+--users users taking turns, with the bucket table per process and in
+shared memory. Rates are high enough that every request is allowed, so
+each check does its full work.
+
+    python -m benchmarks.throttling --checks 200000 --users 1000
+"""
+
+import argparse
+import json
+import time
+import uuid
+from benchmarks.common import setup, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import override_settings
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.throttling import ScopedRateThrottle, UserRateThrottle
+    from social_media_api import throttling
+    from users.models import User
+
+    class View:
+        throttle_scope = 'like'
+
+    rate = f'{args.checks * 10}/hour'
+    rates = {'writes': rate, 'user': rate, 'like': rate}
+
+    class UserCacheThrottle(UserRateThrottle):
+        THROTTLE_RATES = rates #bound from the settings at import
+
+    class ScopedCacheThrottle(ScopedRateThrottle):
+        THROTTLE_RATES = rates
+
+    request = APIRequestFactory().post('/')
+    users = [User(id=i + 1, username=f'user{i}') for i in range(args.users)]
+    view = View()
+
+    def measure(throttle_classes):
+        latencies = []
+        for i in range(args.checks):
+            request.user = users[i % len(users)]
+            start = time.perf_counter()
+            allowed = all(throttle().allow_request(request, view) for throttle in throttle_classes)
+            latencies.append(time.perf_counter() - start)
+            assert allowed
+        return summarize(latencies)
+
+    results = {}
+    with override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates)):
+        cache.clear()
+        results['drf_cache'] = measure((UserCacheThrottle, ScopedCacheThrottle))
+        for mode, shared_name in (('buckets', ''), ('buckets_shared', f'throttle-benchmark-{uuid.uuid4().hex[:8]}')):
+            throttling._table = throttling.BucketTable(settings.THROTTLE_SLOTS, shared_name)
+            try:
+                results[mode] = measure(throttling.WRITE_THROTTLES)
+            finally:
+                throttling._table.close(unlink=True)
+                throttling._table = None
+
+    print(json.dumps({
+        'benchmark': 'throttling',
+        'params': dict(vars(args), slots=settings.THROTTLE_SLOTS, cache=settings.CACHES['default']['BACKEND']),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
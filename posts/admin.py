@@ -1,7 +1,9 @@
 from django.contrib import admin
-from . models import Post, Comment, Like
+from . models import Post, Comment, Like, TimelineEntry, PostToken
 
 # Register your models here.
 admin.site.register(Post)
 admin.site.register(Comment)
-admin.site.register(Like)
\ No newline at end of file
+admin.site.register(Like)
+admin.site.register(TimelineEntry)
+admin.site.register(PostToken)
\ No newline at end of file
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+    
+    def ready(self):
+        import posts.signals  # import signals to ensure they are registered
+        from posts import response_cache
+        if response_cache.enabled():
+            response_cache._cache() #refuses a cache that isn't shared by the workers at startup, not on the first request
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db.models import Count, F
+from .models import Post, Like, Comment
+from . import like_shards, live, ranking, response_cache
+
+#denormalized like_count/comment_count on Post. every change is a single UPDATE with an F-expression,
+#so concurrent writers never read-modify-write the counter; drift is repaired by `reconcile_post_counters`
+
+#add delta to a counter column of one post, moving its popularity along in the same statement; returns
+#whether the post was updated
+def adjust(post_id, field, delta):
+    queryset = Post.objects.filter(id=post_id)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta}) #counters never go negative, even after drift
+    updated = queryset.update(popularity=ranking.adjusted(field, delta), **{field: F(field) + delta})
+    response_cache.invalidate_counts(post_id, comments=field == 'comment_count') #and, for deletions, the comments behind them
+    return bool(updated)
+
+#a toggled like goes to a counter shard instead of the post row when LIKE_COUNTER_SHARDS is set (see posts/like_shards.py)
+def like_changed(post_id, delta):
+    if settings.LIKE_COUNTER_SHARDS > 0:
+        like_shards.add(post_id, delta)
+        response_cache.invalidate_counts(post_id)
+    else:
+        adjust(post_id, 'like_count', delta)
+    live.counts_changed(post_id, likes=delta)
+
+def like_added(post_id):
+    like_changed(post_id, 1)
+
+def like_removed(post_id):
+    like_changed(post_id, -1)
+
+def comment_added(post_id):
+    adjust(post_id, 'comment_count', 1)
+    live.counts_changed(post_id, comments=1)
+
+def comment_removed(post_id, n=1):
+    adjust(post_id, 'comment_count', -n)
+    live.counts_changed(post_id, comments=-n)
+
+#decrement counters for a whole set of likes/comments that is about to be deleted (e.g. by a user cascade)
+def release(likes, comments):
+    for post_id, n in likes.values('post_id').annotate(n=Count('id')).values_list('post_id', 'n'):
+        adjust(post_id, 'like_count', -n)
+    for post_id, n in comments.values('post_id').annotate(n=Count('id')).values_list('post_id', 'n'):
+        adjust(post_id, 'comment_count', -n)
+
+#actual counts for a batch of post ids, as {post_id: (like_count, comment_count)}
+def actual_counts(post_ids):
+    likes = dict(Like.objects.filter(post_id__in=post_ids).values('post_id').annotate(n=Count('id')).values_list('post_id', 'n'))
+    comments = dict(Comment.objects.filter(post_id__in=post_ids).values('post_id').annotate(n=Count('id')).values_list('post_id', 'n'))
+    return {post_id: (likes.get(post_id, 0), comments.get(post_id, 0)) for post_id in post_ids}
@@ -0,0 +1,114 @@
+import copy
+import heapq
+from itertools import islice
+from django.conf import settings
+from django.db.models import Q
+from .models import Post, TimelineEntry
+from .search import filter_posts
+from . import timeline
+
+#sort key shared by every feed source: highest field value (newest or most popular) first, post id breaks ties
+def feed_position(post, field='created_at'):
+    return (getattr(post, field), post.id)
+
+#keyset condition selecting rows after a (value, id) position in descending order, e.g. older than a post
+def keyset_before(before, field='created_at', id_field='id'):
+    value, post_id = before
+    return Q(**{f'{field}__lt': value}) | Q(**{field: value, f'{id_field}__lt': post_id})
+
+#keyset condition selecting rows before a (value, id) position in descending order, e.g. newer than a post
+def keyset_after(after, field='created_at', id_field='id'):
+    value, post_id = after
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, f'{id_field}__gt': post_id})
+
+#hybrid push/pull feed: the viewer's pushed timeline is k-way merged with the posts of followed
+#high-follower authors, which are pulled at read time. every source is read lazily in keyset chunks,
+#so producing a page only touches roughly one chunk per source.
+#ordering is 'created_at' (newest first) or 'popularity' (see posts/ranking.py); pulled authors are read
+#through the post (author, <ordering>, id) indexes either way. sorted by popularity, the feed ranks the posts
+#since the viewer's FEED_POPULARITY_WINDOW-th newest timeline entry: no index orders a timeline by score,
+#so the timeline source reads that many entries off the (user, created_at, post) index and sorts them
+class HybridFeed:
+    def __init__(self, user, filters=None, search=None, chunk_size=None, ordering='created_at'):
+        self.user = user
+        self.ordering = ordering
+        self.posts = Post.objects.filter(**(filters or {})).select_related('author') #search/date filters apply to every source
+        if search:
+            self.posts = filter_posts(self.posts, search)
+        self.chunk_size = chunk_size or settings.FEED_CHUNK_SIZE
+        self.pulled_author_ids = timeline.followed_pulled_author_ids(user.id)
+        self.window_start = self._window_start() if ordering != 'created_at' else None
+        if self.window_start is not None:
+            self.posts = self.posts.filter(created_at__gte=self.window_start)
+
+    #created_at of the oldest timeline entry within the popularity window, None for a shorter timeline
+    def _window_start(self):
+        window = settings.FEED_POPULARITY_WINDOW
+        entries = TimelineEntry.objects.filter(user=self.user).order_by('-created_at', '-post')
+        return next(iter(entries.values_list('created_at', flat=True)[window - 1:window]), None)
+
+    #scope of the pushed timeline; stale rows of authors that are now pulled are skipped so nothing appears twice
+    def _timeline_scope(self):
+        scope = Q(timeline_entries__user=self.user)
+        if self.pulled_author_ids:
+            scope &= ~Q(author_id__in=self.pulled_author_ids)
+        return scope
+
+    #lazily yield posts matching scope in descending order (ascending when reading forward from `after`), one chunk per query
+    def _source(self, scope, field, id_field, before=None, after=None):
+        descending = after is None
+        while True:
+            condition = scope #scope and keyset share one filter() so timeline lookups use a single join
+            if descending and before is not None:
+                condition = scope & keyset_before(before, field, id_field)
+            elif not descending:
+                condition = scope & keyset_after(after, field, id_field)
+            ordering = (f'-{field}', f'-{id_field}') if descending else (field, id_field)
+            chunk = list(self.posts.filter(condition).order_by(*ordering)[:self.chunk_size])
+            yield from chunk
+            if len(chunk) < self.chunk_size:
+                return
+            if descending:
+                before = feed_position(chunk[-1], self.ordering)
+            else:
+                after = feed_position(chunk[-1], self.ordering)
+
+    def sources(self, before=None, after=None):
+        if self.ordering == 'created_at': #the timeline's own (user, created_at, post) index
+            yield self._source(self._timeline_scope(), 'timeline_entries__created_at', 'timeline_entries__post', before, after)
+        else: #the viewer's timeline rows within the window, sorted by the score of their posts
+            scope = self._timeline_scope()
+            if self.window_start is not None:
+                scope &= Q(timeline_entries__created_at__gte=self.window_start)
+            yield self._source(scope, self.ordering, 'id', before, after)
+        for author_id in self.pulled_author_ids:
+            yield self._source(Q(author_id=author_id), self.ordering, 'id', before, after)
+
+    #merged posts in descending order, optionally after `before`; with `after`, the posts before it, in ascending order
+    def iter_posts(self, before=None, after=None):
+        return heapq.merge(
+            *self.sources(before, after), key=lambda post: feed_position(post, self.ordering), reverse=after is None
+        )
+
+    def __iter__(self):
+        return self.iter_posts()
+
+    #the same feed yielding values_list() rows of `fields` instead of posts (see posts/rows.py);
+    #the fields must include the ordering field, which positions the merge
+    def values_list(self, *fields, named=False):
+        feed = copy.copy(self)
+        feed.posts = self.posts.values_list(*fields, named=named)
+        return feed
+
+    def count(self):#used by page number pagination
+        total = self.posts.filter(self._timeline_scope()).count()
+        if self.pulled_author_ids:
+            total += self.posts.filter(author_id__in=self.pulled_author_ids).count()
+        return total
+
+    def __getitem__(self, index):#slicing merges only as far as the end of the requested page
+        if isinstance(index, slice):
+            return list(islice(self.iter_posts(), index.start, index.stop))
+        for post in islice(self.iter_posts(), index, None):
+            return post
+        raise IndexError('feed index out of range')
@@ -0,0 +1,167 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from users.models import User
+from .models import Post, Like
+from . import counters
+
+logger = logging.getLogger(__name__)
+
+#write-behind buffer for like toggles (LIKE_WRITE_BEHIND). a toggle costs one indexed read instead of
+#get + get_or_create/delete + counter update under row locks: it is recorded in memory as the wanted
+#state of (user, post), a second toggle before the flush cancels the first, and the surviving changes are
+#written with one bulk insert, one bulk delete and one counter update per post.
+#flushes run every LIKE_BUFFER_FLUSH_SECONDS on a background thread, at process exit, and inside the
+#request that brings the buffer to LIKE_BUFFER_MAX_PENDING toggles, which is the most a crash can lose.
+#the buffer is per process: like_count reads add this process's pending changes (see PostSerializer);
+#two workers buffering the same user's toggles can make a counter drift, `reconcile_post_counters` fixes it
+class LikeBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() #one flush at a time
+        self._pending = {} #(user_id, post_id) -> (liked, stored) for toggles not yet written
+        self._flushing = {} #the batch being written; its entries are still the latest known state
+        self._delta = Counter() #post_id -> like_count change of _pending
+        self._flushing_delta = Counter()
+        self._flusher = None
+        self._started = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    #(liked, stored) of a buffered key, stored being what the database holds once the batch in flight is written
+    def _current(self, key):
+        if key in self._pending:
+            return self._pending[key]
+        if key in self._flushing:
+            liked = self._flushing[key][0]
+            return (liked, liked)
+        return None
+
+    #whether the user likes the post in the database, None when the post doesn't exist; one query
+    def _stored(self, user_id, post_id):
+        liked = Like.objects.filter(user_id=user_id, post_id=OuterRef('pk'))
+        rows = Post.objects.filter(id=post_id).values_list(Exists(liked), flat=True)
+        return next(iter(rows), None)
+
+    #toggle the like and return whether the user now likes the post, or None when the post doesn't exist
+    def toggle(self, user_id, post_id):
+        key = (user_id, post_id)
+        with self._lock:
+            entry = self._current(key)
+        stored = entry[1] if entry else self._stored(user_id, post_id)
+        if stored is None:
+            return None
+
+        with self._lock:
+            entry = self._current(key) or (stored, stored) #another request may have toggled meanwhile
+            liked, stored = not entry[0], entry[1]
+            if liked == stored:
+                self._pending.pop(key, None) #toggled back: nothing to write
+            else:
+                self._pending[key] = (liked, stored)
+            self._delta[post_id] += 1 if liked else -1
+            full = len(self._pending) >= settings.LIKE_BUFFER_MAX_PENDING
+        self._start()
+        if full:
+            self.flush()
+        return liked
+
+    #like_count change of post_id not yet written to the database
+    def pending_likes(self, post_id):
+        return self._delta.get(post_id, 0) + self._flushing_delta.get(post_id, 0)
+
+    #write buffered toggles; returns the number of toggles written
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, {}
+                self._flushing_delta, self._delta = self._delta, Counter()
+            try:
+                self._write(self._flushing)
+            except Exception:
+                with self._lock:
+                    self._requeue()
+                raise
+            written = len(self._flushing)
+            with self._lock:
+                self._flushing, self._flushing_delta = {}, Counter()
+            return written
+
+    #put a batch that failed to write back under the toggles buffered since, which were relative to it
+    def _requeue(self):
+        for key, (liked, stored) in self._flushing.items():
+            if key in self._pending:
+                liked = self._pending[key][0]
+            if liked == stored:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = (liked, stored)
+        self._delta.update(self._flushing_delta)
+        self._flushing, self._flushing_delta = {}, Counter()
+
+    def _write(self, entries):
+        likes, unlikes = defaultdict(set), defaultdict(set) #post_id -> user ids
+        for (user_id, post_id), (liked, stored) in entries.items():
+            if liked != stored:
+                (likes if liked else unlikes)[post_id].add(user_id)
+
+        change = Counter()
+        with transaction.atomic():
+            if likes:
+                #the liked posts stay locked until the likes and counters are written, so a flush in another worker
+                #can't insert the same likes between the read of the existing ones and the insert: ignore_conflicts
+                #would skip those rows and both flushes would count them. posts or users deleted since the toggle
+                #are skipped
+                locked = Post.objects.select_for_update().filter(id__in=likes).order_by('id')
+                posts = set(locked.values_list('id', flat=True))
+                users = set(User.objects.filter(id__in=set().union(*likes.values())).values_list('id', flat=True))
+                new = []
+                for post_id in posts:
+                    existing = set(Like.objects.filter(post_id=post_id, user_id__in=likes[post_id]).values_list('user_id', flat=True))
+                    new.extend(Like(user_id=user_id, post_id=post_id) for user_id in (likes[post_id] & users) - existing)
+                Like.objects.bulk_create(new, ignore_conflicts=True)
+                change.update(like.post_id for like in new)
+            for post_id, user_ids in unlikes.items():
+                _, removed = Like.objects.filter(post_id=post_id, user_id__in=user_ids).delete()
+                change[post_id] -= removed.get(Like._meta.label, 0)
+            for post_id, delta in change.items():
+                if delta:
+                    counters.adjust(post_id, 'like_count', delta)
+
+    #drop buffered toggles without writing them (tests)
+    def reset(self):
+        with self._lock:
+            self._pending, self._flushing = {}, {}
+            self._delta, self._flushing_delta = Counter(), Counter()
+
+    #on the first toggle: flush at exit and start the interval flusher
+    def _start(self):
+        interval = settings.LIKE_BUFFER_FLUSH_SECONDS
+        with self._lock:
+            if not self._started:
+                self._started = True
+                atexit.register(self.flush)
+            if interval <= 0 or (self._flusher is not None and self._flusher.is_alive()):
+                return
+            self._flusher = threading.Thread(target=self._run, args=(interval,), name='like-buffer-flush', daemon=True)
+            self._flusher.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('flushing buffered likes failed, retrying in %ss', interval)
+            finally:
+                connection.close() #the flusher thread's own connection
+
+buffer = LikeBuffer()
@@ -0,0 +1,96 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from .models import LikeCounterShard
+from . import counters
+
+logger = logging.getLogger(__name__)
+
+#sharded like counters (LIKE_COUNTER_SHARDS). a like otherwise adds to like_count on the post row, and the row
+#lock that takes lasts until the like's transaction commits, so the likes of a viral post run one at a time.
+#with N shards a like adds to one of N LikeCounterShard rows of the post, picked at random, and up to N like
+#transactions on one post run at once. like_count reads add the shards (see PostSerializer), and a background
+#thread folds them into the post row every LIKE_SHARD_COMPACT_SECONDS. popularity, and the post's place in
+#?ordering=like_count, moves when its likes are folded
+
+#add delta to a random shard of the post; call inside the transaction that creates or deletes the like
+def add(post_id, delta):
+    shard = random.randrange(settings.LIKE_COUNTER_SHARDS)
+    shards = LikeCounterShard.objects.filter(post_id=post_id, shard=shard)
+    if not shards.update(delta=F('delta') + delta):
+        #first change since the shard was last folded: create it empty and add to it, so racing first changes both count
+        LikeCounterShard.objects.bulk_create([LikeCounterShard(post_id=post_id, shard=shard)], ignore_conflicts=True)
+        shards.update(delta=F('delta') + delta)
+    compactor.start()
+
+#{post_id: likes in its shards not yet in like_count} for the posts that have some. `lock` locks the
+#shards until the transaction ends, so a like can't commit between this read and one of the likes table
+def unfolded(post_ids, lock=False):
+    shards = LikeCounterShard.objects.filter(post_id__in=post_ids)
+    if lock:
+        shards = shards.select_for_update()
+    totals = defaultdict(int)
+    for post_id, delta in shards.values_list('post_id', 'delta'):
+        totals[post_id] += delta
+    return {post_id: total for post_id, total in totals.items() if total}
+
+#move the shards' deltas into like_count, in shard id order, batch_size shards per transaction; returns the
+#number of posts updated. each shard gives up only the delta that was read, so likes added meanwhile stay in it,
+#and two workers folding the same shard at once leave the sum of like_count and the shards right
+def compact(batch_size=1000):
+    last_id, folded = 0, 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                LikeCounterShard.objects.filter(id__gt=last_id).exclude(delta=0).order_by('id')
+                .values_list('id', 'post_id', 'delta')[:batch_size]
+            )
+            if not rows:
+                break
+            shards = defaultdict(list) #post_id -> [(shard id, delta)]
+            for shard_id, post_id, delta in rows:
+                shards[post_id].append((shard_id, delta))
+            for post_id, deltas in shards.items():
+                total = sum(delta for _, delta in deltas)
+                if total and not counters.adjust(post_id, 'like_count', total):
+                    continue #like_count drifted below the unlikes; left for reconcile_post_counters
+                for shard_id, delta in deltas:
+                    LikeCounterShard.objects.filter(id=shard_id).update(delta=F('delta') - delta)
+                folded += 1
+            #emptied shards go, so cold posts don't keep rows; hot ones recreate theirs on the next like
+            LikeCounterShard.objects.filter(id__in=[shard_id for shard_id, _, _ in rows], delta=0).delete()
+        last_id = rows[-1][0]
+    return folded
+
+
+#folds the shards every LIKE_SHARD_COMPACT_SECONDS on a background thread, started by the first sharded like
+class Compactor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        interval = settings.LIKE_SHARD_COMPACT_SECONDS
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(interval,), name='like-shard-compact', daemon=True)
+                self._thread.start()
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                compact()
+            except Exception:
+                logger.exception('folding like counter shards failed, retrying in %ss', interval)
+            finally:
+                connection.close() #the compactor thread's own connection
+
+compactor = Compactor()
@@ -0,0 +1,107 @@
+import json
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework.renderers import BaseRenderer
+from social_media_api.pubsub import RESET, broker
+from users.graph import follow_graph
+from users.models import Follow
+from .models import Post
+
+#live feed updates, streamed as server-sent events by LiveFeedView (ASGI only). a stream listens on the
+#channel of every author its user follows, which carries their new posts and the like/comment count changes
+#of their posts, and on the user's own channel, which says when the user follows or unfollows someone.
+#events are published once the transaction that made the change commits, and only by a process with streams
+#open (see social_media_api/pubsub.py): with the in-process broker, writes must go to the ASGI workers too
+
+AUTHOR_CACHE_SIZE = 65536
+RETRY_MS = 3000 #how long EventSource clients wait before reconnecting
+
+_authors = {} #post id -> author id, for routing count changes without a query per like
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+def _remember_author(post_id, author_id):
+    if len(_authors) >= AUTHOR_CACHE_SIZE:
+        _authors.clear()
+    _authors[post_id] = author_id
+
+def _author_of(post_id):
+    if post_id not in _authors:
+        author_id = Post.objects.filter(id=post_id).values_list('author_id', flat=True).first()
+        if author_id is None:
+            return None
+        _remember_author(post_id, author_id)
+    return _authors[post_id]
+
+def _publish(channel, name, data):
+    transaction.on_commit(partial(broker().publish, channel, name, data))
+
+def post_created(post):
+    _remember_author(post.id, post.author_id) #ids of rolled back posts are handed out again
+    if broker().active():
+        _publish(author_channel(post.author_id), 'post', {'id': post.id, 'author': post.author_id})
+
+#like/comment count changes of a post, sent as differences: {"id": 12, "likes": 1}
+def counts_changed(post_id, likes=0, comments=0):
+    if not broker().active():
+        return
+    author_id = _author_of(post_id)
+    if author_id is not None:
+        changes = {name: delta for name, delta in (('likes', likes), ('comments', comments)) if delta}
+        _publish(author_channel(author_id), 'counts', {'id': post_id, **changes})
+
+def following_changed(user_id, author_id, following):
+    if broker().active():
+        _publish(user_channel(user_id), 'following', {'author': author_id, 'following': following})
+
+def followed_author_ids(user_id):
+    if settings.FOLLOW_GRAPH_INDEX:
+        return list(follow_graph.following_of(user_id))
+    return list(Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True))
+
+#for a stream, which would otherwise keep the database connections of its request open until it ends
+@sync_to_async
+def _followed_author_ids(user_id):
+    try:
+        return followed_author_ids(user_id)
+    finally:
+        connections.close_all()
+
+def channels(user_id, author_ids):
+    return [user_channel(user_id), *map(author_channel, author_ids)]
+
+def encode(event):
+    lines = [f'id: {event.id}', f'event: {event.name}', f'data: {json.dumps(event.data, separators=(",", ":"))}']
+    return '\n'.join(lines) + '\n\n'
+
+#the body of one stream: events for the user from `last_event_id` on, and a comment line after every
+#LIVE_FEED_HEARTBEAT_SECONDS without one. it ends when the client disconnects, which cancels it
+async def stream(user_id, last_event_id=None):
+    subscription = broker().subscribe(channels(user_id, await _followed_author_ids(user_id)), last_event_id)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            events = await subscription.get(settings.LIVE_FEED_HEARTBEAT_SECONDS)
+            if not events:
+                yield ':\n\n'
+                continue
+            if any(event.name in ('following', RESET) for event in events):
+                subscription.listen(channels(user_id, await _followed_author_ids(user_id)))
+            yield ''.join(map(encode, events))
+    finally:
+        subscription.close()
+
+#lets a request accepting only text/event-stream through content negotiation; the events themselves are
+#streamed by the view, so this only renders error responses
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'events'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
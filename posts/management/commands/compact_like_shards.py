@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from posts import like_shards
+
+#fold like counter shards into like_count; the workers do it themselves every LIKE_SHARD_COMPACT_SECONDS,
+#so run this from cron when that is 0, or before reading like_count straight from the database
+class Command(BaseCommand):
+    help = 'Fold the like counter shards (LIKE_COUNTER_SHARDS) into like_count and popularity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='shards folded per transaction')
+
+    def handle(self, *args, **options):
+        folded = like_shards.compact(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Folded the like counter shards of {folded} post(s).'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.models import Post, PostToken
+from posts import search
+
+#build the post search index for existing posts (e.g. after the initial migration)
+class Command(BaseCommand):
+    help = 'Rebuild the inverted search index over post content in id-ordered batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='posts indexed per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, indexed = 0, 0
+        while True:
+            batch = list(Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'content')[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                PostToken.objects.filter(post_id__in=[post_id for post_id, _ in batch]).delete()
+                search.index_posts(batch, batch_size=batch_size)
+            last_id = batch[-1][0]
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} post(s).'))
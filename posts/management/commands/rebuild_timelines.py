@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from users.models import User
+from posts import timeline
+
+#rebuild materialized feed timelines from the follow graph (e.g. after the initial migration)
+class Command(BaseCommand):
+    help = 'Rebuild feed timelines for all users, or only for the given user ids.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='only rebuild these users')
+        parser.add_argument('--limit', type=int, default=None, help='posts copied per followed author (default: TIMELINE_BACKFILL_LIMIT)')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id').values_list('id', flat=True)
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+        
+        rebuilt = 0
+        for user_id in users.iterator():
+            timeline.rebuild(user_id, limit=options['limit'])
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timeline(s).'))
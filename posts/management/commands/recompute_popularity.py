@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.models import Post
+from posts import ranking, response_cache
+
+#scores drift slightly from their formula through incremental float updates, and all of them change when the
+#weights or the half-life do; run periodically (e.g. nightly from cron) and after changing POPULARITY_* settings
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed popularity score of posts in id-ordered batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='posts scored per batch')
+        parser.add_argument('--tolerance', type=float, default=1e-9, help='smallest difference that is written')
+
+    def handle(self, *args, **options):
+        batch_size, tolerance = options['batch_size'], options['tolerance']
+        last_id, checked, updated = 0, 0, 0
+        while True:
+            with transaction.atomic():
+                #lock the batch so concurrent counter updates wait instead of being overwritten
+                batch = list(
+                    Post.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                    .only('id', 'like_count', 'comment_count', 'created_at', 'popularity')[:batch_size]
+                )
+                if not batch:
+                    break
+                stale = []
+                for post in batch:
+                    score = ranking.popularity(post.like_count, post.comment_count, post.created_at)
+                    if abs(score - post.popularity) > tolerance:
+                        post.popularity = score
+                        stale.append(post)
+                Post.objects.bulk_update(stale, Post.RANKING_FIELDS)
+            last_id = batch[-1].id
+            checked += len(batch)
+            updated += len(stale)
+        if updated:
+            response_cache.invalidate(response_cache.RANKED) #post details don't show the score; only the list order moves
+
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} post(s). Updated {updated} popularity score(s).'))
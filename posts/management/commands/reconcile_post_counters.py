@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts.models import Post, LikeCounterShard
+from posts import counters, like_shards, ranking, response_cache
+
+#repair drift between the denormalized counters on Post and the likes/comments tables
+class Command(BaseCommand):
+    help = 'Recompute like_count and comment_count on posts in id-ordered batches and fix the ones that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='posts checked per batch')
+        parser.add_argument('--dry-run', action='store_true', help='report drift without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, checked, fixed = 0, 0, 0
+        while True:
+            with transaction.atomic():
+                #lock the batch so concurrent F() updates wait instead of racing the recount
+                batch = list(
+                    Post.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'like_count', 'comment_count', 'created_at')[:batch_size]
+                )
+                if not batch:
+                    break
+                post_ids = [post_id for post_id, _, _, _ in batch]
+                #like counter shards are folded into the recount; locked first, so a like commits before both reads or after
+                unfolded = like_shards.unfolded(post_ids, lock=True)
+                actual = counters.actual_counts(post_ids)
+                drifted = {
+                    post_id for post_id, like_count, comment_count, _ in batch
+                    if (like_count + unfolded.get(post_id, 0), comment_count) != actual[post_id]
+                }
+                stale = [
+                    Post(
+                        id=post_id, like_count=actual[post_id][0], comment_count=actual[post_id][1],
+                        popularity=ranking.popularity(*actual[post_id], created_at),
+                    )
+                    for post_id, _, _, created_at in batch
+                    if post_id in drifted or post_id in unfolded
+                ]
+                if stale and not options['dry_run']:
+                    Post.objects.bulk_update(stale, Post.COUNTER_FIELDS + Post.RANKING_FIELDS)
+                    LikeCounterShard.objects.filter(post_id__in=unfolded).delete()
+                    response_cache.invalidate(response_cache.RANKED, *(f'post:{post.id}' for post in stale))
+            last_id = batch[-1][0]
+            checked += len(batch)
+            fixed += len(drifted)
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} post(s). {verb} {fixed} with drifted counters.'))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def score_existing(apps, schema_editor):
+    from posts.ranking import popularity
+    Post = apps.get_model('posts', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'like_count', 'comment_count', 'created_at').iterator(chunk_size=1000):
+        post.popularity = popularity(post.like_count, post.comment_count, post.created_at)
+        batch.append(post)
+        if len(batch) >= 1000:
+            Post.objects.bulk_update(batch, ['popularity'])
+            batch = []
+    Post.objects.bulk_update(batch, ['popularity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_posttoken'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='popularity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['popularity', 'id'], name='post_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'popularity', 'id'], name='post_author_popularity_idx'),
+        ),
+        migrations.RunPython(score_existing, migrations.RunPython.noop),
+    ]
@@ -1,27 +1,82 @@
 from django.db import models
+from django.utils import timezone
 from users.models import User
+from social_media_api.models import MaintainedFieldsMixin
+from . import ranking
 
 # Create your models here.
 #model representing a social media post
-class Post(models.Model):
+class Post(MaintainedFieldsMixin, models.Model):
+    COUNTER_FIELDS = ('like_count', 'comment_count')
+    RANKING_FIELDS = ('popularity',)
+    
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    like_count = models.PositiveIntegerField(default=0, db_index=True) #denormalized, kept in step with Like rows
+    comment_count = models.PositiveIntegerField(default=0, db_index=True) #denormalized, kept in step with Comment rows
+    popularity = models.FloatField(default=0) #time-decayed score, moved with the counters (see posts/ranking.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', 'created_at', 'id'], name='post_author_created_idx'), #pulled feed sources
+            models.Index(fields=['created_at', 'id'], name='post_created_idx'), #keyset pagination of the post list
+            models.Index(fields=['popularity', 'id'], name='post_popularity_idx'), #popularity-sorted post list
+            models.Index(fields=['author', 'popularity', 'id'], name='post_author_popularity_idx'), #popularity-sorted pulled feed sources
+        ]
 
     def __str__(self):
         return f'Post by {self.author.username} at {self.created_at}'
     
-#model representing a comment on a post
-class Comment(models.Model):
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.created_at is None: #created_at is stamped during the insert, a moment later
+            self.popularity = ranking.popularity(self.like_count, self.comment_count, timezone.now())
+        super().save(*args, **kwargs)
+    
+#model representing a comment on a post; replies form threads stored as materialized paths (see posts/threads.py)
+class Comment(MaintainedFieldsMixin, models.Model):
+    COUNTER_FIELDS = ('reply_count',)
+    PATH_STEP = 8 #base-36 digits per path segment, enough for ids up to 36**8
+    MAX_DEPTH = 255 // PATH_STEP - 1 #deepest reply level a 255 character path holds
+
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
+    path = models.CharField(max_length=255, default='') #ids of the thread's comments from its top-level one down to this one
+    depth = models.PositiveSmallIntegerField(default=0) #0 for top-level comments
+    reply_count = models.PositiveIntegerField(default=0) #denormalized number of direct replies
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'), #keyset pagination per post
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'), #subtrees as path ranges
+            models.Index(fields=['post', 'depth', 'path'], name='comment_post_depth_path_idx'), #top-level comments and their replies
+        ]
+
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.id}'
+
+    @classmethod
+    def path_segment(cls, comment_id):
+        digits = ''
+        while comment_id:
+            comment_id, digit = divmod(comment_id, 36)
+            digits = '0123456789abcdefghijklmnopqrstuvwxyz'[digit] + digits
+        return digits.rjust(cls.PATH_STEP, '0')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        parent = self.parent if self.parent_id else None
+        self.depth = parent.depth + 1 if parent else 0
+        super().save(*args, **kwargs)
+        if not self.path: #the path ends with the id, known once the row is inserted
+            self.path = (parent.path if parent else '') + self.path_segment(self.id)
+            Comment.objects.filter(id=self.id).update(path=self.path)
     
 #model representing a like on a post
 class Like(models.Model):
@@ -31,6 +86,53 @@ class Like(models.Model):
     
     class Meta:
         unique_together = ('user', 'post') #ensures a user can like a post only once
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='like_post_created_idx'), #keyset pagination per post
+        ]
     
     def __str__(self):
-        return f'Like by {self.user.username} on {self.post.id}'
\ No newline at end of file
+        return f'Like by {self.user.username} on {self.post.id}'
+
+#model representing a post materialized into a follower's timeline (fan-out on write)
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+') #denormalized so unfollow can trim without joining posts
+    created_at = models.DateTimeField() #copy of post.created_at so the feed is ordered from this table alone
+
+    class Meta:
+        unique_together = ('user', 'post') #a post appears at most once per timeline
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'post'], name='timeline_user_created_idx'), #feed range scan
+            models.Index(fields=['user', 'author'], name='timeline_user_author_idx'), #trim on unfollow
+        ]
+
+    def __str__(self):
+        return f'Post {self.post_id} in timeline of user {self.user_id}'
+
+
+#model representing one token of a post's content in the search inverted index (token -> posts)
+class PostToken(models.Model):
+    token = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='tokens')
+    count = models.PositiveSmallIntegerField(default=1) #occurrences of the token in the post, used for ranking
+
+    class Meta:
+        unique_together = ('token', 'post') #(token, post) index serves exact and prefix lookups
+
+    def __str__(self):
+        return f'{self.token} in post {self.post_id}'
+
+
+#model representing one of a post's like counter shards: with LIKE_COUNTER_SHARDS set, like toggles add to a
+#shard row instead of the post row, and the shards are folded back into like_count later (see posts/like_shards.py)
+class LikeCounterShard(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='like_shards')
+    shard = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default=0) #likes not yet folded into post.like_count, negative after unlikes
+
+    class Meta:
+        unique_together = ('post', 'shard')
+
+    def __str__(self):
+        return f'Like counter shard {self.shard} of post {self.post_id}'
@@ -0,0 +1,163 @@
+from asgiref.sync import sync_to_async
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from itertools import islice
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from .feed import HybridFeed, feed_position, keyset_after, keyset_before
+
+#orderings a keyset (value, id) position can page through, and the field holding the value
+KEYSET_ORDERINGS = {
+    (): 'created_at',
+    ('-created_at',): 'created_at',
+    ('-created_at', '-id'): 'created_at',
+    ('-popularity',): 'popularity',
+    ('-popularity', '-id'): 'popularity',
+}
+
+#keyset pagination on (created_at, id), newest first, or (popularity, id), most popular first. pages are
+#fetched with an indexed range condition instead of OFFSET and without COUNT(*), so any page costs the
+#same and rows inserted while a client is paging don't shift later pages.
+#clients that send `?page=` opt into page number pagination, which is also used when the list
+#is ordered by something else (e.g. ?ordering=like_count)
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    invalid_cursor_message = 'Invalid cursor'
+    fallback_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_fallback(queryset, request):
+            return self.fallback.paginate_queryset(queryset, request, view)
+        return self.set_page(list(self.page_rows(queryset, request)))
+
+    #same as paginate_queryset, fetching the page with the async ORM (see social_media_api/async_views.py)
+    async def apaginate_queryset(self, queryset, request, view=None):
+        if self.use_fallback(queryset, request):
+            return await sync_to_async(self.fallback.paginate_queryset)(queryset, request, view)
+        rows = self.page_rows(queryset, request)
+        if isinstance(queryset, HybridFeed):
+            page = await sync_to_async(list)(rows) #the merge pulls chunks from its sources as it goes
+        else:
+            page = [row async for row in rows]
+        return self.set_page(page)
+
+    def use_fallback(self, queryset, request):
+        self.field = self.keyset_field(queryset)
+        page_numbers = self.page_query_param in request.query_params or self.field is None
+        self.fallback = self.fallback_class() if page_numbers else None
+        return page_numbers
+
+    #the rows of the requested page plus one extra row, which tells whether there is another page in that direction
+    def page_rows(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+        position = self.position
+
+        if isinstance(queryset, HybridFeed):
+            queryset.chunk_size = self.page_size + 1 #one chunk per source is always enough for a page
+            posts = queryset.iter_posts(after=position) if self.reverse else queryset.iter_posts(before=position)
+            return islice(posts, self.page_size + 1)
+        if self.reverse:
+            queryset = queryset.filter(keyset_after(position, self.field)).order_by(self.field, 'id')
+        else:
+            if position is not None:
+                queryset = queryset.filter(keyset_before(position, self.field))
+            queryset = queryset.order_by(f'-{self.field}', '-id')
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, page):
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.page = page
+        return page
+
+    #field of the keyset position, None when the ordering can't be paged by keyset
+    def keyset_field(self, queryset):
+        if isinstance(queryset, HybridFeed):
+            return queryset.ordering
+        return KEYSET_ORDERINGS.get(tuple(queryset.query.order_by))
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    #cursor is an opaque token holding the (value, id) of the row to continue from and the direction
+    def encode_cursor(self, post, reverse):
+        value, post_id = feed_position(post, self.field)
+        value = value.isoformat() if isinstance(value, datetime) else repr(value)
+        token = f'{value}|{post_id}|{"p" if reverse else "n"}'
+        cursor = urlsafe_b64encode(token.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            value, post_id, direction = force_str(urlsafe_b64decode(cursor.encode('ascii'))).split('|')
+            value = datetime.fromisoformat(value) if self.field == 'created_at' else float(value)
+            return (value, int(post_id)), direction == 'p'
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if self.fallback is not None:
+            return self.fallback.get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if self.fallback is not None:
+            return self.fallback.get_previous_link()
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'The pagination cursor value.', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': 'Number of results to return per page.', 'schema': {'type': 'integer'}},
+            {'name': self.page_query_param, 'required': False, 'in': 'query',
+             'description': 'Opt into page number pagination.', 'schema': {'type': 'integer'}},
+        ]
@@ -0,0 +1,39 @@
+import math
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Log
+
+#time-decayed popularity stored on Post.popularity:
+#    popularity = log2(1 + likes * LIKE_WEIGHT + comments * COMMENT_WEIGHT) + created_at / half-life
+#ordering by it is ordering by engagement * 2 ** -(age / half-life): a post needs twice the engagement to
+#rank level with one a half-life younger. the age term is fixed when the post is created, so the score
+#never has to be refreshed as time passes: it only changes with the counters, in the same UPDATE, and an
+#index on it keeps popularity-sorted pages a range scan
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+def engagement(like_count, comment_count):
+    return like_count * settings.POPULARITY_LIKE_WEIGHT + comment_count * settings.POPULARITY_COMMENT_WEIGHT
+
+def age_term(created_at):
+    return (created_at - EPOCH).total_seconds() / (settings.POPULARITY_HALF_LIFE_HOURS * 3600)
+
+def popularity(like_count, comment_count, created_at):
+    return math.log2(1 + engagement(like_count, comment_count)) + age_term(created_at)
+
+def _log_engagement(like_delta=0, comment_delta=0):
+    likes = Cast(F('like_count'), FloatField()) + like_delta
+    comments = Cast(F('comment_count'), FloatField()) + comment_delta
+    weighted = likes * settings.POPULARITY_LIKE_WEIGHT + comments * settings.POPULARITY_COMMENT_WEIGHT
+    return Log(Value(2.0), weighted + 1.0)
+
+#the engagement part of the score at the current counters, for moving scores across a recount
+def engagement_term():
+    return _log_engagement()
+
+#update expression moving popularity along with `counter += delta`. it reads the counters before the
+#update, so it must come first in the UPDATE's SET list (MySQL evaluates assignments left to right)
+def adjusted(counter, delta):
+    deltas = {'like_delta': delta} if counter == 'like_count' else {'comment_delta': delta}
+    return F('popularity') + _log_engagement(**deltas) - _log_engagement()
@@ -0,0 +1,155 @@
+import hashlib
+import uuid
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from social_media_api import replicas
+from social_media_api.caching import shared_cache
+
+#rendered JSON responses of the public post reads, cached under versioned keys. a view names the scopes
+#its response depends on (e.g. 'post:{pk}'); each scope has a version token in the cache, and the
+#response key includes the current tokens, so bumping a scope (see posts/signals.py) makes every
+#response built on it unreachable without having to find and delete them. a hit skips the ORM and DRF
+#rendering, and a client revalidating with If-None-Match gets a 304 without a body.
+#
+#a list page also depends on each item it shows (cache_item_scope, e.g. 'post:{id}'): the versions of those
+#scopes are stored with the page and checked on every hit, so a like makes stale only the pages showing the
+#liked post (and the lists ordered by counts) rather than every cached list.
+#
+#the versions are only right if every worker sees the same ones, so the cache is the shared one
+#RESPONSE_CACHE_ALIAS names (see social_media_api/caching.py); without it responses aren't cached
+
+VERSION_PREFIX = 'response:version:'
+KEY_PREFIX = 'response:'
+POSTS = 'posts' #which posts the lists show and what they say: a post was created, edited or deleted
+RANKED = 'posts:ranked' #the order of lists sorted by counts or popularity, which every like and comment moves
+
+def enabled():
+    return settings.RESPONSE_CACHE_SECONDS > 0 and bool(settings.RESPONSE_CACHE_ALIAS)
+
+def _cache():
+    return shared_cache('RESPONSE_CACHE_ALIAS')
+
+#invalidate every cached response that depends on any of the scopes
+def invalidate(*scopes):
+    if enabled():
+        _cache().set_many({VERSION_PREFIX + scope: uuid.uuid4().hex for scope in scopes}, None)
+
+#a post was created, edited or deleted: the lists, its detail and its comments
+def invalidate_post(post_id):
+    invalidate(POSTS, RANKED, f'post:{post_id}', f'comments:{post_id}')
+
+#a post's like or comment count changed: its detail, the list pages showing it and the lists ordered by counts,
+#and its comments when `comments` changed
+def invalidate_counts(post_id, comments=False):
+    invalidate(RANKED, f'post:{post_id}', *([f'comments:{post_id}'] if comments else []))
+
+def _etag(content):
+    return f'"{hashlib.sha1(content).hexdigest()}"'
+
+#the cache lookup for one request to a view; only JSON renderings are cached, the browsable API is per user
+class ResponseCache:
+    def __init__(self, view, request):
+        self.request = request
+        self.enabled = enabled() and request.accepted_renderer.format == 'json'
+        self.scopes = [scope.format(**view.kwargs) for scope in view.get_cache_scopes()]
+        self.item_scope = view.cache_item_scope
+        self.vary = [request.accepted_media_type]
+        if view.cache_per_user:
+            self.vary.append(str(request.user.pk))
+        self.key = None
+
+    def _version_keys(self):
+        return [VERSION_PREFIX + scope for scope in self.scopes]
+
+    def _set_key(self, versions):
+        query = sorted((name, values) for name, values in self.request.query_params.lists())
+        parts = [self.request.path, repr(query), *self.vary, *(versions.get(key, '-') for key in self._version_keys())]
+        self.key = KEY_PREFIX + hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+    #the versions an entry was stored with are still current: nothing it shows has changed since
+    @staticmethod
+    def _current(entry, versions):
+        return entry is not None and all(versions.get(key) == version for key, version in entry[3].items())
+
+    def _respond(self, entry):
+        if entry is None: #the miss is stored under the current versions, so it is read from the primary
+            replicas.use_primary()
+            return None
+        etag, content_type, content, _ = entry
+        etags = parse_etags(self.request.headers.get('If-None-Match', ''))
+        response = HttpResponseNotModified() if etag in etags or '*' in etags else HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        return response
+
+    #the cached response, or None on a miss
+    def response(self):
+        if not self.enabled:
+            return None
+        self._set_key(_cache().get_many(self._version_keys()))
+        entry = _cache().get(self.key)
+        if entry is not None and entry[3]:
+            entry = entry if self._current(entry, _cache().get_many(list(entry[3]))) else None
+        return self._respond(entry)
+
+    async def aresponse(self):
+        if not self.enabled:
+            return None
+        self._set_key(await _cache().aget_many(self._version_keys()))
+        entry = await _cache().aget(self.key)
+        if entry is not None and entry[3]:
+            entry = entry if self._current(entry, await _cache().aget_many(list(entry[3]))) else None
+        return self._respond(entry)
+
+    #version keys of the items a list response shows
+    def _item_keys(self, response):
+        if self.item_scope is None:
+            return []
+        data = response.data
+        items = data.get('results', []) if isinstance(data, dict) else data
+        return [VERSION_PREFIX + self.item_scope.format(**item) for item in items]
+
+    #cache a fresh response once it is rendered. versions were read before the queries ran, so a write
+    #racing with this request stores the old data under the old versions, where nobody looks any more.
+    #the items' versions can only be read once the page is known, after its query: a count change
+    #committing in between leaves that page stale until the item changes again or the entry expires
+    def store(self, response):
+        if not self.enabled or self.key is None or response.status_code != 200:
+            return response
+        key, item_keys = self.key, self._item_keys(response)
+
+        def cache_rendered(rendered):
+            etag = _etag(rendered.content)
+            rendered['ETag'] = etag
+            items = _cache().get_many(item_keys) if item_keys else {}
+            entry = (etag, rendered['Content-Type'], rendered.content, {key: items.get(key) for key in item_keys})
+            _cache().set(key, entry, settings.RESPONSE_CACHE_SECONDS)
+
+        response.add_post_render_callback(cache_rendered)
+        return response
+
+#caches GET responses of a view. cache_scopes are formatted with the URL kwargs, cache_item_scope with each
+#item of a list response; cache_per_user adds the user to the key for views whose output depends on who asks
+class CachedResponseMixin:
+    cache_scopes = ()
+    cache_item_scope = None
+    cache_per_user = False
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def get(self, request, *args, **kwargs):
+        cache = ResponseCache(self, request)
+        cached = cache.response()
+        if cached is not None:
+            return cached
+        return cache.store(super().get(request, *args, **kwargs))
+
+#CachedResponseMixin for async views (see social_media_api/async_views.py)
+class AsyncCachedResponseMixin:
+    async def get(self, request, *args, **kwargs):
+        cache = ResponseCache(self, request)
+        cached = await cache.aresponse()
+        if cached is not None:
+            return cached
+        return cache.store(await super().get(request, *args, **kwargs))
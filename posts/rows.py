@@ -0,0 +1,140 @@
+from functools import cached_property, lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .serializers import PostSerializer, CommentSerializer, LikeSerializer
+from . import like_buffer, like_shards
+
+#read-only fast path for list endpoints (FAST_LIST_SERIALIZATION). a page is fetched as named
+#values_list() rows holding exactly the serializer's columns, the author username joined in SQL, and each
+#row becomes a dict through a function compiled once from the serializer's own fields: no model
+#instances, no serializer per page, no attribute walks. fields whose to_representation only re-casts the
+#database value (ids, counters, text, usernames) are copied; the others (datetimes) reuse the DRF field,
+#so the JSON is byte-identical to the ModelSerializer's. ISO 8601 datetimes are formatted here with the
+#current timezone looked up once per page, DRF looks it up for every value
+
+#fields whose to_representation returns database values of their type unchanged
+PASSTHROUGH_FIELDS = (serializers.ReadOnlyField, serializers.IntegerField, serializers.CharField)
+
+#fields that don't map to a single column value
+UNSUPPORTED_FIELDS = (serializers.BaseSerializer, serializers.SerializerMethodField, serializers.RelatedField, serializers.ManyRelatedField)
+
+#DateTimeField.to_representation for aware values in the ISO 8601 format, converting to `tz`
+def iso_datetime(field, tz):
+    fallback = field.to_representation
+
+    def convert(value):
+        if value.utcoffset() is None:
+            return fallback(value)
+        try:
+            text = value.astimezone(tz).isoformat()
+        except OverflowError:
+            return fallback(value) #raises DRF's validation error
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+def is_iso_datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    return isinstance(field, serializers.DateTimeField) and output_format is not None and output_format.lower() == ISO_8601
+
+class RowSerializer:
+    serializer_class = None
+    extra_columns = () #selected for the paginator (keyset positions) but not serialized
+
+    #(field name, column, field) for each readable field, in output order
+    @cached_property
+    def fields(self):
+        readable = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, UNSUPPORTED_FIELDS):
+                raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name} has no column to read from')
+            readable.append((name, '__'.join(field.source_attrs), field))
+        return readable
+
+    @cached_property
+    def columns(self):
+        return tuple(column for _, column, _ in self.fields) + tuple(self.extra_columns)
+
+    #row -> dict function for datetimes shown in `tz` (the current timezone, None without USE_TZ)
+    @lru_cache(maxsize=16)
+    def compile(self, tz):
+        names = tuple(name for name, _, _ in self.fields) #zip() stops at the names, dropping extra columns
+        converters = []
+        for name, _, field in self.fields:
+            field_tz = field.timezone if hasattr(field, 'timezone') else tz #as in DateTimeField.enforce_timezone
+            if is_iso_datetime(field) and field_tz is not None:
+                converters.append((name, iso_datetime(field, field_tz)))
+            elif type(field) not in PASSTHROUGH_FIELDS:
+                converters.append((name, field.to_representation))
+
+        def to_dict(row):
+            data = dict(zip(names, row))
+            for name, convert in converters:
+                value = data[name]
+                if value is not None: #like DRF, null values skip to_representation
+                    data[name] = convert(value)
+            return data
+        return to_dict
+
+    #the queryset (or HybridFeed) reading rows instead of instances
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns, named=True)
+
+    def serialize(self, rows):
+        to_dict = self.compile(timezone.get_current_timezone() if settings.USE_TZ else None)
+        return [to_dict(row) for row in rows]
+
+
+class PostRows(RowSerializer):
+    serializer_class = PostSerializer
+    extra_columns = ('popularity',) #keyset position of ?ordering=-popularity and the popularity feed
+
+    def serialize(self, rows):
+        data = super().serialize(rows)
+        if settings.LIKE_WRITE_BEHIND: #same as PostSerializer.to_representation
+            for item in data:
+                item['like_count'] += like_buffer.buffer.pending_likes(item['id'])
+        if settings.LIKE_COUNTER_SHARDS > 0 and data: #one query for the page's shards
+            unfolded = like_shards.unfolded([item['id'] for item in data])
+            for item in data:
+                item['like_count'] += unfolded.get(item['id'], 0)
+        return data
+
+
+class CommentRows(RowSerializer):
+    serializer_class = CommentSerializer
+
+
+class LikeRows(RowSerializer):
+    serializer_class = LikeSerializer
+
+
+post_rows, comment_rows, like_rows = PostRows(), CommentRows(), LikeRows()
+
+
+#list views serialize their page through `row_serializer` when FAST_LIST_SERIALIZATION is on; works with
+#the sync ListModelMixin and AsyncListMixin, which both filter, paginate and then call get_serializer(many=True)
+class RowListMixin:
+    row_serializer = None
+
+    def use_rows(self):
+        return settings.FAST_LIST_SERIALIZATION and getattr(self, 'action', 'list') == 'list' and self.request.method == 'GET'
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.row_serializer.rows(queryset) if self.use_rows() else queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args and self.use_rows():
+            return RowListSerializer(self.row_serializer.serialize(args[0]))
+        return super().get_serializer(*args, **kwargs)
+
+
+#the part of a list serializer the list views use
+class RowListSerializer:
+    def __init__(self, data):
+        self.data = data
@@ -0,0 +1,142 @@
+import math
+import re
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, FloatField, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from rest_framework.filters import BaseFilterBackend
+from users.models import User
+from .models import Post, PostToken
+
+#inverted index over Post.content: every post stores its distinct tokens in PostToken, so a search term is
+#an indexed (token, post) range scan instead of a LIKE '%term%' scan over the whole posts table
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TOKEN_LENGTH = PostToken._meta.get_field('token').max_length
+MAX_QUERY_TERMS = 8
+
+#lowercased word tokens of a text
+def tokenize(text):
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall(text.lower())]
+
+#token rows for a post, one per distinct token with its frequency
+def post_tokens(post_id, content):
+    return [PostToken(token=token, post_id=post_id, count=min(n, 32767)) for token, n in Counter(tokenize(content)).items()]
+
+#(re)index a single post; a new post has no tokens to clear
+def index_post(post, created=False):
+    if not created:
+        PostToken.objects.filter(post_id=post.id).delete()
+    PostToken.objects.bulk_create(post_tokens(post.id, post.content))
+
+#index many posts at once, e.g. from `rebuild_search_index`; expects (id, content) pairs of posts without tokens
+def index_posts(rows, batch_size=1000):
+    batch = []
+    for post_id, content in rows:
+        batch.extend(post_tokens(post_id, content))
+        if len(batch) >= batch_size:
+            PostToken.objects.bulk_create(batch, batch_size=batch_size)
+            batch = []
+    PostToken.objects.bulk_create(batch, batch_size=batch_size)
+
+#parsed search terms as (token, is_prefix); the last term is matched as a prefix so partial words still hit
+def parse_query(query):
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    return [
+        (term, index == len(terms) - 1 and len(term) >= settings.SEARCH_MIN_PREFIX)
+        for index, term in enumerate(terms)
+    ]
+
+#token rows for a term; a prefix is matched as the range [term, next string after the prefix) so every
+#backend can walk the (token, post) index (a case-insensitive LIKE 'term%' can't use it on SQLite)
+def _token_rows(term, prefix):
+    if prefix:
+        upper = term[:-1] + chr(ord(term[-1]) + 1)
+        return PostToken.objects.filter(token__gte=term, token__lt=upper)
+    return PostToken.objects.filter(token=term)
+
+#posting counts of the terms, each counted up to limit + 1. counting is a walk over up to SEARCH_RANK_LIMIT
+#index entries per term, as long as the query itself for a common word, so counts are cached for
+#SEARCH_FREQUENCY_CACHE_SECONDS; a stale count only picks the plan and weights the ranking, never the matches
+def term_frequencies(terms, limit):
+    keys = [f'search:postings:{limit}:{int(prefix)}:{term}' for term, prefix in terms]
+    cached = cache.get_many(keys)
+    missing = {}
+    for key, (term, prefix) in zip(keys, terms):
+        if key not in cached:
+            missing[key] = _token_rows(term, prefix).values('id')[:limit + 1].count()
+    if missing:
+        cache.set_many(missing, settings.SEARCH_FREQUENCY_CACHE_SECONDS)
+    return [cached.get(key, missing.get(key)) for key in keys]
+
+#max id stands in for the post count: it's an index lookup, a COUNT(*) is a full scan at this size
+def post_total():
+    total = cache.get('search:post-total')
+    if total is None:
+        total = Post.objects.aggregate(n=Max('id'))['n'] or 1
+        cache.set('search:post-total', total, settings.SEARCH_FREQUENCY_CACHE_SECONDS)
+    return total
+
+#a parsed search query. each term's posting count is measured up to SEARCH_RANK_LIMIT (a bounded index
+#range count) and decides how the term is matched and whether results are ranked:
+#- rare terms become `id IN (postings)`, a short list the database probes by primary key
+#- common terms become a correlated EXISTS probe on the (token, post) index, so a newest-first walk over
+#  posts stops as soon as a page is full instead of materializing a huge posting list
+class PostSearch:
+    def __init__(self, query):
+        self.terms = parse_query(query)
+        limit = settings.SEARCH_RANK_LIMIT
+        self.frequencies = term_frequencies(self.terms, limit)
+        self.dense = [frequency > limit for frequency in self.frequencies]
+
+    def __bool__(self):
+        return bool(self.terms)
+
+    #posts matching every term in their content (or, when author_names is set, by author username prefix)
+    def filter(self, queryset, author_names=False):
+        for (term, prefix), dense in zip(self.terms, self.dense):
+            rows = _token_rows(term, prefix)
+            if dense:
+                condition = Q(Exists(rows.filter(post_id=OuterRef('pk'))))
+            else:
+                condition = Q(id__in=rows.values('post_id'))
+            if author_names:
+                condition |= Q(author_id__in=User.objects.filter(username__istartswith=term).values('id'))
+            queryset = queryset.filter(condition)
+        return queryset
+
+    #annotate search_rank = sum over terms of tf * idf and order by it, newest first on ties.
+    #ranking reads every posting of the query, so when even the rarest term is common the results are
+    #simply ordered newest first, which the created_at index serves directly
+    def rank(self, queryset):
+        if not self.terms or all(self.dense):
+            return queryset.order_by('-created_at', '-id')
+        total = post_total()
+        rank = Value(0.0, output_field=FloatField())
+        for (term, prefix), frequency in zip(self.terms, self.frequencies):
+            idf = math.log(1 + total / max(frequency, 1))
+            tf = _token_rows(term, prefix).filter(post_id=OuterRef('pk')).order_by().values('post_id').annotate(tf=Sum('count')).values('tf')
+            rank = rank + Coalesce(Subquery(tf, output_field=IntegerField()), 0) * Value(idf, output_field=FloatField())
+        return queryset.annotate(search_rank=rank).order_by(F('search_rank').desc(), '-created_at', '-id')
+
+#posts whose content matches every term of the query
+def filter_posts(queryset, query):
+    return PostSearch(query).filter(queryset)
+
+#drop-in replacement for DRF's SearchFilter on the post list: ?search= terms must each match the
+#post content through the inverted index or the author's username by prefix; results are ranked
+class PostSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = PostSearch(request.query_params.get(self.search_param, ''))
+        if not query:
+            return queryset
+        return query.rank(query.filter(queryset, author_names=True))
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param, 'required': False, 'in': 'query',
+            'description': 'Ranked search over post content and author usernames.', 'schema': {'type': 'string'},
+        }]
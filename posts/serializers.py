@@ -1,28 +1,55 @@
 from rest_framework import serializers
+from django.conf import settings
+from django.db import models
 from .models import Post, Comment, Like
+from . import like_buffer, like_shards
+
+#a page of posts reads the counter shards of all its posts in one query (like PostRows.serialize)
+class PostListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if settings.LIKE_COUNTER_SHARDS > 0:
+            self.child.unfolded_likes = like_shards.unfolded([post.id for post in posts])
+        try:
+            return super().to_representation(posts)
+        finally:
+            self.child.unfolded_likes = None
 
 #post serializer converts model instances to JSON and validates input data
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
+    unfolded_likes = None #{post id: likes in the counter shards} of the page being serialized, see PostListSerializer
+
     class Meta:
         model = Post
-        fields = ['id', 'author', 'content', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at'] #prevents clients from modifying these fields
+        fields = ['id', 'author', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count']
+        read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'like_count', 'comment_count'] #prevents clients from modifying these fields
+        list_serializer_class = PostListSerializer
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if settings.LIKE_WRITE_BEHIND and 'like_count' in data: #include likes still in the write-behind buffer
+            data['like_count'] += like_buffer.buffer.pending_likes(instance.id)
+        if settings.LIKE_COUNTER_SHARDS > 0 and 'like_count' in data: #include likes not yet folded from the counter shards
+            unfolded = self.unfolded_likes if self.unfolded_likes is not None else like_shards.unfolded([instance.id])
+            data['like_count'] += unfolded.get(instance.id, 0)
+        return data
         
 #comment serializer handles serialization and validation for comments
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
-    post = serializers.ReadOnlyField(source='post.id') #include post id in comment representation
+    post = serializers.ReadOnlyField(source='post_id') #include post id in comment representation (read from the FK column, no post fetch)
+    parent = serializers.IntegerField(source='parent_id', required=False, allow_null=True) #the comment replied to, checked by the view
     
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'author', 'content', 'created_at', 'updated_at']
-        read_only_fields = ['author', 'created_at', 'updated_at'] #prevents clients from modifying these fields
+        fields = ['id', 'post', 'parent', 'author', 'content', 'reply_count', 'created_at', 'updated_at']
+        read_only_fields = ['author', 'reply_count', 'created_at', 'updated_at'] #prevents clients from modifying these fields
        
 #like serializer shows who liked which post
 class LikeSerializer(serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source='user.username')
-    post = serializers.ReadOnlyField(source='post.id')
+    post = serializers.ReadOnlyField(source='post_id')
     
     class Meta:
         model = Like
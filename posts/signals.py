@@ -0,0 +1,43 @@
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from .models import Post, Like, Comment
+from . import counters, live, response_cache, search, threads
+
+User = get_user_model()
+
+#signal to release a deleted user's likes and comments, with the replies below them, from post and reply
+#counters before the cascade removes them
+@receiver(pre_delete, sender=User)
+def release_user_counters(sender, instance, **kwargs):
+    comments = Comment.objects.filter(author=instance).exclude(post__author=instance) #the user's own posts are deleted anyway
+    threads.release_replies(comments)
+    counters.release(Like.objects.filter(user=instance).exclude(post__author=instance), threads.with_replies(comments))
+
+#signal to keep the search index in step with post content
+@receiver(post_save, sender=Post)
+def index_post_content(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'content' in update_fields:
+        search.index_post(instance, created=created)
+
+#signal to send a new post to the live feed streams of its author's followers
+@receiver(post_save, sender=Post)
+def publish_new_post(sender, instance, created, **kwargs):
+    if created:
+        live.post_created(instance)
+
+#signals to invalidate cached post reads (see posts/response_cache.py)
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_responses(sender, instance, **kwargs):
+    response_cache.invalidate_post(instance.id)
+
+#likes and comments are invalidated on save only: a post_delete receiver would stop Django from deleting them
+#in bulk when a post or user cascades. every delete path adjusts the post counters, which invalidates instead
+@receiver(post_save, sender=Comment)
+def invalidate_comment_responses(sender, instance, **kwargs):
+    response_cache.invalidate_counts(instance.post_id, comments=True)
+
+@receiver(post_save, sender=Like)
+def invalidate_like_responses(sender, instance, **kwargs):
+    response_cache.invalidate_counts(instance.post_id)
@@ -0,0 +1,87 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework import status
+from posts import views
+from posts.models import Post, Comment, LikeCounterShard
+from users.models import Follow
+from posts import timeline
+
+User = get_user_model()
+
+#each async view against the sync view it extends
+PAIRS = [
+    (views.AsyncPostListView, views.PostListView),
+    (views.AsyncPostDetailView, views.PostDetailView),
+    (views.AsyncPostCommentListView, views.PostCommentListView),
+    (views.AsyncFeedView, views.FeedView),
+]
+
+class AsyncViewsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass123')
+        cls.author = User.objects.create_user(username='author', email='author@example.com', password='pass123')
+        Follow.objects.create(follower=cls.viewer, following=cls.author)
+        cls.posts = [Post.objects.create(author=cls.author, content=f'async post {i}') for i in range(12)]
+        for post in cls.posts:
+            timeline.fan_out_post(post)
+        cls.comments = [Comment.objects.create(post=cls.posts[0], author=cls.viewer, content=f'c{i}') for i in range(3)]
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def request(self, path, params=None):
+        request = self.factory.get(path, params or {})
+        force_authenticate(request, user=self.viewer)
+        return request
+
+    def test_views_are_async(self):
+        """Should expose the async views as coroutine functions"""
+        for async_view, _ in PAIRS:
+            self.assertTrue(iscoroutinefunction(async_view.as_view()), async_view.__name__)
+
+    async def assert_same(self, async_view, sync_view, path, params=None, **kwargs):
+        expected = await sync_to_async(sync_view.as_view())(self.request(path, params), **kwargs)
+        response = await async_view.as_view()(self.request(path, params), **kwargs)
+        self.assertEqual((response.status_code, response.data), (expected.status_code, expected.data))
+        return response
+
+    async def test_post_list_matches_sync(self):
+        """Should return the same pages, search results and fallbacks as the sync post list"""
+        first = await self.assert_same(views.AsyncPostListView, views.PostListView, '/api/posts/')
+        self.assertEqual(len(first.data['results']), 10)
+        await self.assert_same(views.AsyncPostListView, views.PostListView, '/api/posts/', {'search': 'async'})
+        await self.assert_same(views.AsyncPostListView, views.PostListView, '/api/posts/', {'page': 2})
+
+    async def test_detail_and_comments_match_sync(self):
+        """Should return the same post, 404 and comments as the sync views"""
+        await self.assert_same(views.AsyncPostDetailView, views.PostDetailView, '/', pk=self.posts[3].id)
+        missing = await self.assert_same(views.AsyncPostDetailView, views.PostDetailView, '/', pk=0)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        comments = await self.assert_same(views.AsyncPostCommentListView, views.PostCommentListView, '/', post_id=self.posts[0].id)
+        self.assertEqual(len(comments.data['results']), 3)
+
+    async def test_feed_matches_sync(self):
+        """Should return the same feed pages as the sync feed"""
+        first = await self.assert_same(views.AsyncFeedView, views.FeedView, '/api/feed/')
+        cursor = first.data['next'].split('cursor=')[1]
+        await self.assert_same(views.AsyncFeedView, views.FeedView, '/api/feed/', {'cursor': cursor})
+
+    async def test_feed_requires_authentication(self):
+        """Should reject anonymous feed requests"""
+        response = await views.AsyncFeedView.as_view()(self.factory.get('/api/feed/'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(LIKE_COUNTER_SHARDS=4, RESPONSE_CACHE_SECONDS=0)
+    async def test_like_counts_with_counter_shards(self):
+        """Should add the unfolded counter shards to like counts, reading them off the event loop"""
+        post = self.posts[-1] #newest, first on every page
+        await LikeCounterShard.objects.acreate(post=post, shard=1, delta=3)
+        detail = await self.assert_same(views.AsyncPostDetailView, views.PostDetailView, '/', pk=post.id)
+        self.assertEqual(detail.data['like_count'], 3)
+        posts = await self.assert_same(views.AsyncPostListView, views.PostListView, '/api/posts/')
+        feed = await self.assert_same(views.AsyncFeedView, views.FeedView, '/api/feed/')
+        for page in (posts, feed):
+            self.assertEqual(page.data['results'][0]['like_count'], 3)
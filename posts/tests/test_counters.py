@@ -0,0 +1,70 @@
+from io import StringIO
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from posts.models import Post, Comment, Like
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+class PostCounterTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter', email='counter@example.com', password='pass123')
+        self.fan = User.objects.create_user(username='fan', email='fan@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.fan)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = Post.objects.create(author=self.user, content='Count me')
+
+    def counts(self):
+        self.post.refresh_from_db()
+        return self.post.like_count, self.post.comment_count
+
+    def test_toggle_like_updates_like_count(self):
+        """Should increment on like and decrement on unlike"""
+        url = reverse('toggle-like', args=[self.post.id])
+        self.client.post(url)
+        self.assertEqual(self.counts(), (1, 0))
+        self.client.post(url)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_comments_update_comment_count(self):
+        """Should count comments created and deleted through the API"""
+        response = self.client.post(reverse('comment-create', args=[self.post.id]), {'content': 'hi'})
+        self.assertEqual(self.counts(), (0, 1))
+        self.client.delete(reverse('comment-delete', args=[self.post.id, response.data['id']]))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_user_deletion_releases_counts(self):
+        """Should decrement counters when a user's likes and comments cascade away"""
+        self.client.post(reverse('toggle-like', args=[self.post.id]))
+        self.client.post(reverse('comment-create', args=[self.post.id]), {'content': 'hi'})
+        self.fan.delete()
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_update_does_not_overwrite_counters(self):
+        """Should keep counters written concurrently when a post is edited"""
+        stale = Post.objects.get(id=self.post.id)
+        Like.objects.create(user=self.fan, post=self.post)
+        Post.objects.filter(id=self.post.id).update(like_count=1)
+        stale.content = 'Edited'
+        stale.save()
+        self.assertEqual(self.counts(), (1, 0))
+
+    def test_ordering_by_like_count(self):
+        """Should sort the post list by the stored like count"""
+        popular = Post.objects.create(author=self.user, content='Popular')
+        Post.objects.filter(id=popular.id).update(like_count=5)
+        response = self.client.get(reverse('post-list'), {'ordering': '-like_count'})
+        self.assertEqual(response.data['results'][0]['id'], popular.id)
+        self.assertEqual(response.data['results'][0]['like_count'], 5)
+
+    def test_reconcile_command_fixes_drift(self):
+        """Should recompute drifted counters from likes and comments"""
+        Like.objects.create(user=self.fan, post=self.post)
+        Comment.objects.create(post=self.post, author=self.fan, content='a')
+        Comment.objects.create(post=self.post, author=self.fan, content='b')
+        out = StringIO()
+        call_command('reconcile_post_counters', '--batch-size', '1', stdout=out)
+        self.assertEqual(self.counts(), (1, 2))
+        self.assertIn('Fixed 1', out.getvalue())
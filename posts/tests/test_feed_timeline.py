@@ -0,0 +1,126 @@
+from io import StringIO
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import override_settings
+from posts.models import Post, TimelineEntry
+from posts.feed import HybridFeed
+from posts import timeline
+from users.models import Follow
+from users import counters as follow_counters
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+
+User = get_user_model()
+
+class FeedTimelineTest(APITestCase):
+    def setUp(self):
+        # Reader follows author through the API so the timeline is maintained
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass123')
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.reader)
+        self.author_token = Token.objects.create(user=self.author)
+        self.old_post = Post.objects.create(author=self.author, content='Written before the follow')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.client.post(reverse('follow-user', args=[self.author.id]))
+
+    def feed_ids(self, params=None):
+        response = self.client.get(reverse('user-feed'), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data['results']]
+
+    def create_post_as_author(self, content):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.author_token.key)
+        response = self.client.post(reverse('post-create'), {'content': content})
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        return response.data['id']
+
+    def test_follow_backfills_timeline(self):
+        """Should copy the author's existing posts into the timeline on follow"""
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+
+    def test_new_post_is_fanned_out(self):
+        """Should push a new post into followers' timelines, newest first"""
+        post_id = self.create_post_as_author('Fresh post')
+        self.assertEqual(self.feed_ids(), [post_id, self.old_post.id])
+
+    def test_unfollow_trims_timeline(self):
+        """Should remove the author's posts from the timeline on unfollow"""
+        self.client.post(reverse('unfollow-user', args=[self.author.id]))
+        self.assertEqual(self.feed_ids(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_deleted_post_leaves_timeline(self):
+        """Should remove a deleted post from every timeline"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.author_token.key)
+        response = self.client.delete(reverse('post-delete', args=[self.old_post.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertEqual(self.feed_ids(), [])
+
+    def test_search_and_date_filters(self):
+        """Should keep search and date range filters working on the timeline"""
+        post_id = self.create_post_as_author('Something about django')
+        self.assertEqual(self.feed_ids({'search': 'django'}), [post_id])
+        created_at = Post.objects.get(id=post_id).created_at.isoformat()
+        self.assertEqual(self.feed_ids({'start_date': created_at}), [post_id])
+        self.assertEqual(self.feed_ids({'end_date': self.old_post.created_at.isoformat()}), [self.old_post.id])
+
+    def test_rebuild_timelines_command(self):
+        """Should rebuild timelines from the follow graph"""
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed_ids(), [self.old_post.id])
+
+@override_settings(FEED_PULL_THRESHOLD=2, FEED_CHUNK_SIZE=2)
+class HybridFeedTest(APITestCase):
+    def setUp(self):
+        cache.clear() #pulled author set is cached per threshold
+        # Celebrity has two followers and is pulled; friend has one and is pushed
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass123')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass123')
+        self.celebrity = User.objects.create_user(username='celebrity', email='celebrity@example.com', password='pass123')
+        self.friend = User.objects.create_user(username='friend', email='friend@example.com', password='pass123')
+        for follower, following in ((self.reader, self.celebrity), (self.other, self.celebrity), (self.reader, self.friend)):
+            Follow.objects.create(follower=follower, following=following)
+            follow_counters.follow_added(follower.id, following.id)
+        self.token = Token.objects.create(user=self.reader)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+        # Interleave posts from both authors, pushing only what the write path would push
+        self.posts = []
+        for i in range(6):
+            post = Post.objects.create(author=self.celebrity if i % 2 else self.friend, content=f'post {i}')
+            timeline.fan_out_post(post)
+            self.posts.append(post)
+
+    def test_pulled_author_is_not_fanned_out(self):
+        """Should not push posts of high-follower authors into timelines"""
+        self.assertFalse(TimelineEntry.objects.filter(author=self.celebrity).exists())
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 3)
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Should merge timeline and pulled posts newest first across pages"""
+        response = self.client.get(reverse('user-feed'), {'page': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual([post['id'] for post in response.data['results']], [post.id for post in reversed(self.posts)])
+
+    def test_feed_engine_resumes_after_position(self):
+        """Should continue the merge strictly after a (created_at, id) position"""
+        feed = HybridFeed(self.reader)
+        newest = self.posts[-1]
+        rest = list(feed.iter_posts(before=(newest.created_at, newest.id)))
+        self.assertEqual([post.id for post in rest], [post.id for post in reversed(self.posts[:-1])])
+
+    def test_feed_cursor_pages(self):
+        """Should page the merged feed by cursor in both directions"""
+        first = self.client.get(reverse('user-feed'), {'page_size': 4})
+        self.assertEqual([post['id'] for post in first.data['results']], [post.id for post in reversed(self.posts)][:4])
+        second = self.client.get(first.data['next'])
+        self.assertEqual([post['id'] for post in second.data['results']], [self.posts[1].id, self.posts[0].id])
+        self.assertIsNone(second.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
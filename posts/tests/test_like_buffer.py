@@ -0,0 +1,91 @@
+from unittest import mock
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.db.models.query import QuerySet
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from posts.models import Post, Like
+from posts import counters
+from posts.like_buffer import buffer
+
+User = get_user_model()
+
+@override_settings(LIKE_WRITE_BEHIND=True, LIKE_BUFFER_FLUSH_SECONDS=0, LIKE_BUFFER_MAX_PENDING=100)
+class LikeBufferTest(APITestCase):
+    def setUp(self):
+        buffer.reset()
+        self.addCleanup(buffer.reset)
+        self.author = User.objects.create_user(username='viral', email='viral@example.com', password='pass123')
+        self.fan = User.objects.create_user(username='fan', email='fan@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.fan)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = Post.objects.create(author=self.author, content='Going viral')
+        self.url = reverse('toggle-like', args=[self.post.id])
+
+    def like_count(self):#as served by the API
+        return self.client.get(reverse('post-detail', args=[self.post.id])).data['like_count']
+
+    def test_toggle_is_buffered_until_flush(self):
+        """Should answer from the buffer and write the like on flush"""
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Like.objects.exists())
+        self.assertEqual(self.like_count(), 1)
+        self.assertEqual(buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual((Like.objects.count(), self.post.like_count, self.like_count()), (1, 1, 1))
+
+    def test_flush_locks_the_liked_posts(self):
+        """Should read the existing likes only once the liked posts are locked, so no other writer adds them meanwhile"""
+        self.client.post(self.url)
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=lambda queryset: queryset) as lock:
+            buffer.flush()
+        self.assertEqual([call.args[0].model for call in lock.call_args_list], [Post])
+
+    def test_opposite_toggles_cancel(self):
+        """Should leave nothing to write after like then unlike"""
+        self.client.post(self.url)
+        response = self.client.post(self.url)
+        self.assertEqual(response.data['status'], 'unliked')
+        self.assertEqual((len(buffer), self.like_count(), buffer.flush()), (0, 0, 0))
+
+    def test_unlike_existing_like(self):
+        """Should delete a stored like and decrement the count on flush"""
+        Like.objects.create(user=self.fan, post=self.post)
+        counters.like_added(self.post.id)
+        response = self.client.post(self.url)
+        self.assertEqual(response.data['status'], 'unliked')
+        self.assertEqual(self.like_count(), 0)
+        buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((Like.objects.count(), self.post.like_count), (0, 0))
+
+    def test_toggle_during_flush_sees_batch_in_flight(self):
+        """Should treat toggles in the batch being written as the current state"""
+        self.client.post(self.url)
+        buffer._flushing, buffer._pending = buffer._pending, {}
+        buffer._flushing_delta, buffer._delta = buffer._delta, buffer._flushing_delta
+        self.assertEqual(self.client.post(self.url).data['status'], 'unliked')
+        self.assertEqual(self.like_count(), 0)
+
+    @override_settings(LIKE_BUFFER_MAX_PENDING=2)
+    def test_durability_bound_flushes(self):
+        """Should flush in the request that fills the buffer"""
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass123')
+        buffer.toggle(other.id, self.post.id)
+        self.assertFalse(Like.objects.exists())
+        self.client.post(self.url)
+        self.assertEqual((len(buffer), Like.objects.count()), (0, 2))
+
+    def test_toggle_costs_one_query(self):
+        """Should record a toggle with a single read"""
+        self.client.get(reverse('profile')) #warm the token cache
+        with self.assertNumQueries(1):
+            self.client.post(self.url)
+
+    def test_missing_post(self):
+        """Should return 404 for a post that doesn't exist"""
+        response = self.client.post(reverse('toggle-like', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,86 @@
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+from posts.models import Post, Like, LikeCounterShard
+from posts import like_shards, ranking
+
+User = get_user_model()
+
+@override_settings(LIKE_COUNTER_SHARDS=4, LIKE_SHARD_COMPACT_SECONDS=0)
+class LikeShardTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='viral', email='viral@example.com', password='pass123')
+        self.post = Post.objects.create(author=self.author, content='everyone likes this')
+        self.fans = [User.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com', password='pass123') for i in range(10)]
+        self.tokens = [Token.objects.create(user=fan).key for fan in self.fans]
+
+    def toggle(self, fan):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.tokens[fan])
+        return self.client.post(reverse('toggle-like', args=[self.post.id]))
+
+    def served_like_count(self):
+        detail = self.client.get(reverse('post-detail', args=[self.post.id])).data['like_count']
+        listed = {post['id']: post['like_count'] for post in self.client.get(reverse('post-list')).data['results']}
+        self.assertEqual(listed[self.post.id], detail)
+        return detail
+
+    def test_likes_go_to_shards(self):
+        """Should leave the post row alone and serve like_count with the shards added"""
+        for fan in range(10):
+            self.toggle(fan)
+        self.toggle(0) #unlike
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertLessEqual(LikeCounterShard.objects.filter(post=self.post).count(), 4)
+        self.assertEqual(like_shards.unfolded([self.post.id]), {self.post.id: 9})
+        self.assertEqual(self.served_like_count(), 9)
+
+    @override_settings(FAST_LIST_SERIALIZATION=False)
+    def test_list_reads_shards_once_per_page(self):
+        """Should add the shards of every post on a page with one query, not one per post"""
+        self.toggle(0)
+        queries = []
+        for n in (1, 5):
+            Post.objects.bulk_create([Post(author=self.author, content='more') for _ in range(n)])
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(reverse('post-list')).status_code, 200)
+            queries.append([query['sql'] for query in captured if 'posts_likecountershard' in query['sql']])
+        self.assertEqual([len(shard_queries) for shard_queries in queries], [1, 1])
+        self.assertEqual(self.served_like_count(), 1)
+
+    def test_compaction_folds_shards_into_the_post(self):
+        """Should move the shards into like_count and popularity, drop emptied shards and keep counting after"""
+        for fan in range(6):
+            self.toggle(fan)
+        out = StringIO()
+        call_command('compact_like_shards', stdout=out)
+        self.assertIn('1 post(s)', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 6)
+        self.assertAlmostEqual(self.post.popularity, ranking.popularity(6, 0, self.post.created_at))
+        self.assertFalse(LikeCounterShard.objects.exists())
+
+        self.toggle(0)
+        self.assertEqual(self.served_like_count(), 5)
+        like_shards.compact()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 5)
+
+    def test_reconcile_counts_unfolded_shards(self):
+        """Should leave like_count plus the shards equal to the likes, fixing drift without double counting"""
+        for fan in range(3):
+            self.toggle(fan)
+        Like.objects.filter(user=self.fans[0]).delete() #behind the counters' back
+        call_command('reconcile_post_counters', stdout=StringIO())
+        self.assertEqual(self.served_like_count(), 2)
+        like_shards.compact()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.authtoken.models import Token
+from posts import views
+from posts.models import Post
+from social_media_api import pubsub
+from social_media_api.pubsub import LocalBroker, RESET
+from users.models import Follow
+
+User = get_user_model()
+
+#(id, event, data) of each event in a chunk of the stream
+def parse(chunk):
+    events = []
+    for block in chunk.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+        if 'event' in fields:
+            events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+    return events
+
+class LiveFeedTest(TestCase):
+    def setUp(self):
+        pubsub._broker = None #a fresh backlog for every test
+        self.addCleanup(setattr, pubsub, '_broker', None)
+        self.viewer = User.objects.create_user(username='watcher', email='watcher@example.com', password='pass123')
+        self.author = User.objects.create_user(username='followed', email='followed@example.com', password='pass123')
+        self.stranger = User.objects.create_user(username='stranger', email='stranger@example.com', password='pass123')
+        Follow.objects.create(follower=self.viewer, following=self.author)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.viewer).key)
+
+    async def open(self, last_event_id=None):
+        headers = {'HTTP_LAST_EVENT_ID': last_event_id} if last_event_id else {}
+        request = APIRequestFactory().get('/api/feed/live/', HTTP_ACCEPT='text/event-stream', **headers)
+        force_authenticate(request, user=self.viewer)
+        response = await views.LiveFeedView.as_view()(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n') #subscribed once the first chunk is out
+        return stream
+
+    async def next_events(self, stream):
+        return parse(await asyncio.wait_for(anext(stream), 2))
+
+    @sync_to_async
+    def write(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            return action()
+
+    async def test_streams_posts_and_counts_of_followed_authors(self):
+        """Should push new posts and like/comment count changes of followed authors only"""
+        stream = await self.open()
+        await self.write(lambda: Post.objects.create(author=self.stranger, content='not followed'))
+        post = await self.write(lambda: Post.objects.create(author=self.author, content='fresh'))
+        await self.write(lambda: self.client.post(reverse('toggle-like', args=[post.id])))
+        await self.write(lambda: self.client.post(reverse('comment-create', args=[post.id]), {'content': 'nice'}))
+
+        received = []
+        while len(received) < 3:
+            received += await self.next_events(stream)
+        self.assertEqual([(name, data) for _, name, data in received], [
+            ('post', {'id': post.id, 'author': self.author.id}),
+            ('counts', {'id': post.id, 'likes': 1}),
+            ('counts', {'id': post.id, 'comments': 1}),
+        ])
+        await stream.aclose()
+
+    async def test_follows_change_what_is_streamed(self):
+        """Should start streaming an author's posts once the user follows them"""
+        stream = await self.open()
+        await self.write(lambda: self.client.post(reverse('follow-user', args=[self.stranger.id])))
+        self.assertEqual([name for _, name, _ in await self.next_events(stream)], ['following'])
+        post = await self.write(lambda: Post.objects.create(author=self.stranger, content='now followed'))
+        self.assertEqual([data['id'] for _, _, data in await self.next_events(stream)], [post.id])
+        await stream.aclose()
+
+    async def test_resumes_after_last_event_id(self):
+        """Should replay the events after Last-Event-ID, and reset clients it can't resume"""
+        stream = await self.open()
+        posts = [await self.write(lambda: Post.objects.create(author=self.author, content=f'post {i}')) for i in range(3)]
+        received = []
+        while len(received) < 3:
+            received += await self.next_events(stream)
+        await stream.aclose()
+
+        resumed = await self.open(last_event_id=received[0][0])
+        self.assertEqual([data['id'] for _, _, data in await self.next_events(resumed)], [post.id for post in posts[1:]])
+        await resumed.aclose()
+        reset = await self.open(last_event_id='0badf00d-1') #another process's id
+        self.assertEqual([name for _, name, _ in await self.next_events(reset)], [RESET])
+        await reset.aclose()
+
+    @override_settings(LIVE_FEED_HEARTBEAT_SECONDS=0.01)
+    async def test_idle_stream_sends_heartbeats(self):
+        """Should send a comment line when nothing happened for a heartbeat interval"""
+        stream = await self.open()
+        self.assertEqual(await asyncio.wait_for(anext(stream), 2), b':\n\n')
+        await stream.aclose()
+
+    async def test_slow_subscriber_is_reset(self):
+        """Should drop the queue of a subscriber that falls behind and resume it after the last dropped event"""
+        broker = LocalBroker(backlog=100, queue_size=3)
+        subscription = broker.subscribe(['author:1'])
+        events = [broker.publish('author:1', 'post', {'id': i}) for i in range(5)]
+        await asyncio.sleep(0) #deliveries run on the loop
+        self.assertEqual([(event.id, event.name) for event in await subscription.get(1)], [(events[3].id, RESET), (events[4].id, 'post')])
+        subscription.close()
+        self.assertFalse(broker.active())
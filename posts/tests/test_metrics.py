@@ -0,0 +1,94 @@
+import re
+from importlib import import_module
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from posts.models import Post
+from social_media_api import metrics
+
+import_module('social_media_api.middleware') #connects its query wrapper before the test database opens
+
+User = get_user_model()
+
+def server_timing(response):
+    return {name: float(duration) for name, duration in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])}
+
+class PerformanceMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.user = User.objects.create_user(username='timed', email='timed@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = Post.objects.create(author=self.user, content='measured post')
+
+    def sample_value(self, text, name, **labels):
+        selector = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        match = re.search(rf'^{name}\{{{re.escape(selector)}\}} (\S+)$', text, re.M)
+        return float(match.group(1)) if match else None
+
+    def test_server_timing_header(self):
+        """Should split the request into db, serialize and render time in Server-Timing"""
+        response = self.client.get(reverse('post-detail', args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = server_timing(response)
+        self.assertEqual(set(timing), {'db', 'serialize', 'render', 'total'})
+        self.assertGreater(timing['db'], 0)
+        self.assertLessEqual(timing['db'] + timing['serialize'] + timing['render'], timing['total'])
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+    def test_metrics_endpoint_aggregates_per_view(self):
+        """Should expose per-view counters and histograms in the Prometheus text format"""
+        for _ in range(3):
+            self.client.get(reverse('post-list'))
+        self.client.post(reverse('toggle-like', args=[self.post.id]))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertEqual(self.sample_value(text, 'http_requests_total', view='PostListView', method='GET', status='200'), 3)
+        self.assertEqual(self.sample_value(text, 'http_requests_total', view='ToggleLikeView', method='POST', status='201'), 1)
+        self.assertEqual(self.sample_value(text, 'http_request_db_queries_bucket', view='PostListView', le='+Inf'), 3)
+        self.assertEqual(self.sample_value(text, 'http_request_serialize_seconds_count', view='ToggleLikeView'), 1)
+        self.assertGreater(self.sample_value(text, 'http_request_db_queries_sum', view='ToggleLikeView'), 0)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_token(self):
+        """Should require the bearer token when METRICS_TOKEN is set"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        response = APIClient().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_sampled_with_sql(self):
+        """Should log requests over the threshold with the SQL they ran"""
+        with self.assertLogs('social_media_api.performance', 'WARNING') as logs:
+            self.client.get(reverse('post-detail', args=[self.post.id]))
+        sample = metrics.slow_samples[-1]
+        self.assertEqual((sample['view'], sample['method']), ('PostDetailView', 'GET'))
+        self.assertEqual(len(sample['sql']), sample['queries'])
+        self.assertTrue(any('posts_post' in sql for _, sql in sample['sql']))
+        self.assertIn('PostDetailView', logs.output[0])
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_password_hashing_views_are_not_slow(self):
+        """Should not log login and register, which are slow by design"""
+        with self.assertNoLogs('social_media_api.performance', 'WARNING'):
+            response = APIClient().post(reverse('login'), {'username': 'timed', 'password': 'pass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(metrics.slow_samples), [])
+
+    async def test_async_handler(self):
+        """Should count queries run in sync_to_async threads when served through ASGI"""
+        response = await self.async_client.get(
+            reverse('post-detail', args=[self.post.id]), headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(server_timing(response)['db'], 0)
+        self.assertEqual(metrics.requests.values[('PostDetailView', 'GET', '200')], 1)
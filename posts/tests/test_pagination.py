@@ -0,0 +1,71 @@
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from posts.models import Post, Comment
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+
+User = get_user_model()
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', email='pager@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.posts = [Post.objects.create(author=self.user, content=f'post {i}') for i in range(25)]
+
+    def walk(self, url, params=None):#follow next links to the end, returning ids per page
+        pages = []
+        response = self.client.get(url, params or {})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json() #cached pages are served pre-rendered
+            pages.append([item['id'] for item in data['results']])
+            if not data['next']:
+                return pages
+            response = self.client.get(data['next'])
+
+    def test_post_list_uses_cursor_without_count(self):
+        """Should page posts newest first by cursor, without a count"""
+        response = self.client.get(reverse('post-list'))
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        pages = self.walk(reverse('post-list'))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), [post.id for post in reversed(self.posts)])
+
+    def test_pages_are_stable_under_inserts(self):
+        """Should not repeat or skip posts when new posts arrive mid-walk"""
+        first = self.client.get(reverse('post-list'))
+        Post.objects.create(author=self.user, content='arrived while paging')
+        second = self.client.get(first.data['next'])
+        first_ids = [item['id'] for item in first.data['results']]
+        second_ids = [item['id'] for item in second.data['results']]
+        self.assertEqual(first_ids + second_ids, [post.id for post in reversed(self.posts)][:20])
+
+    def test_previous_link_returns_prior_page(self):
+        """Should go back to the previous page through the previous cursor"""
+        first = self.client.get(reverse('post-list'))
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_page_number_opt_in(self):
+        """Should fall back to page number pagination when ?page= is sent"""
+        response = self.client.get(reverse('post-list'), {'page': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_comment_list_cursor(self):
+        """Should page comments of a post by cursor"""
+        post = self.posts[0]
+        for i in range(12):
+            Comment.objects.create(post=post, author=self.user, content=f'comment {i}')
+        pages = self.walk(reverse('comment-list', args=[post.id]))
+        self.assertEqual([len(page) for page in pages], [10, 2])
+
+    def test_invalid_cursor(self):
+        """Should reject a malformed cursor"""
+        response = self.client.get(reverse('post-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,89 @@
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from posts import urls as post_urls
+from posts.models import Post, Comment
+from social_media_api.testing import QueryBudgetMixin, route_names, seed_social_graph
+
+#maximum (queries, rows) per route, measured on the seeded graph with a 10 item page.
+#an N+1 on any list adds at least one query per item and fails these. deletes that reach comments look
+#up replies once for the parent cascade
+BUDGETS = {
+    'post-list': (2, 12),
+    'post-detail': (2, 2),
+    'post-create': (7, 6),
+    'post-update': (5, 2),
+    'post-delete': (12, 1),
+    'comment-list': (2, 12),
+    'comment-threads': (2, 12),
+    'comment-detail': (2, 2),
+    'comment-thread': (2, 4),
+    'comment-create': (6, 1),
+    'comment-update': (3, 2),
+    'comment-delete': (7, 1),
+    'toggle-like': (9, 3),
+    'post-likes-list': (2, 12),
+    'user-feed': (2, 12),
+}
+#ranked two-term search adds the max id and one document frequency lookup per term, and pages by number
+SEARCH_BUDGET = (6, 16)
+#a reply also reads its parent and counts itself in the parent's reply_count
+REPLY_BUDGET = (8, 2)
+
+class PostQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.people = seed_social_graph()
+        cls.user = cls.people[0]
+        cls.post = Post.objects.filter(author=cls.user).first()
+        cls.comment = Comment.objects.create(post=cls.post, author=cls.user, content='mine')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def check(self, name, method='get', args=(), data=None, expected_status=status.HTTP_200_OK):
+        max_queries, max_rows = BUDGETS[name]
+        return self.assert_within_budget(method, reverse(name, args=args), max_queries, max_rows, data, expected_status)
+
+    def test_every_route_has_a_budget(self):
+        """Should give every route in posts/urls.py a query budget"""
+        self.assertEqual(route_names(post_urls), set(BUDGETS))
+
+    def test_post_reads(self):
+        """Should list, page and retrieve posts within budget"""
+        response = self.check('post-list')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assert_within_budget('get', reverse('post-list'), *SEARCH_BUDGET, data={'search': 'seed post'})
+        self.check('post-detail', args=[self.post.id])
+
+    def test_post_writes(self):
+        """Should create, update and delete posts within budget"""
+        self.check('post-create', 'post', data={'content': 'budgeted'}, expected_status=status.HTTP_201_CREATED)
+        self.check('post-update', 'put', args=[self.post.id], data={'content': 'edited'})
+        self.check('post-delete', 'delete', args=[self.post.id], expected_status=status.HTTP_204_NO_CONTENT)
+
+    def test_comment_routes(self):
+        """Should read and write comments within budget"""
+        self.check('comment-list', args=[self.post.id])
+        self.check('comment-detail', args=[self.post.id, self.comment.id])
+        self.check('comment-create', 'post', args=[self.post.id], data={'content': 'hi'}, expected_status=status.HTTP_201_CREATED)
+        reply = {'content': 'reply', 'parent': self.comment.id}
+        self.assert_within_budget('post', reverse('comment-create', args=[self.post.id]), *REPLY_BUDGET, data=reply, expected_status=status.HTTP_201_CREATED)
+        self.check('comment-threads', args=[self.post.id])
+        self.check('comment-thread', args=[self.post.id, self.comment.id])
+        self.check('comment-update', 'put', args=[self.post.id, self.comment.id], data={'content': 'edited'})
+        self.check('comment-delete', 'delete', args=[self.post.id, self.comment.id], expected_status=status.HTTP_204_NO_CONTENT)
+
+    def test_like_routes(self):
+        """Should toggle and list likes within budget"""
+        other_post = Post.objects.exclude(likes__user=self.user).first()
+        self.check('toggle-like', 'post', args=[other_post.id], expected_status=status.HTTP_201_CREATED)
+        self.check('post-likes-list', args=[self.post.id])
+
+    def test_feed(self):
+        """Should read the feed within budget"""
+        response = self.check('user-feed')
+        self.assertEqual(len(response.data['results']), 10)
+        self.check('user-feed', data={'cursor': response.data['next'].split('cursor=')[1]})
@@ -0,0 +1,105 @@
+from datetime import timedelta
+from io import StringIO
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from posts.models import Post
+from posts import counters, ranking, timeline
+from users.models import Follow
+from users import counters as follow_counters
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+
+User = get_user_model()
+
+@override_settings(FEED_PULL_THRESHOLD=2, FEED_CHUNK_SIZE=2)
+class PopularityRankingTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # Reader follows a pushed friend and a pulled celebrity (two followers)
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass123')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass123')
+        self.friend = User.objects.create_user(username='friend', email='friend@example.com', password='pass123')
+        self.celebrity = User.objects.create_user(username='celebrity', email='celebrity@example.com', password='pass123')
+        for follower, following in ((self.reader, self.friend), (self.reader, self.celebrity), (self.other, self.celebrity)):
+            Follow.objects.create(follower=follower, following=following)
+            follow_counters.follow_added(follower.id, following.id)
+        self.token = Token.objects.create(user=self.reader)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+        # Six posts an hour apart, oldest first, alternating authors
+        self.posts = []
+        for i in range(6):
+            post = Post.objects.create(author=self.celebrity if i % 2 else self.friend, content=f'post {i}')
+            Post.objects.filter(id=post.id).update(created_at=post.created_at - timedelta(hours=6 - i))
+            post.refresh_from_db()
+            timeline.fan_out_post(post)
+            self.posts.append(post)
+        call_command('recompute_popularity', stdout=StringIO()) #scores follow the backdated created_at
+
+    def score(self, post):
+        post.refresh_from_db()
+        return post.popularity
+
+    def like(self, post, times):
+        for n in range(times):
+            counters.like_added(post.id)
+
+    def test_counters_move_popularity(self):
+        """Should keep the stored score equal to the formula as likes and comments change"""
+        post = self.posts[0]
+        self.like(post, 3)
+        counters.comment_added(post.id)
+        counters.like_removed(post.id)
+        self.assertAlmostEqual(self.score(post), ranking.popularity(2, 1, post.created_at))
+        self.assertEqual((post.like_count, post.comment_count), (2, 1))
+
+    def test_new_post_is_scored_on_create(self):
+        """Should score a new post by its creation time"""
+        post = Post.objects.create(author=self.friend, content='brand new')
+        self.assertAlmostEqual(self.score(post), ranking.popularity(0, 0, post.created_at), places=6)
+
+    def test_recompute_repairs_drift(self):
+        """Should rewrite scores that drifted from the formula"""
+        Post.objects.filter(id=self.posts[2].id).update(popularity=0)
+        out = StringIO()
+        call_command('recompute_popularity', stdout=out)
+        self.assertIn('Updated 1 popularity score(s)', out.getvalue())
+        self.assertAlmostEqual(self.score(self.posts[2]), ranking.popularity(0, 0, self.posts[2].created_at))
+
+    def test_feed_sorted_by_popularity(self):
+        """Should merge pushed and pulled posts by score, decaying with age"""
+        old, older_celebrity = self.posts[0], self.posts[1]
+        self.like(old, 63) #six hours = half a half-life; 64x engagement more than makes up for it
+        self.like(older_celebrity, 1)
+        response = self.client.get(reverse('user-feed'), {'sort_by': 'popularity', 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = [post['id'] for post in response.data['results']]
+        response = self.client.get(response.data['next'])
+        ids = first_page + [post['id'] for post in response.data['results']]
+        expected = sorted(self.posts, key=lambda post: (-self.score(post), -post.id))
+        self.assertEqual(ids, [post.id for post in expected])
+        self.assertEqual(ids[0], old.id)
+
+    @override_settings(FEED_POPULARITY_WINDOW=2)
+    def test_feed_ranks_the_newest_timeline_window(self):
+        """Should rank only the posts since the oldest entry of the timeline window, pulled ones included"""
+        self.like(self.posts[0], 63) #popular, but older than the friend's two newest posts
+        response = self.client.get(reverse('user-feed'), {'sort_by': 'popularity', 'page_size': 10})
+        ids = [post['id'] for post in response.data['results']]
+        expected = sorted(self.posts[2:], key=lambda post: (-self.score(post), -post.id))
+        self.assertEqual(ids, [post.id for post in expected])
+
+    def test_post_list_ordered_by_popularity_pages_by_cursor(self):
+        """Should page ?ordering=-popularity with a keyset cursor"""
+        self.like(self.posts[0], 63)
+        response = self.client.get(reverse('post-list'), {'ordering': '-popularity', 'page_size': 4})
+        data = response.json()
+        self.assertNotIn('count', data)
+        ids = [post['id'] for post in data['results']]
+        ids += [post['id'] for post in self.client.get(data['next']).json()['results']]
+        expected = sorted(self.posts, key=lambda post: (-self.score(post), -post.id))
+        self.assertEqual(ids, [post.id for post in expected])
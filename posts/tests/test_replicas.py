@@ -0,0 +1,127 @@
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.test.client import RequestFactory
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from rest_framework import status
+from posts.models import Post
+from posts.views import PostListView
+from social_media_api import replicas
+from social_media_api.testing import shared_cache_settings
+from users.graph import follow_graph
+from users.models import User, Follow
+
+#a stand-in replica that is a database of its own, as with DB_ENGINE=sqlite, rather than a test mirror of default
+SEPARATE_REPLICA = 'replica' in settings.DATABASES and not settings.DATABASES['replica'].get('TEST', {}).get('MIRROR')
+
+
+@shared_cache_settings('REPLICA_PIN_CACHE_ALIAS', READ_REPLICAS=['replica'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.factory = RequestFactory()
+        self.router = replicas.ReplicaRouter()
+
+    #run a request through the middleware and return where the view's reads would go
+    def request(self, method, view=PostListView.as_view(), status_code=200, **headers):
+        seen = {}
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            seen['post'] = self.router.db_for_read(Post)
+            seen['token'] = self.router.db_for_read(Token)
+            seen['write'] = self.router.db_for_write(Post)
+            return HttpResponse(status=status_code)
+
+        middleware = replicas.ReplicaMiddleware(get_response)
+        middleware(getattr(self.factory, method)('/', headers=headers))
+        return seen
+
+    def test_safe_api_reads_go_to_a_replica(self):
+        """Should send the reads of GET requests to API views to a replica and everything else to default"""
+        self.assertEqual(self.request('get'), {'post': 'replica', 'token': 'default', 'write': 'default'})
+        self.assertEqual(self.request('post')['post'], None)
+        self.assertEqual(self.request('get', view=lambda request: HttpResponse())['post'], None) #not an API view
+        self.assertEqual(self.router.db_for_read(Post), None) #outside a request
+
+    def test_writes_pin_their_client_to_the_primary(self):
+        """Should read from the primary after a successful write by the same credentials only"""
+        self.request('post', status_code=400, authorization='Token writer')
+        self.assertEqual(self.request('get', authorization='Token writer')['post'], 'replica') #failed writes don't pin
+        self.request('post', status_code=201, authorization='Token writer')
+        self.assertEqual(self.request('get', authorization='Token writer')['post'], None)
+        self.assertEqual(self.request('get', authorization='Token reader')['post'], 'replica')
+        caches['shared'].clear() #the pin expired
+        self.assertEqual(self.request('get', authorization='Token writer')['post'], 'replica')
+
+    def test_unused_without_replicas(self):
+        """Should drop out of the middleware chain when no replica is configured"""
+        with override_settings(READ_REPLICAS=[]), self.assertRaises(MiddlewareNotUsed):
+            replicas.ReplicaMiddleware(lambda request: HttpResponse())
+
+    def test_pins_need_a_shared_cache(self):
+        """Should refuse read replicas when the pins would live in a cache of each worker's own"""
+        for alias in ('default', 'missing'):
+            with override_settings(REPLICA_PIN_CACHE_ALIAS=alias), self.assertRaises(ImproperlyConfigured):
+                replicas.ReplicaMiddleware(lambda request: HttpResponse())
+
+
+@skipUnless(SEPARATE_REPLICA, 'needs DB_ENGINE=sqlite, whose replica is a database of its own')
+@shared_cache_settings('REPLICA_PIN_CACHE_ALIAS', READ_REPLICAS=['replica'], RESPONSE_CACHE_SECONDS=0)
+class ReadReplicaTest(APITestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.user = User.objects.create_user(username='writer', email='writer@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = Post.objects.create(author=self.user, content='on the primary')
+        #the replica lags: it has the post with older content. bulk_create skips the signals, which write to default
+        User.objects.using('replica').bulk_create([User(id=self.user.id, username='writer', email='writer@example.com')])
+        Post.objects.using('replica').bulk_create([Post(id=self.post.id, author_id=self.user.id, content='not replicated yet')])
+
+    def content(self):
+        response = self.client.get(reverse('post-detail', args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['content']
+
+    def test_reads_follow_the_client_writes(self):
+        """Should read from the replica until the client writes, then from the primary"""
+        self.assertEqual(self.content(), 'not replicated yet')
+        response = self.client.post(reverse('toggle-like', args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.content(), 'on the primary')
+
+        reader = User.objects.create_user(username='reader', email='reader@example.com', password='pass123')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=reader).key)
+        self.assertEqual(self.content(), 'not replicated yet')
+
+    @override_settings(RESPONSE_CACHE_SECONDS=60, RESPONSE_CACHE_ALIAS='shared')
+    def test_response_cache_is_filled_from_the_primary(self):
+        """Should read a response cache miss from the primary and serve the hit without queries"""
+        self.assertEqual(self.content(), 'on the primary')
+        with self.assertNumQueries(0, using='replica'):
+            self.assertEqual(self.content(), 'on the primary')
+
+    def test_follow_graph_syncs_from_the_primary(self):
+        """Should read the follow event log from the primary in requests that read from a replica"""
+        other = User.objects.create_user(username='followed', email='followed@example.com', password='pass123')
+        follow_graph.sync_if_stale()
+        state = replicas.ReadAlias(pinned=False)
+        state.alias = 'replica' #what ReplicaMiddleware sets for a safe request; the replica has no follow events
+        token = replicas.current.set(state)
+        self.addCleanup(replicas.current.reset, token)
+        with mock.patch.object(follow_graph, '_build', wraps=follow_graph._build) as build:
+            for _ in range(3):
+                follow = Follow.objects.create(follower=self.user, following=other)
+                self.assertTrue(follow_graph.follows(self.user.id, other.id))
+                follow.delete()
+                self.assertFalse(follow_graph.follows(self.user.id, other.id))
+        build.assert_not_called()
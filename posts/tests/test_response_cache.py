@@ -0,0 +1,106 @@
+from asgiref.sync import sync_to_async
+from rest_framework.test import APITestCase, APIRequestFactory
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from posts import views
+from posts.models import Post
+from social_media_api.testing import shared_cache_settings
+
+User = get_user_model()
+
+@shared_cache_settings('RESPONSE_CACHE_ALIAS')
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        self.user = User.objects.create_user(username='hot', email='hot@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+        self.post = Post.objects.create(author=self.user, content='Hot post')
+        self.detail = reverse('post-detail', args=[self.post.id])
+
+    def authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_repeated_read_skips_the_database(self):
+        """Should serve a repeated read from the cache with the same body and ETag"""
+        first = self.client.get(self.detail)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.detail)
+        self.assertEqual((second.status_code, second.content, second['ETag']), (200, first.content, first['ETag']))
+
+    def test_if_none_match_returns_304(self):
+        """Should answer a matching If-None-Match with an empty 304"""
+        etag = self.client.get(self.detail)['ETag']
+        self.client.get(self.detail) #now cached
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (status.HTTP_304_NOT_MODIFIED, b''))
+        response = self.client.get(self.detail, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_writes_invalidate(self):
+        """Should serve fresh data after a like, a comment, an edit and a comment delete"""
+        self.authenticate()
+        self.client.get(self.detail)
+        self.client.get(reverse('post-list'))
+        self.client.post(reverse('toggle-like', args=[self.post.id]))
+        self.assertEqual(self.client.get(self.detail).json()['like_count'], 1)
+        self.assertEqual(self.client.get(reverse('post-list')).json()['results'][0]['like_count'], 1)
+
+        comments = reverse('comment-list', args=[self.post.id])
+        self.assertEqual(self.client.get(comments).json()['results'], [])
+        created = self.client.post(reverse('comment-create', args=[self.post.id]), {'content': 'first'})
+        self.assertEqual(len(self.client.get(comments).json()['results']), 1)
+        self.client.delete(reverse('comment-delete', args=[self.post.id, created.data['id']]))
+        self.assertEqual(self.client.get(comments).json()['results'], [])
+
+        self.client.patch(reverse('post-update', args=[self.post.id]), {'content': 'Edited'})
+        self.assertEqual(self.client.get(self.detail).json()['content'], 'Edited')
+
+    def test_likes_only_invalidate_pages_showing_the_post(self):
+        """Should keep list pages without the liked post cached, and drop count-ordered lists"""
+        self.authenticate()
+        older = Post.objects.create(author=self.user, content='Older post')
+        Post.objects.filter(id=older.id).update(created_at=self.post.created_at.replace(year=2000))
+        newest = {'page_size': 1}
+        by_likes = {'ordering': '-like_count'}
+        list_url = reverse('post-list')
+        for params in (newest, by_likes):
+            self.client.get(list_url, params)
+        self.client.post(reverse('toggle-like', args=[older.id]))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(list_url, newest).json()['results'][0]['id'], self.post.id)
+        self.assertEqual(self.client.get(list_url, by_likes).json()['results'][0]['id'], older.id)
+
+        self.client.post(reverse('toggle-like', args=[self.post.id]))
+        self.assertEqual(self.client.get(list_url, newest).json()['results'][0]['like_count'], 1)
+
+    def test_versions_need_a_shared_cache(self):
+        """Should refuse a response cache whose versions each worker would keep for itself, and cache nothing without one"""
+        with override_settings(RESPONSE_CACHE_ALIAS='default'), self.assertRaises(ImproperlyConfigured):
+            self.client.get(self.detail)
+        with override_settings(RESPONSE_CACHE_ALIAS=''):
+            self.assertFalse(self.client.get(self.detail).has_header('ETag'))
+
+    def test_query_params_are_part_of_the_key(self):
+        """Should cache each query string separately"""
+        Post.objects.create(author=self.user, content='Another post')
+        self.assertEqual(len(self.client.get(reverse('post-list')).json()['results']), 2)
+        self.assertEqual(len(self.client.get(reverse('post-list'), {'page_size': 1}).json()['results']), 1)
+
+    def test_browsable_api_is_not_cached(self):
+        """Should render the browsable API on every request"""
+        self.client.get(self.detail, {'format': 'api'})
+        response = self.client.get(self.detail, {'format': 'api'})
+        self.assertFalse(response.has_header('ETag'))
+
+    async def test_async_view_uses_the_cache(self):
+        """Should serve the async detail view from the same cache"""
+        first = await sync_to_async(self.client.get)(self.detail)
+        #update() sends no signals, so the cached body is still served
+        await Post.objects.filter(id=self.post.id).aupdate(content='Changed behind the cache')
+        response = await views.AsyncPostDetailView.as_view()(APIRequestFactory().get(self.detail), pk=self.post.id)
+        self.assertEqual((response.content, response['ETag']), (first.content, first['ETag']))
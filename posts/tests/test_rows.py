@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from posts import like_buffer, rows
+from posts.models import Post
+from posts.serializers import PostSerializer
+from social_media_api.testing import seed_social_graph
+
+User = get_user_model()
+
+@override_settings(RESPONSE_CACHE_SECONDS=0, FEED_PULL_THRESHOLD=4, FEED_CHUNK_SIZE=3)
+class RowSerializationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.people = seed_social_graph()
+        cls.viewer = cls.people[0]
+        cls.token = Token.objects.create(user=cls.viewer)
+        cls.post = Post.objects.filter(like_count__gt=0).order_by('id').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    #the response body with the fast path on and off, following `next` links for `pages` pages
+    def bodies(self, url, params=None, pages=3):
+        results = []
+        for fast in (True, False):
+            with self.settings(FAST_LIST_SERIALIZATION=fast):
+                chunks, response = [], self.client.get(url, params or {})
+                for _ in range(pages):
+                    self.assertEqual(response.status_code, 200, response.content)
+                    chunks.append(response.content)
+                    next_url = response.json().get('next')
+                    if not next_url:
+                        break
+                    response = self.client.get(next_url)
+                results.append(chunks)
+        return results
+
+    def assert_identical(self, url, params=None):
+        fast, drf = self.bodies(url, params)
+        self.assertEqual(fast, drf)
+        self.assertTrue(any(b'"results":[{' in body for body in fast), 'nothing was listed')
+
+    def test_post_list_is_byte_identical(self):
+        """Should render the post list exactly like PostSerializer"""
+        self.assert_identical(reverse('post-list'), {'page_size': 7})
+        self.assert_identical(reverse('post-list'), {'ordering': '-popularity', 'page_size': 7})
+        self.assert_identical(reverse('post-list'), {'ordering': 'author__username', 'page': 2})
+        self.assert_identical(reverse('post-list'), {'search': 'seed post', 'page_size': 5})
+
+    def test_feed_is_byte_identical(self):
+        """Should render both feed orderings exactly like PostSerializer"""
+        self.assert_identical(reverse('user-feed'), {'page_size': 4})
+        self.assert_identical(reverse('user-feed'), {'sort_by': 'popularity', 'page_size': 4})
+        self.assert_identical(reverse('user-feed'), {'page': 1})
+
+    def test_comment_and_like_lists_are_byte_identical(self):
+        """Should render comment and like pages exactly like their serializers"""
+        self.assert_identical(reverse('comment-list', args=[self.post.id]), {'page_size': 2})
+        self.assert_identical(reverse('post-likes-list', args=[self.post.id]), {'page_size': 2})
+
+    @override_settings(LIKE_WRITE_BEHIND=True, LIKE_BUFFER_FLUSH_SECONDS=0)
+    def test_pending_likes_are_added(self):
+        """Should include write-behind likes like PostSerializer does"""
+        self.addCleanup(like_buffer.buffer.reset)
+        like_buffer.buffer.toggle(self.people[-1].id, self.post.id)
+        self.assert_identical(reverse('post-list'), {'page_size': 50})
+
+    def test_rows_read_only_serialized_columns(self):
+        """Should select the serializer's columns plus the keyset field, joining the author username"""
+        self.assertEqual(rows.post_rows.columns, (
+            'id', 'author__username', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count', 'popularity',
+        ))
+        queryset = rows.post_rows.rows(Post.objects.order_by('-id'))
+        with self.assertNumQueries(1):
+            data = rows.post_rows.serialize(queryset[:5])
+        self.assertEqual(data, PostSerializer(Post.objects.order_by('-id')[:5], many=True).data)
+
+    def test_datetimes_follow_the_active_timezone(self):
+        """Should format datetimes in the active timezone like DateTimeField"""
+        queryset = Post.objects.order_by('-id')[:5]
+        for zone in ('America/New_York', 'Asia/Kolkata', 'UTC'):
+            with timezone.override(zone):
+                data = rows.post_rows.serialize(rows.post_rows.rows(Post.objects.order_by('-id'))[:5])
+                self.assertEqual(data, PostSerializer(queryset, many=True).data, zone)
@@ -0,0 +1,75 @@
+from io import StringIO
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from posts.models import Post, PostToken
+from rest_framework.authtoken.models import Token
+from posts import search, timeline
+
+User = get_user_model()
+
+class PostSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear() #posting counts are cached per term
+        self.user = User.objects.create_user(username='searcher', email='searcher@example.com', password='pass123')
+        self.writer = User.objects.create_user(username='writer', email='writer@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.client.post(reverse('follow-user', args=[self.writer.id]))
+        self.django = Post.objects.create(author=self.writer, content='Django tips: django querysets are lazy')
+        self.python = Post.objects.create(author=self.writer, content='Python and Django together')
+        self.other = Post.objects.create(author=self.user, content='Nothing to see here')
+        for post in (self.django, self.python):
+            timeline.fan_out_post(post)
+
+    def search(self, url, query):
+        response = self.client.get(url, {'search': query})
+        return [post['id'] for post in response.data['results']]
+
+    def test_index_follows_content(self):
+        """Should index tokens on create and reindex on update"""
+        self.assertTrue(PostToken.objects.filter(post=self.django, token='django', count=2).exists())
+        self.client.put(reverse('post-update', args=[self.other.id]), {'content': 'Now about flask'})
+        self.assertEqual(set(PostToken.objects.filter(post=self.other).values_list('token', flat=True)), {'now', 'about', 'flask'})
+
+    def test_ranked_multi_term_search(self):
+        """Should require every term and rank by term frequency"""
+        url = reverse('post-list')
+        self.assertEqual(self.search(url, 'django'), [self.django.id, self.python.id])
+        self.assertEqual(self.search(url, 'python django'), [self.python.id])
+
+    def test_prefix_and_username_match(self):
+        """Should match the last term as a prefix and authors by username"""
+        url = reverse('post-list')
+        self.assertEqual(set(self.search(url, 'pyth')), {self.python.id})
+        self.assertEqual(set(self.search(url, 'search')), {self.other.id})
+
+    def test_feed_search_uses_index(self):
+        """Should filter the feed through the search index, newest first"""
+        self.assertEqual(self.search(reverse('user-feed'), 'DJANGO'), [self.python.id, self.django.id])
+
+    def test_rebuild_command(self):
+        """Should rebuild the index for existing posts"""
+        PostToken.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search(reverse('post-list'), 'lazy'), [self.django.id])
+
+    @override_settings(SEARCH_RANK_LIMIT=1)
+    def test_common_terms_are_probed_newest_first(self):
+        """Should match common terms per post and order them newest first"""
+        response = self.client.get(reverse('post-list'), {'search': 'django'})
+        self.assertEqual([post['id'] for post in response.data['results']], [self.python.id, self.django.id])
+        self.assertNotIn('count', response.data) #recency order keeps cursor pagination
+
+    def test_posting_counts_are_cached(self):
+        """Should count a term's postings once and reuse the count for later searches"""
+        with self.assertNumQueries(1):
+            self.assertEqual(search.PostSearch('django').frequencies, [2])
+        Post.objects.create(author=self.writer, content='More django')
+        with self.assertNumQueries(0):
+            self.assertEqual(search.PostSearch('django').frequencies, [2])
+        with self.assertNumQueries(1):
+            self.assertEqual(search.PostSearch('lazy django').frequencies, [1, 2])
@@ -0,0 +1,121 @@
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from posts.models import Post, Comment
+from posts import threads
+
+User = get_user_model()
+
+class CommentThreadTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='talker', email='talker@example.com', password='pass123')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.post = Post.objects.create(author=self.user, content='Discuss')
+
+    def comment(self, content, parent=None, post=None):
+        data = {'content': content} if parent is None else {'content': content, 'parent': parent}
+        response = self.client.post(reverse('comment-create', args=[(post or self.post).id]), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['id']
+
+    def shape(self, nodes):
+        return [(node['content'], node['reply_count'], self.shape(node['replies'])) for node in nodes]
+
+    def test_replies_nest_under_their_parents(self):
+        """Should store replies as paths below their parent and count them"""
+        first = self.comment('first')
+        reply = self.comment('reply', parent=first)
+        nested = self.comment('nested', parent=reply)
+        second = self.comment('second')
+
+        comments = {comment.id: comment for comment in Comment.objects.all()}
+        self.assertEqual(comments[nested].path, comments[first].path + Comment.path_segment(reply) + Comment.path_segment(nested))
+        self.assertEqual([comments[key].depth for key in (first, reply, nested, second)], [0, 1, 2, 0])
+        self.assertEqual([comments[key].reply_count for key in (first, reply, nested, second)], [1, 1, 0, 0])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 4)
+
+    def test_reply_must_be_on_the_same_post(self):
+        """Should reject a parent from another post"""
+        other = Post.objects.create(author=self.user, content='Elsewhere')
+        foreign = self.comment('foreign', post=other)
+        response = self.client.post(reverse('comment-create', args=[self.post.id]), {'content': 'x', 'parent': foreign})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('parent', response.data)
+
+    def test_thread_list_pages_top_level_comments_with_first_replies(self):
+        """Should return top-level comments oldest first with their first replies, in one query"""
+        tops = [self.comment(f'top {n}') for n in range(3)]
+        for n in range(3):
+            self.comment(f'reply {n}', parent=tops[0])
+        self.comment('deep', parent=Comment.objects.get(content='reply 0').id)
+        self.client.credentials()
+
+        url = reverse('comment-threads', args=[self.post.id])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'limit': 2, 'replies': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.shape(response.data['results']), [
+            ('top 0', 3, [('reply 0', 1, []), ('reply 1', 0, [])]),
+            ('top 1', 0, []),
+        ])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.shape(response.data['results']), [('top 2', 0, [])])
+        self.assertIsNone(response.data['next'])
+
+    def test_thread_returns_the_whole_subtree(self):
+        """Should nest every reply below a comment, depth first"""
+        root = self.comment('root')
+        a = self.comment('a', parent=root)
+        self.comment('a1', parent=a)
+        self.comment('b', parent=root)
+        self.comment('unrelated')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('comment-thread', args=[self.post.id, a]))
+        self.assertEqual(self.shape([response.data]), [('a', 1, [('a1', 0, [])])])
+        response = self.client.get(reverse('comment-thread', args=[self.post.id, root]))
+        self.assertEqual(self.shape([response.data]), [('root', 2, [('a', 1, [('a1', 0, [])]), ('b', 0, [])])])
+        missing = self.client.get(reverse('comment-thread', args=[self.post.id, 10 ** 6]))
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deleting_a_comment_removes_its_replies(self):
+        """Should delete the subtree and update comment_count and the parent's reply_count"""
+        root = self.comment('root')
+        a = self.comment('a', parent=root)
+        self.comment('a1', parent=a)
+        self.comment('b', parent=root)
+
+        response = self.client.delete(reverse('comment-delete', args=[self.post.id, a]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(sorted(Comment.objects.values_list('content', flat=True)), ['b', 'root'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(Comment.objects.get(id=root).reply_count, 1)
+
+    def test_user_deletion_releases_replies(self):
+        """Should take a deleted user's comments and the replies below them off the counters"""
+        root = self.comment('root')
+        troll = User.objects.create_user(username='troll', email='troll@example.com', password='pass123')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=troll).key)
+        bait = self.comment('bait', parent=root)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get(user=self.user).key)
+        self.comment('answer', parent=bait)
+        self.assertEqual(threads.with_replies(Comment.objects.filter(author=troll)).count(), 2)
+
+        troll.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(Comment.objects.get(id=root).reply_count, 0)
+
+    def test_update_keeps_the_comment_in_place(self):
+        """Should ignore a parent sent with an update"""
+        root = self.comment('root')
+        reply = self.comment('reply', parent=root)
+        response = self.client.put(reverse('comment-update', args=[self.post.id, reply]), {'content': 'edited', 'parent': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Comment.objects.get(id=reply).parent_id, root)
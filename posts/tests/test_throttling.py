@@ -0,0 +1,87 @@
+import uuid
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from posts.models import Post
+from social_media_api import throttling
+from social_media_api.throttling import BucketTable, bucket_key
+
+User = get_user_model()
+
+def rates(**scopes):
+    return override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=scopes))
+
+class WriteThrottleTest(TestCase):
+    def setUp(self):
+        throttling.table().clear()
+        self.user = User.objects.create_user(username='eager', email='eager@example.com', password='pass123')
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass123')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.post = Post.objects.create(author=self.author, content='popular post')
+
+    def comment(self):
+        return self.client.post(reverse('comment-create', args=[self.post.id]), {'content': 'first'}, format='json')
+
+    def test_burst_beyond_the_rate_is_refused(self):
+        """Should allow a burst of the scope's capacity, then answer 429 with Retry-After"""
+        with rates(comment='3/min'):
+            for _ in range(3):
+                self.assertEqual(self.comment().status_code, status.HTTP_201_CREATED)
+            response = self.comment()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn(int(response['Retry-After']), (19, 20)) #a third of a minute until the next token
+        self.assertEqual(self.post.comments.count(), 3)
+
+    def test_writes_share_one_budget(self):
+        """Should count likes, follows and comments against the user's writes scope"""
+        with rates(writes='2/hour', like='100/min', follow='100/min', comment='100/min'):
+            self.assertEqual(self.client.post(reverse('toggle-like', args=[self.post.id])).status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.client.post(reverse('follow-user', args=[self.author.id])).status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.comment().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_refused_requests_spend_no_tokens(self):
+        """Should leave the writes budget alone when the view's own scope refuses the request"""
+        with rates(writes='3/hour', like='1/hour', comment='100/min'):
+            self.assertEqual(self.client.post(reverse('toggle-like', args=[self.post.id])).status_code, status.HTTP_201_CREATED)
+            for _ in range(5):
+                self.assertEqual(self.client.post(reverse('toggle-like', args=[self.post.id])).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual([self.comment().status_code for _ in range(3)], [201, 201, 429])
+
+    def test_new_account_starts_with_full_buckets(self):
+        """Should refill the buckets of a user id when an account is created with it"""
+        with rates(comment='1/hour'):
+            self.assertEqual(self.comment().status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.comment().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            throttling.reset_user(self.user.id) #what the post_save signal does for a new account
+            self.assertEqual(self.comment().status_code, status.HTTP_201_CREATED)
+
+    def test_buckets_refill_at_the_rate(self):
+        """Should add tokens at capacity per period up to the capacity, and report the wait when empty"""
+        table = BucketTable(64)
+        key = bucket_key('like', 1)
+        self.assertEqual([table.take(key, 2, 1.0, now=100.0) for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(table.take(key, 2, 1.0, now=100.25), 0.75)
+        self.assertEqual(table.take(key, 2, 1.0, now=101.25), 0)
+        waits = [table.take(key, 2, 1.0, now=1000.0) for _ in range(3)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertGreater(waits[2], 0) #capped at the capacity
+        self.assertEqual(table.take(bucket_key('like', 2), 2, 1.0, now=1000.0), 0) #other users have their own bucket
+        table.refund(key, 2)
+        self.assertEqual(table.take(key, 2, 1.0, now=1000.0), 0)
+
+    def test_shared_table_is_seen_by_every_worker(self):
+        """Should spend tokens from one table when THROTTLE_SHARED_MEMORY maps the same segment"""
+        name = f'throttle-test-{uuid.uuid4().hex[:8]}'
+        first, second = BucketTable(64, name), BucketTable(64, name)
+        self.addCleanup(first.close, unlink=True)
+        self.addCleanup(second.close)
+        key = bucket_key('follow', 1)
+        self.assertEqual(first.take(key, 1, 0.001, now=5.0), 0)
+        self.assertGreater(second.take(key, 1, 0.001, now=5.0), 0)
+        second.reset([key])
+        self.assertEqual(first.take(key, 1, 0.001, now=5.0), 0)
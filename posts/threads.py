@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, Concat, Left, Length, RowNumber
+from rest_framework import generics
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from .models import Comment
+from .rows import comment_rows
+from . import counters
+
+#threaded comments as materialized paths. a comment's path is its parent's path followed by its own id in
+#Comment.PATH_STEP base-36 digits, so ordering a post's comments by path lists every thread depth first,
+#siblings oldest first, and a comment's subtree is the range of paths from its own up to its own + END.
+#a thread, or a page of top-level comments with their first replies, is one indexed range query whose
+#rows arrive parents first, and build_tree() nests them in one pass
+
+#path + END sorts after every path below path. it is built from the greatest base-36 digit rather than a
+#character past it: where '~' or '{' sort depends on the collation (MySQL's default utf8mb4_0900_ai_ci puts
+#punctuation before digits), while every collation orders z after the other digits and a string after
+#its prefixes, and no path is 255 digits longer than its ancestor's
+END = 'z' * Comment._meta.get_field('path').max_length
+
+#---------------------------------------reads---------------------------------------
+#a comment and all its replies at any depth in path order, one query. COMMENT_THREAD_LIMIT cuts it to a
+#depth-first prefix of the thread, so the tree stays connected and the cut replies show in reply_count
+def subtree(post_id, comment_id):
+    root = Subquery(Comment.objects.filter(post_id=post_id, id=comment_id).values('path'))
+    return (
+        Comment.objects.filter(post_id=post_id, path__gte=root, path__lt=Concat(root, Value(END)))
+        .select_related('author').order_by('path')[:settings.COMMENT_THREAD_LIMIT]
+    )
+
+#up to limit + 1 top-level comments after the one with id `after`, each followed by its first `replies`
+#direct replies, one query. the extra top-level comment (without its replies) tells there is a next page
+def top_level(post_id, limit, replies, after=None):
+    start = Comment.path_segment(after) + END if after else ''
+    last = Subquery(
+        Comment.objects.filter(post_id=post_id, depth=0, path__gt=start).order_by('path').values('path')[limit:limit + 1]
+    )
+    return (
+        Comment.objects.filter(post_id=post_id, depth__lte=1, path__gt=start, path__lte=Coalesce(last, Value(END)))
+        .annotate(sibling=Window(RowNumber(), partition_by=F('parent_id'), order_by=F('path').asc()))
+        .filter(Q(depth=0) | Q(sibling__lte=replies))
+        .select_related('author').order_by('path')
+    )
+
+#serialized comments in path order nested under their parents, linear time. comments whose parent is
+#not among them are the roots
+def build_tree(items):
+    nodes, roots = {}, []
+    for item in items:
+        item['replies'] = []
+        nodes[item['id']] = item
+        parent = nodes.get(item['parent'])
+        (parent['replies'] if parent is not None else roots).append(item)
+    return roots
+
+#---------------------------------------writes---------------------------------------
+#the comment a new comment on the post replies to, or None for a top-level comment
+def reply_target(post_id, parent_id):
+    if parent_id is None:
+        return None
+    parent = Comment.objects.filter(post_id=post_id, id=parent_id).only('id', 'path', 'depth').first()
+    if parent is None:
+        raise ValidationError({'parent': 'No such comment on this post.'})
+    if parent.depth >= Comment.MAX_DEPTH:
+        raise ValidationError({'parent': f'Replies can nest at most {Comment.MAX_DEPTH} levels deep.'})
+    return parent
+
+def reply_added(parent_id):
+    Comment.objects.filter(id=parent_id).update(reply_count=F('reply_count') + 1)
+
+def reply_removed(parent_id):
+    Comment.objects.filter(id=parent_id, reply_count__gt=0).update(reply_count=F('reply_count') - 1)
+
+#delete a comment with its replies and take them off the post's comment_count and the parent's reply_count
+def delete_subtree(comment):
+    deleted, _ = Comment.objects.filter(
+        post_id=comment.post_id, path__gte=comment.path, path__lt=comment.path + END
+    ).delete()
+    counters.comment_removed(comment.post_id, deleted)
+    if comment.parent_id is not None:
+        reply_removed(comment.parent_id)
+
+#give comments bulk-created without a path (bulk_create skips Comment.save) theirs as top-level comments
+def fill_top_level_paths(batch_size=1000):
+    ids = Comment.objects.filter(path='').values_list('id', flat=True)
+    Comment.objects.bulk_update(
+        [Comment(id=comment_id, path=Comment.path_segment(comment_id)) for comment_id in ids], ['path'], batch_size=batch_size
+    )
+
+#the comments plus every reply below them: what deleting them cascades to
+def with_replies(comments):
+    return Comment.objects.filter(Exists(comments.filter(post_id=OuterRef('post_id'), path=Left(OuterRef('path'), Length('path')))))
+
+#before the comments and their replies are deleted, take the replies among them off their parents'
+#reply_count where the parent stays
+def release_replies(comments):
+    removed = with_replies(comments)
+    parents = removed.filter(parent_id__isnull=False).exclude(parent_id__in=removed.values('id')).values_list('parent_id', flat=True)
+    for parent_id in parents:
+        reply_removed(parent_id)
+
+#---------------------------------------views---------------------------------------
+def _serialize(view, queryset):
+    if settings.FAST_LIST_SERIALIZATION:
+        return comment_rows.serialize(comment_rows.rows(queryset))
+    return view.get_serializer(queryset, many=True).data
+
+def _int_param(request, name, default, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: 'A whole number is required.'})
+    return max(0, min(value, maximum))
+
+#a page of a post's top-level comments, oldest first, each with its first ?replies= direct replies;
+#?limit= sets the page length and the `next` link continues with ?after=
+class ThreadListAPIView(generics.GenericAPIView):
+    def get(self, request, *args, **kwargs):
+        limit = _int_param(request, 'limit', api_settings.PAGE_SIZE, 100) or 1
+        replies = _int_param(request, 'replies', settings.COMMENT_THREAD_REPLIES, settings.COMMENT_THREAD_MAX_REPLIES)
+        after = _int_param(request, 'after', 0, 36 ** Comment.PATH_STEP - 1)
+        roots = build_tree(_serialize(self, top_level(self.kwargs['post_id'], limit, replies, after)))
+        next_url = None
+        if len(roots) > limit:
+            roots = roots[:limit]
+            next_url = replace_query_param(request.build_absolute_uri(), 'after', roots[-1]['id'])
+        return Response({'next': next_url, 'results': roots})
+
+#a comment with its replies nested to any depth
+class ThreadDetailAPIView(generics.GenericAPIView):
+    def get(self, request, *args, **kwargs):
+        roots = build_tree(_serialize(self, subtree(self.kwargs['post_id'], self.kwargs['pk'])))
+        if not roots:
+            raise NotFound()
+        return Response(roots[0])
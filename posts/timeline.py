@@ -0,0 +1,75 @@
+from itertools import islice
+from django.conf import settings
+from django.core.cache import cache
+from users.models import User, Follow
+from users.graph import follow_graph
+from .models import Post, TimelineEntry
+
+#materialized per-user timelines: posts are pushed into followers' timelines when written,
+#so reading a feed is a single range scan over (user, created_at) instead of an IN-list over all posts.
+#authors with FEED_PULL_THRESHOLD or more followers are not pushed; their posts are pulled at read time (see posts/feed.py)
+
+#ids of authors whose posts are pulled at read time instead of fanned out; cached because it's global and small
+#(served by the index on the stored User.follower_count)
+def pulled_author_ids():
+    threshold = settings.FEED_PULL_THRESHOLD
+    key = f'timeline:pulled-authors:{threshold}'
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = frozenset(User.objects.filter(follower_count__gte=threshold).values_list('id', flat=True))
+        cache.set(key, author_ids, settings.FEED_PULL_CACHE_SECONDS)
+    return author_ids
+
+#pulled authors that the given user follows
+def followed_pulled_author_ids(user_id):
+    pulled = pulled_author_ids()
+    if not pulled:
+        return []
+    if settings.FOLLOW_GRAPH_INDEX:
+        followed = follow_graph.following_of(user_id)
+        return [author_id for author_id in sorted(pulled) if author_id in followed]
+    return list(Follow.objects.filter(follower_id=user_id, following_id__in=pulled).values_list('following_id', flat=True))
+
+def _bulk_insert(entries):#insert timeline rows in fixed-size batches, skipping rows that already exist
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+
+#push a newly created post into the timeline of every follower of its author
+def fan_out_post(post):
+    if post.author_id in pulled_author_ids():
+        return #too many followers to push to, readers pull this author instead
+    follower_ids = Follow.objects.filter(following_id=post.author_id).values_list('follower_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=follower_id, post_id=post.id, author_id=post.author_id, created_at=post.created_at)
+        for follower_id in follower_ids.iterator(chunk_size=settings.TIMELINE_BATCH_SIZE)
+    )
+
+#remove a post from every timeline (also happens through the cascade when the post row is deleted)
+def remove_post(post):
+    TimelineEntry.objects.filter(post_id=post.id).delete()
+
+#copy the most recent posts of an author into a follower's timeline after a follow
+def backfill(follower_id, author_id, limit=None):
+    if author_id in pulled_author_ids():
+        return #pulled at read time, nothing to copy
+    limit = settings.TIMELINE_BACKFILL_LIMIT if limit is None else limit
+    posts = Post.objects.filter(author_id=author_id).order_by('-created_at', '-id').values_list('id', 'created_at')
+    _bulk_insert(
+        TimelineEntry(user_id=follower_id, post_id=post_id, author_id=author_id, created_at=created_at)
+        for post_id, created_at in posts[:limit]
+    )
+
+#drop an author's posts from a follower's timeline after an unfollow
+def trim(follower_id, author_id):
+    TimelineEntry.objects.filter(user_id=follower_id, author_id=author_id).delete()
+
+#rebuild a user's timeline from scratch out of the follow graph
+def rebuild(user_id, limit=None):
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    for author_id in Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True):
+        backfill(user_id, author_id, limit=limit)
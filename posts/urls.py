@@ -1,6 +1,13 @@
 from django.urls import path, include
 from django.contrib import admin
-from .views import ToggleLikeView, FeedView, PostLikeListView, PostListView, PostDetailView, PostCreateView, PostUpdateView, PostDeleteView, PostCommentListView, PostCommentDetailView, PostCommentCreateView, PostCommentUpdateView, PostCommentDeleteView 
+from django.conf import settings
+from .views import ToggleLikeView, FeedView, PostLikeListView, PostListView, PostDetailView, PostCreateView, PostUpdateView, PostDeleteView, PostCommentListView, PostCommentThreadListView, PostCommentThreadView, PostCommentDetailView, PostCommentCreateView, PostCommentUpdateView, PostCommentDeleteView
+from . import views
+
+#read-heavy views run on the event loop under ASGI (asgi.py turns ASYNC_READ_VIEWS on by default)
+if settings.ASYNC_READ_VIEWS:
+    PostListView, PostDetailView = views.AsyncPostListView, views.AsyncPostDetailView
+    PostCommentListView, FeedView = views.AsyncPostCommentListView, views.AsyncFeedView
 
 urlpatterns = [
     path('posts/<int:post_id>/like/', ToggleLikeView.as_view(), name='toggle-like'),
@@ -11,9 +18,15 @@ urlpatterns = [
     path('posts/<int:pk>/update/', PostUpdateView.as_view(), name='post-update'),
     path('posts/<int:pk>/delete/', PostDeleteView.as_view(), name='post-delete'),
     path('posts/<int:post_id>/comments/', PostCommentListView.as_view(), name='comment-list'),
+    path('posts/<int:post_id>/comments/threads/', PostCommentThreadListView.as_view(), name='comment-threads'),
     path('posts/<int:post_id>/comments/<int:pk>/', PostCommentDetailView.as_view(), name='comment-detail'),
+    path('posts/<int:post_id>/comments/<int:pk>/thread/', PostCommentThreadView.as_view(), name='comment-thread'),
     path('posts/<int:post_id>/comments/create/', PostCommentCreateView.as_view(), name='comment-create'),
     path('posts/<int:post_id>/comments/<int:pk>/update/', PostCommentUpdateView.as_view(), name='comment-update'),
     path('posts/<int:post_id>/comments/<int:pk>/delete/', PostCommentDeleteView.as_view(), name='comment-delete'),
     path('feed/', FeedView.as_view(), name='user-feed'),
-]
\ No newline at end of file
+]
+
+#live feed updates stream for as long as the client stays, which only ASGI serves without tying up a thread
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns.append(path('feed/live/', views.LiveFeedView.as_view(), name='user-feed-live'))
\ No newline at end of file
@@ -4,38 +4,61 @@ from .models import Post, Comment, Like
 from .serializers import PostSerializer, CommentSerializer, LikeSerializer
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count
 from rest_framework.views import APIView
+from rest_framework.renderers import JSONRenderer
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from .models import Post
+from .feed import HybridFeed
+from .pagination import KeysetPagination
+from .search import PostSearchFilter
+from .rows import RowListMixin, post_rows, comment_rows, like_rows
+from django.conf import settings
+from . import counters, like_buffer, live, threads, timeline
+from .response_cache import AsyncCachedResponseMixin, CachedResponseMixin
+from . import response_cache
+from social_media_api.async_views import AsyncAPIViewMixin, AsyncListMixin, AsyncRetrieveMixin
+from social_media_api.throttling import WRITE_THROTTLES
 
 # Create your views here.
 #------------------POST VIEWS---------------------
+#?ordering= fields whose order every like and comment can change
+RANKED_ORDERINGS = {'like_count', 'comment_count', 'popularity'}
+
 #List all posts
-class PostListView(generics.ListAPIView):
+class PostListView(CachedResponseMixin, RowListMixin, generics.ListAPIView):
     queryset = Post.objects.all().order_by('-created_at')
     serializer_class = PostSerializer
+    row_serializer = post_rows #pages are read as rows (see posts/rows.py)
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination #cursor on (created_at, id); ?page= or ?ordering= switch to page numbers
+    cache_scopes = (response_cache.POSTS,) #cached per URL until a post is created, edited or deleted
+    cache_item_scope = 'post:{id}' #or the counts of a post on the page change
     
+    def get_cache_scopes(self):#lists ordered by counts or popularity move with every like and comment
+        orderings = self.request.query_params.get('ordering', '').split(',')
+        if any(field.strip().lstrip('-') in RANKED_ORDERINGS for field in orderings):
+            return (*self.cache_scopes, response_cache.RANKED)
+        return self.cache_scopes
+
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Post.objects.none()#swagger compatibility
         
-        return Post.objects.all().annotate(
-            like_count=Count('likes'),
-            comment_count=Count('comments')
-        ).order_by('-created_at', '-like_count', '-comment_count')
+        return Post.objects.select_related('author').order_by('-created_at', '-id') #like/comment counts are stored on the post
         
     #filtering, searching, ordering
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    filter_backends = [PostSearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     filterset_fields = ['author__username', 'created_at']
-    search_fields = ['author__username', 'content'] 
-    ordering_fields = ['created_at', 'updated_at', 'author__username','like_count', 'comment_count']
+    search_fields = ['author__username', 'content'] #served by PostSearchFilter: content via the inverted index, usernames by prefix
+    ordering_fields = ['created_at', 'updated_at', 'author__username','like_count', 'comment_count', 'popularity'] #-popularity pages by keyset too
     
 #view/retrieve a single post
-class PostDetailView(generics.RetrieveAPIView):
-    queryset = Post.objects.all()
+class PostDetailView(CachedResponseMixin, generics.RetrieveAPIView):
+    queryset = Post.objects.select_related('author')
     serializer_class = PostSerializer
     permission_classes = [permissions.AllowAny]
+    cache_scopes = ('post:{pk}',)
     
 #Createa a new post
 class PostCreateView(generics.CreateAPIView):
@@ -44,7 +67,9 @@ class PostCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def perform_create(self, serializer):#auto set author as the logged in user
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            post = serializer.save(author=self.request.user)
+            timeline.fan_out_post(post) #push the new post into followers' timelines
 
 #update a post
 class PostUpdateView(generics.UpdateAPIView):
@@ -61,18 +86,38 @@ class PostDeleteView(generics.DestroyAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            timeline.remove_post(instance) #drop the post from followers' timelines
+            instance.delete()
+    
 #------------------COMMENT VIEWS(comments are nested in posts)---------------------
 #List all comments for a post
-class PostCommentListView(generics.ListAPIView):
+class PostCommentListView(CachedResponseMixin, RowListMixin, generics.ListAPIView):
     serializer_class = CommentSerializer
+    row_serializer = comment_rows
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    cache_scopes = ('comments:{post_id}',)
     
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Comment.objects.none() #swagger compatibility
         
         post_id = self.kwargs['post_id'] #filter comments by post id from URL
-        return Comment.objects.filter(post_id=post_id).order_by('-created_at')
+        return Comment.objects.filter(post_id=post_id).select_related('author').order_by('-created_at', '-id')
+    
+#top-level comments of a post, oldest first, each with its first replies (see posts/threads.py)
+class PostCommentThreadListView(CachedResponseMixin, threads.ThreadListAPIView):
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.AllowAny]
+    cache_scopes = ('comments:{post_id}',)
+
+#a comment with its whole reply tree
+class PostCommentThreadView(CachedResponseMixin, threads.ThreadDetailAPIView):
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.AllowAny]
+    cache_scopes = ('comments:{post_id}',)
     
 #retrieve a single comment under a post
 class PostCommentDetailView(generics.RetrieveAPIView):
@@ -84,12 +129,14 @@ class PostCommentDetailView(generics.RetrieveAPIView):
             return Comment.objects.none() #swagger compatibility
         
         post_id = self.kwargs['post_id']
-        return Comment.objects.filter(post_id=post_id)
+        return Comment.objects.filter(post_id=post_id).select_related('author')
     
 #Create comment on a post
 class PostCommentCreateView(generics.CreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = WRITE_THROTTLES
+    throttle_scope = 'comment'
     
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
@@ -100,7 +147,12 @@ class PostCommentCreateView(generics.CreateAPIView):
     
     def perform_create(self, serializer):#auto set author as the logged in user
         post_id = self.kwargs['post_id']
-        serializer.save(author=self.request.user, post_id=post_id)
+        parent = threads.reply_target(post_id, serializer.validated_data.pop('parent_id', None))
+        with transaction.atomic():
+            serializer.save(author=self.request.user, post_id=post_id, parent=parent)
+            counters.comment_added(post_id)
+            if parent is not None:
+                threads.reply_added(parent.id)
         
 #update a comment
 class PostCommentUpdateView(generics.UpdateAPIView):
@@ -115,6 +167,7 @@ class PostCommentUpdateView(generics.UpdateAPIView):
         return Comment.objects.filter(post_id=post_id, author=self.request.user)
     
     def perform_update(self, serializer):
+        serializer.validated_data.pop('parent_id', None) #a comment stays where it was posted
         serializer.save(author=self.request.user)#only author can update comment
         
 #delete a comment under a post
@@ -129,77 +182,127 @@ class PostCommentDeleteView(generics.DestroyAPIView):
         post_id = self.kwargs['post_id']
         return Comment.objects.filter(post_id=post_id, author=self.request.user)
     
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            threads.delete_subtree(instance) #replies go with it
+    
 #------------------LIKE VIEWS---------------------
 #handle post like/unlike functionality - a toggle allowing auth users to like, unlike / undo like unlike
 class ToggleLikeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = WRITE_THROTTLES
+    throttle_scope = 'like'
     
     def post(self, request, post_id):
+        if settings.LIKE_WRITE_BEHIND:
+            return self.buffered_toggle(request, post_id)
         try:
             post = Post.objects.get(id=post_id)
         except Post.DoesNotExist:
             return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        #check if user already liked the post
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        with transaction.atomic():
+            #check if user already liked the post
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            
+            if not created:
+                #user already liked the post, so unlike it
+                like.delete()
+                counters.like_removed(post.id)
+            else:
+                counters.like_added(post.id)
         
         if not created:
-            #user already liked the post, so unlike it
-            like.delete()
             return Response({'status': 'unliked'}, status=status.HTTP_200_OK)
         
         #new like created
         return Response({'status': 'liked'}, status=status.HTTP_201_CREATED)
 
+    def buffered_toggle(self, request, post_id):#record the toggle in the write-behind buffer (see posts/like_buffer.py)
+        liked = like_buffer.buffer.toggle(request.user.id, post_id)
+        if liked is None:
+            return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+        response_cache.invalidate_counts(post_id) #served like counts include the buffer
+        live.counts_changed(post_id, likes=1 if liked else -1)
+        if liked:
+            return Response({'status': 'liked'}, status=status.HTTP_201_CREATED)
+        return Response({'status': 'unliked'}, status=status.HTTP_200_OK)
+
 #List all likes for a post; displays liked-by info
-class PostLikeListView(viewsets.ModelViewSet):
+class PostLikeListView(RowListMixin, viewsets.ModelViewSet):
     serializer_class = LikeSerializer
+    row_serializer = like_rows
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Like.objects.none()
         
         post_id = self.kwargs['post_id'] #filter likes by queryset
-        return Like.objects.filter(post_id=post_id).order_by('-created_at')
+        return Like.objects.filter(post_id=post_id).select_related('user').order_by('-created_at', '-id')
  
 #----------------------------feed view------------------------
 #rerurn feed of posts from users the auth user follows; ordered by newest first
-class FeedView(generics.ListAPIView):
+#posts come from the user's pushed timeline merged with followed high-follower authors (see posts/feed.py)
+class FeedView(RowListMixin, generics.ListAPIView):
     serializer_class = PostSerializer
+    row_serializer = post_rows
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination #pages continue the merge from the cursor position
     
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Post.objects.none() #swagger compatibility
         
-        #get list of users the auth user follows
-        following_ids = self.request.user.following.values_list('following__id', flat=True)
-        
-        #filter posts by followed users
-        queryset = Post.objects.filter(author_id__in=following_ids)
-        #optional: search by keyword in content
+        #optional: search by keyword in content (through the search index) and filter by date range
+        filters = {}
         keyword = self.request.query_params.get('search', None)
-        if keyword:
-            queryset = queryset.filter(content__icontains=keyword)
-        #optional: filter by date range
         start_date = self.request.query_params.get('start_date', None)
         end_date = self.request.query_params.get('end_date', None)
         if start_date:
-            queryset = queryset.filter(created_at__gte=start_date)
+            filters['created_at__gte'] = start_date
         if end_date:
-            queryset = queryset.filter(created_at__lte=end_date)
-        
-        #sorting
-        sort_by = self.request.query_params.get('sort_by')
-        if sort_by == 'popularity':
-            queryset =queryset.annotate(
-                like_count=Count('likes'),
-                comment_count=Count('comments')
-            ).order_by('-popularity', '-created_at')
-        else:  #default sorting by newest
-            queryset =queryset.order_by('-created_at')      
+            filters['created_at__lte'] = end_date
+        
+        #sorting: newest first by default, or by time-decayed popularity (see posts/ranking.py);
+        #either way timeline and pulled authors are merged lazily, one page at a time
+        ordering = 'popularity' if self.request.query_params.get('sort_by') == 'popularity' else 'created_at'
         
         #return posts from followed users
-        return queryset
-    
\ No newline at end of file
+        return HybridFeed(self.request.user, filters, search=keyword, ordering=ordering)
+
+#----------------------------async read views------------------------
+#the read-heavy views with an async dispatch for ASGI deployments (see social_media_api/async_views.py);
+#posts/urls.py routes to them when ASYNC_READ_VIEWS is on
+
+#post serializers add the likes still in the counter shards, which takes a query (see posts/like_shards.py)
+class ShardedLikeCountMixin:
+    def serializer_queries(self):
+        return settings.LIKE_COUNTER_SHARDS > 0
+
+class AsyncPostListView(ShardedLikeCountMixin, AsyncCachedResponseMixin, AsyncListMixin, PostListView):
+    pass
+
+class AsyncPostDetailView(ShardedLikeCountMixin, AsyncCachedResponseMixin, AsyncRetrieveMixin, PostDetailView):
+    pass
+
+class AsyncPostCommentListView(AsyncCachedResponseMixin, AsyncListMixin, PostCommentListView):
+    pass
+
+class AsyncFeedView(ShardedLikeCountMixin, AsyncListMixin, FeedView):
+    pass
+
+#----------------------------live feed------------------------
+#server-sent events with the new posts and count changes of followed authors (see posts/live.py), resumed
+#after the Last-Event-ID header. an open stream holds no thread, only under ASGI, so posts/urls.py routes it there
+class LiveFeedView(AsyncAPIViewMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, live.EventStreamRenderer] #EventSource asks for text/event-stream
+
+    async def get(self, request):
+        events = live.stream(request.user.id, request.headers.get('Last-Event-ID'))
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' #or nginx holds events back until its buffer fills
+        return response
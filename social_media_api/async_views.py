@@ -0,0 +1,99 @@
+"""
+Async dispatch for DRF views.
+
+REST framework views are synchronous: under ASGI, Django runs each one in a
+worker thread for its whole duration. These mixins give a DRF view an
+``async def`` dispatch so it runs on the event loop instead. The request
+set-up (authentication, permissions, throttles) and queryset building,
+which may query the database through sync-only code, run through
+``sync_to_async``; rows are fetched with the async ORM. Serializers run on
+the loop: they only read fields of rows that are already loaded, so they do
+no I/O. A view whose serializers do query (posts adding their unfolded like
+counter shards) returns True from ``serializer_queries()`` and serializes in
+a worker thread instead.
+
+Mix them in front of an existing view to reuse its configuration::
+
+    class AsyncPostListView(AsyncListMixin, PostListView):
+        pass
+"""
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.response import Response
+
+
+#async replacement for APIView.dispatch; handlers may be coroutines or plain methods
+class AsyncAPIViewMixin:
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if iscoroutinefunction(handler):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    #get_queryset() with the view's filter backends applied, built off the event loop
+    async def afilter_queryset(self):
+        return await sync_to_async(lambda: self.filter_queryset(self.get_queryset()))()
+
+    #whether get_serializer(...).data reads the database, which can't be done on the event loop
+    def serializer_queries(self):
+        return False
+
+    #get_serializer(...).data, serialized on the loop unless the serializer queries
+    async def aserializer_data(self, *args, **kwargs):
+        if self.serializer_queries():
+            return await sync_to_async(lambda: self.get_serializer(*args, **kwargs).data)()
+        return self.get_serializer(*args, **kwargs).data
+
+
+#async GenericAPIView.get_object + RetrieveModelMixin.retrieve
+class AsyncRetrieveMixin(AsyncAPIViewMixin):
+    async def aget_object(self):
+        queryset = await self.afilter_queryset()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def get(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(await self.aserializer_data(instance))
+
+
+#async ListModelMixin.list; paginators may provide `apaginate_queryset`, others run in a worker thread
+class AsyncListMixin(AsyncAPIViewMixin):
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        paginate = getattr(self.paginator, 'apaginate_queryset', None)
+        if paginate is not None:
+            return await paginate(queryset, self.request, view=self)
+        return await sync_to_async(self.paginator.paginate_queryset)(queryset, self.request, view=self)
+
+    async def get(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset()
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(await self.aserializer_data(page, many=True))
+        rows = [obj async for obj in queryset]
+        return Response(await self.aserializer_data(rows, many=True))
@@ -0,0 +1,30 @@
+"""
+Caches that every worker must see.
+
+Read-your-writes pins (social_media_api/replicas.py) and the scope versions
+of the response cache (posts/response_cache.py) are only right when every
+worker reads and writes the same entries: a pin set by the worker that took
+a client's write has to be found by whichever worker takes its next read.
+Django's local-memory and dummy backends keep their entries per process,
+so the settings naming those caches refuse them.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+#the cache `setting` names; ImproperlyConfigured unless it is a CACHES alias the workers share
+def shared_cache(setting):
+    alias = getattr(settings, setting)
+    if alias not in settings.CACHES:
+        raise ImproperlyConfigured(f'{setting} must name a CACHES alias shared by every worker, not {alias!r}')
+    backend = settings.CACHES[alias]['BACKEND']
+    if backend in PROCESS_LOCAL_BACKENDS:
+        raise ImproperlyConfigured(f'{setting} names {alias!r}, whose {backend} keeps a separate cache in every worker')
+    return caches[alias]
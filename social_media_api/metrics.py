@@ -0,0 +1,126 @@
+"""
+In-process request metrics in the Prometheus text format.
+
+``PerformanceMiddleware`` (social_media_api/middleware.py) records every
+request here: a request counter and histograms of total, database,
+serialization and render time and of query counts, labelled with the view
+class name. Histograms are fixed bucket counters updated under one lock per
+request, so recording costs a few dict lookups and the metrics can stay on
+in production.
+
+Each worker process keeps its own numbers, like the token cache: scrape
+every worker, or run a single one per container. ``metrics_view`` serves
+them at ``/metrics/``; set ``METRICS_TOKEN`` to require
+``Authorization: Bearer <token>`` from the scraper.
+"""
+
+import bisect
+import threading
+from collections import deque
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {} #label values -> count
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values = {} #label values -> [per-bucket counts with +Inf last, sum]
+
+    def observe(self, labels, value):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1 #first bucket with value <= le
+        series[1] += value
+
+    def samples(self):
+        names = (*self.labels, 'le')
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(names, (*labels, bound))} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labels)} {round(total, 6)}'
+            yield f'{self.name}_count{_labels(self.labels, labels)} {cumulative}'
+
+
+_lock = threading.Lock()
+requests = Counter('http_requests_total', 'Requests by view, method and status code.', ('view', 'method', 'status'))
+duration = Histogram('http_request_duration_seconds', 'Time from the outermost middleware to the rendered response.', ('view',), DURATION_BUCKETS)
+db_time = Histogram('http_request_db_seconds', 'Time waiting on database queries.', ('view',), DURATION_BUCKETS)
+db_queries = Histogram('http_request_db_queries', 'Database queries per request.', ('view',), QUERY_BUCKETS)
+serialize_time = Histogram('http_request_serialize_seconds', 'Time in the view outside the database, mostly serialization.', ('view',), DURATION_BUCKETS)
+render_time = Histogram('http_request_render_seconds', 'Time rendering the response body.', ('view',), DURATION_BUCKETS)
+slow_requests = Counter('http_slow_requests_total', 'Requests slower than SLOW_REQUEST_MS.', ('view',))
+METRICS = (requests, duration, db_time, db_queries, serialize_time, render_time, slow_requests)
+
+#the latest slow requests with the SQL they ran, newest last (see PerformanceMiddleware)
+slow_samples = deque(maxlen=50)
+
+
+def record(view, method, status, timing):
+    labels = (view,)
+    with _lock:
+        requests.inc((view, method, str(status)))
+        duration.observe(labels, timing['total'])
+        db_time.observe(labels, timing['db'])
+        db_queries.observe(labels, timing['queries'])
+        serialize_time.observe(labels, timing['serialize'])
+        render_time.observe(labels, timing['render'])
+        if timing['slow']:
+            slow_requests.inc(labels)
+
+
+#all metrics in the Prometheus text exposition format
+def exposition():
+    lines = []
+    with _lock:
+        for metric in METRICS:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+#forget everything recorded so far (tests)
+def reset():
+    with _lock:
+        for metric in METRICS:
+            metric.values.clear()
+        slow_samples.clear()
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,180 @@
+"""
+Per-request performance instrumentation.
+
+``PerformanceMiddleware`` times each request and splits it into database
+time (every statement on every connection, through an execute wrapper),
+serialization (the rest of the view's time: for these DRF views mostly
+serializers, plus authentication and permission checks) and rendering of
+the response body. The split is sent back in a ``Server-Timing`` header and
+recorded per view class in social_media_api/metrics.py.
+
+Requests slower than ``SLOW_REQUEST_MS`` are logged to
+``social_media_api.performance`` with the SQL they ran and kept in
+``metrics.slow_samples``. Statements are collected for every request, up to
+``SLOW_REQUEST_MAX_QUERIES``, since slowness is only known at the end.
+Views in ``SLOW_REQUEST_EXEMPT_VIEWS`` are slow by design (login and
+register hash a password) and are never counted or logged as slow.
+
+Works for sync and async views; the request's timing lives in a context
+variable, which asgiref copies into ``sync_to_async`` threads.
+"""
+
+import contextvars
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from . import metrics
+
+logger = logging.getLogger('social_media_api.performance')
+
+current = contextvars.ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    __slots__ = ('start', 'view', 'view_start', 'view_end', 'render_end', 'queries', 'db', 'db_in_view', 'statements')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view = None
+        self.view_start = self.view_end = self.render_end = None
+        self.queries, self.db, self.db_in_view = 0, 0.0, None
+        self.statements = [] #(seconds, sql), kept for the slow-request log
+
+
+#execute wrapper installed on every connection; a no-op outside a request
+def record_query(execute, sql, params, many, context):
+    timing = current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        timing.queries += 1
+        timing.db += elapsed
+        if len(timing.statements) < settings.SLOW_REQUEST_MAX_QUERIES:
+            timing.statements.append((elapsed, sql))
+
+
+#first in the list: connection.execute_wrapper() blocks pop the last wrapper on exit, which must stay theirs
+def _install(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+connection_created.connect(_on_connection_created, dispatch_uid='performance_middleware')
+
+
+def view_name(view_func):
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    return view_class.__name__ if view_class else getattr(view_func, '__name__', 'unknown')
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            #the view hooks do no I/O; as coroutines django calls them on the loop instead of in a thread
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.finish(request, response, timing)
+
+    def start(self):
+        for connection in connections.all(initialized_only=True): #this thread's connections opened before this module was imported
+            _install(connection)
+        timing = RequestTiming()
+        return timing, current.set(timing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = current.get()
+        if timing is not None:
+            timing.view = view_name(view_func)
+            timing.view_start = time.perf_counter()
+            timing.db_in_view = timing.db #db time before the view, subtracted when it returns
+        return None
+
+    #called as soon as the view returns a response that still has to be rendered (DRF's Response)
+    def process_template_response(self, request, response):
+        timing = current.get()
+        if timing is not None and timing.view_start is not None:
+            timing.view_end = time.perf_counter()
+            timing.db_in_view = timing.db - timing.db_in_view
+            response.add_post_render_callback(lambda rendered: setattr(timing, 'render_end', time.perf_counter()))
+        return response
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return PerformanceMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def _aprocess_template_response(self, request, response):
+        return PerformanceMiddleware.process_template_response(self, request, response)
+
+    def finish(self, request, response, timing):
+        end = time.perf_counter()
+        total = end - timing.start
+        serialize = render = 0.0
+        if timing.view_start is not None:
+            if timing.view_end is None: #a plain HttpResponse (e.g. a cached one), nothing left to render
+                timing.view_end, timing.db_in_view = end, timing.db - timing.db_in_view
+            serialize = max(0.0, timing.view_end - timing.view_start - timing.db_in_view)
+            render = (timing.render_end or timing.view_end) - timing.view_end
+        view = timing.view or 'unresolved'
+        slow = total * 1000 >= settings.SLOW_REQUEST_MS and view not in settings.SLOW_REQUEST_EXEMPT_VIEWS
+
+        metrics.record(view, request.method, response.status_code, {
+            'total': total, 'db': timing.db, 'queries': timing.queries,
+            'serialize': serialize, 'render': render, 'slow': slow,
+        })
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timing.db * 1000:.2f};desc="{timing.queries} queries"',
+            f'serialize;dur={serialize * 1000:.2f}',
+            f'render;dur={render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ))
+        if slow:
+            self.sample(request, view, total, timing)
+        return response
+
+    def sample(self, request, view, total, timing):
+        sample = {
+            'view': view, 'method': request.method, 'path': request.path,
+            'ms': round(total * 1000, 2), 'db_ms': round(timing.db * 1000, 2), 'queries': timing.queries,
+            'sql': [(round(seconds * 1000, 3), sql) for seconds, sql in timing.statements],
+        }
+        metrics.slow_samples.append(sample)
+        logger.warning(
+            'slow request %s %s (%s) %.1fms, %d queries in %.1fms:\n%s',
+            request.method, request.path, view, sample['ms'], timing.queries, sample['db_ms'],
+            '\n'.join(f'  {ms:.3f}ms {sql}' for ms, sql in sample['sql']),
+        )
@@ -0,0 +1,27 @@
+"""
+Model behaviour shared by the apps.
+
+Denormalized counters (``User.follower_count``, ``Post.like_count``,
+``Comment.reply_count``, ...) and the scores moved along with them
+(``Post.popularity``) only ever change through single UPDATE statements
+with F() expressions. A model instance holds a copy read at some earlier
+moment, so a regular ``save()`` writing every column would put a stale
+count back over the increments made since.
+"""
+
+
+#mixin for models with counter columns: a save() of an existing row without update_fields writes every
+#column but the COUNTER_FIELDS and RANKING_FIELDS (and deferred ones); naming them in update_fields still writes them
+class MaintainedFieldsMixin:
+    COUNTER_FIELDS = ()
+    RANKING_FIELDS = () #scores that move with the counters
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            maintained = self.COUNTER_FIELDS + self.RANKING_FIELDS
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in maintained and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
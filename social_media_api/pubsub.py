@@ -0,0 +1,164 @@
+"""
+In-process publish/subscribe for the server-sent event streams.
+
+``LocalBroker`` hands every event published on a channel to the
+subscriptions of this process listening on it. Subscriptions are read on
+the event loop of the ASGI application, while events are mostly published
+from the threads running sync views, so a publish schedules one delivery
+per loop with ``call_soon_threadsafe`` instead of waking each subscription.
+
+Events are numbered, and the last ``LIVE_FEED_BACKLOG`` of them are kept: a
+subscription started from an event id (the stream's ``Last-Event-ID``)
+first receives the events it missed. When it can't, because the id comes
+from another process or has left the backlog, it receives a ``reset``
+event instead: the client should reload what it shows. A subscription more
+than ``LIVE_FEED_QUEUE_SIZE`` events behind is reset the same way and its
+queue dropped, so a slow reader holds a bounded amount of memory and never
+holds up the publisher.
+
+``LIVE_FEED_BROKER`` is the dotted path of the broker class. One backed by
+a message broker shared by the workers has to provide ``publish``,
+``subscribe`` and ``active``, and subscriptions with ``get``, ``listen``
+and ``close``.
+"""
+
+import asyncio
+import threading
+import uuid
+from collections import defaultdict, deque, namedtuple
+from functools import partial
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+RESET = 'reset'
+
+#seq orders the events of one broker; id is what a client sends back to resume
+Event = namedtuple('Event', 'seq id channel name data')
+
+
+class Subscription:
+    def __init__(self, broker, maxsize):
+        self.channels = frozenset()
+        self.closed = False
+        self._broker = broker
+        self._loop = asyncio.get_running_loop()
+        self._maxsize = maxsize
+        self._queue = deque()
+        self._ready = asyncio.Event()
+
+    #on the subscription's loop; an event that doesn't fit replaces the queue with a reset that resumes after it
+    def _push(self, event):
+        if self.closed:
+            return
+        if len(self._queue) >= self._maxsize:
+            self._queue.clear()
+            event = event._replace(channel=None, name=RESET, data={})
+        self._queue.append(event)
+        self._ready.set()
+
+    #the events received since the last call, or [] when none arrives within `timeout` seconds
+    async def get(self, timeout):
+        if not self._queue:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        events = list(self._queue)
+        self._queue.clear()
+        return events
+
+    #listen on these channels instead
+    def listen(self, channels):
+        self._broker._listen(self, frozenset(channels))
+
+    def close(self):
+        self._broker._listen(self, frozenset())
+        self.closed = True
+
+
+def _deliver(subscriptions, event):
+    for subscription in subscriptions:
+        subscription._push(event)
+
+
+class LocalBroker:
+    def __init__(self, backlog, queue_size):
+        self.epoch = uuid.uuid4().hex[:8] #ids from another process or from before a restart can't be resumed
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._backlog = deque(maxlen=backlog)
+        self._listeners = defaultdict(set) #channel -> subscriptions
+
+    #whether any stream of this process listens; publishers skip the work of building events when none does
+    def active(self):
+        return bool(self._listeners)
+
+    def publish(self, channel, name, data):
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, f'{self.epoch}-{self._seq}', channel, name, data)
+            self._backlog.append(event)
+            by_loop = defaultdict(list)
+            for subscription in self._listeners.get(channel, ()):
+                by_loop[subscription._loop].append(subscription)
+            #scheduled under the lock, so every loop gets the events in sequence order
+            for loop, subscriptions in by_loop.items():
+                try:
+                    loop.call_soon_threadsafe(partial(_deliver, subscriptions, event))
+                except RuntimeError: #loop closed; its subscriptions are gone with it
+                    pass
+        return event
+
+    #a subscription to `channels`, given the events after `last_event_id` first; call on the loop that reads it
+    def subscribe(self, channels, last_event_id=None):
+        subscription = Subscription(self, self.queue_size)
+        channels = frozenset(channels)
+        with self._lock:
+            if last_event_id:
+                missed = self._since(last_event_id, channels)
+                if missed is None:
+                    subscription._push(Event(self._seq, f'{self.epoch}-{self._seq}', None, RESET, {}))
+                for event in missed or ():
+                    subscription._push(event)
+            self._listen_locked(subscription, channels)
+        return subscription
+
+    #events after the one with `event_id` on `channels`, or None when some may be missing from the backlog
+    def _since(self, event_id, channels):
+        epoch, _, seq = event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        seq = int(seq)
+        oldest = self._backlog[0].seq if self._backlog else self._seq + 1
+        if seq < oldest - 1:
+            return None
+        return [event for event in self._backlog if event.seq > seq and event.channel in channels]
+
+    def _listen(self, subscription, channels):
+        with self._lock:
+            self._listen_locked(subscription, channels)
+
+    def _listen_locked(self, subscription, channels):
+        for channel in subscription.channels - channels:
+            listeners = self._listeners[channel]
+            listeners.discard(subscription)
+            if not listeners:
+                del self._listeners[channel]
+        for channel in channels - subscription.channels:
+            self._listeners[channel].add(subscription)
+        subscription.channels = channels
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+#the process's broker, created on first use
+def broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.LIVE_FEED_BROKER)(settings.LIVE_FEED_BACKLOG, settings.LIVE_FEED_QUEUE_SIZE)
+    return _broker
@@ -0,0 +1,127 @@
+"""
+Read-replica routing with read-your-writes stickiness.
+
+``ReplicaMiddleware`` sends the queries of safe-method (GET, HEAD, OPTIONS)
+requests to the API views to one of ``READ_REPLICAS``, picked per request;
+``ReplicaRouter`` reads the choice from a context variable, so requests
+without one, management commands and background threads stay on
+``default``. Writes always go to ``default``, and so do token lookups: a
+token is read right after login creates it, before any replica has it.
+
+A write request that succeeds pins the credentials it was made with (its
+``Authorization`` header) to the primary for ``REPLICA_PIN_SECONDS``, long
+enough for replication to catch up, so a client reading back the post it
+just created or the account it just followed sees it. Pins live in the
+cache ``REPLICA_PIN_CACHE_ALIAS`` names, which the workers must share: the
+next read may land on any of them. ``READ_REPLICAS`` is refused without it.
+
+A response cache miss (posts/response_cache.py) moves the rest of its
+request to the primary: the response is stored under the current scope
+versions, and a lagging replica would keep serving the data from before
+the write that bumped them for as long as the entry lives.
+"""
+
+import contextvars
+import hashlib
+import random
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.views import APIView
+from .caching import shared_cache
+
+PIN_PREFIX = 'replicas:pin:'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+current = contextvars.ContextVar('read_alias', default=None)
+
+
+class ReadAlias:
+    __slots__ = ('alias', 'pinned')
+
+    def __init__(self, pinned):
+        self.alias = None #the replica this request reads from, set once its view is known
+        self.pinned = pinned
+
+
+#read from the primary for the rest of the request
+def use_primary():
+    state = current.get()
+    if state is not None:
+        state.alias = None
+
+
+def _pin_key(request):
+    credentials = request.headers.get('Authorization')
+    if not credentials:
+        return None
+    return PIN_PREFIX + hashlib.sha1(credentials.encode()).hexdigest()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'authtoken':
+            return 'default'
+        state = current.get()
+        return state.alias if state is not None and state.alias else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True #replicas hold the same rows as the primary
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.READ_REPLICAS:
+            raise MiddlewareNotUsed
+        self.pins = shared_cache('REPLICA_PIN_CACHE_ALIAS')
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view #no I/O, run on the loop
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key = _pin_key(request)
+        safe = request.method in SAFE_METHODS
+        token = current.set(ReadAlias(pinned=safe and key is not None and self.pins.get(key) is not None))
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        if not safe and key is not None and response.status_code < 400:
+            self.pins.set(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        key = _pin_key(request)
+        safe = request.method in SAFE_METHODS
+        token = current.set(ReadAlias(pinned=safe and key is not None and await self.pins.aget(key) is not None))
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        if not safe and key is not None and response.status_code < 400:
+            await self.pins.aset(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    #only API views read from replicas; the admin reads back what it just saved
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = current.get()
+        view_class = getattr(view_func, 'cls', None)
+        if (
+            state is not None and not state.pinned and request.method in SAFE_METHODS
+            and isinstance(view_class, type) and issubclass(view_class, APIView)
+        ):
+            state.alias = random.choice(settings.READ_REPLICAS)
+        return None
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return ReplicaMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social_media_api.middleware.PerformanceMiddleware', #outermost, so its timings cover the whole stack
+    'social_media_api.replicas.ReplicaMiddleware', #picks the database reads go to; unused without READ_REPLICAS
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,19 +82,35 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST'),
-        'PORT': config('DB_PORT'),
-        'TEST': {
-            'NAME': config('DB_NAME_TEST', default='social_media_api_test_db'),
-        },
+DB_ENGINE = config('DB_ENGINE', default='mysql') #'sqlite' runs on two local files, a primary and a stand-in replica, for development and tests
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3'},
+        'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db-replica.sqlite3'},
     }
-}
+    #nothing copies rows between the files, so reads only go to the replica when READ_REPLICAS names it
+    READ_REPLICAS = config('READ_REPLICAS', default='', cast=Csv())
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': config('DB_NAME'),
+            'USER': config('DB_USER'),
+            'PASSWORD': config('DB_PASSWORD'),
+            'HOST': config('DB_HOST'),
+            'PORT': config('DB_PORT'),
+            'TEST': {
+                'NAME': config('DB_NAME_TEST', default='social_media_api_test_db'),
+            },
+        }
+    }
+    #one alias per replica host (replica1, replica2, ...), same credentials as the primary
+    for n, host in enumerate(config('DB_REPLICA_HOSTS', default='', cast=Csv()), 1):
+        DATABASES[f'replica{n}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['social_media_api.replicas.ReplicaRouter'] #safe-method API requests read from READ_REPLICAS (see social_media_api/replicas.py)
 
 
 # Password validation
@@ -131,6 +149,11 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files
+MEDIA_URL = config('MEDIA_URL', default='media/')
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler'] #stream every upload to a temporary file in chunks, never into memory
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -139,7 +162,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication', #token auth with the token -> user lookup cached
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated', #global default permission/authentication
@@ -149,6 +172,12 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10, #number of items per page
+    'DEFAULT_THROTTLE_RATES': { #token buckets per user (see social_media_api/throttling.py): bursts of N, then N per period
+        'writes': config('THROTTLE_WRITES', default='1000/hour'), #likes, follows and comments together
+        'like': config('THROTTLE_LIKE', default='120/min'),
+        'follow': config('THROTTLE_FOLLOW', default='60/min'),
+        'comment': config('THROTTLE_COMMENT', default='30/min'),
+    },
 }
 
 AUTH_USER_MODEL = 'users.User'
@@ -171,3 +200,106 @@ SECURE_HSTS_SECONDS = config('SECURE_HSTS_SECONDS', default=0, cast=int)
 SECURE_HSTS_INCLUDE_SUBDOMAINS = config('SECURE_HSTS_INCLUDE_SUBDOMAINS', default=False, cast=bool)
 SECURE_HSTS_PRELOAD = config('SECURE_HSTS_PRELOAD', default=False, cast=bool)
 
+
+# Feed timelines (fan-out on write)
+TIMELINE_BATCH_SIZE = config('TIMELINE_BATCH_SIZE', default=1000, cast=int) #rows per bulk insert when fanning out posts
+TIMELINE_BACKFILL_LIMIT = config('TIMELINE_BACKFILL_LIMIT', default=500, cast=int) #recent posts copied into a timeline on follow
+FEED_PULL_THRESHOLD = config('FEED_PULL_THRESHOLD', default=10000, cast=int) #authors with at least this many followers are pulled at read time instead of fanned out
+FEED_PULL_CACHE_SECONDS = config('FEED_PULL_CACHE_SECONDS', default=300, cast=int) #how long the set of pulled authors is cached
+FEED_CHUNK_SIZE = config('FEED_CHUNK_SIZE', default=50, cast=int) #posts fetched per feed source per round trip while merging
+FEED_POPULARITY_WINDOW = config('FEED_POPULARITY_WINDOW', default=1000, cast=int) #newest timeline entries the popularity-sorted feed ranks, each page sorts up to this many
+
+# Post search (inverted index)
+SEARCH_MIN_PREFIX = config('SEARCH_MIN_PREFIX', default=3, cast=int) #shortest final term that is matched as a prefix
+SEARCH_RANK_LIMIT = config('SEARCH_RANK_LIMIT', default=2000, cast=int) #terms with more postings are probed per post and not ranked
+SEARCH_FREQUENCY_CACHE_SECONDS = config('SEARCH_FREQUENCY_CACHE_SECONDS', default=60, cast=int) #how long each worker reuses a term's posting count and the post total
+
+# Token authentication cache
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=10000, cast=int) #tokens kept in each worker's in-process LRU
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=60, cast=int) #seconds a cached token is trusted, bounds staleness across workers
+AUTH_TOKEN_CACHE_ALIAS = config('AUTH_TOKEN_CACHE_ALIAS', default='') #optional CACHES alias shared by all workers, empty for in-process only
+
+# Async views
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool) #route post list/detail, comment list and feed to their async views; asgi.py defaults it on
+
+# Like write-behind buffer
+LIKE_WRITE_BEHIND = config('LIKE_WRITE_BEHIND', default=False, cast=bool) #buffer like toggles in memory and write them in batches
+LIKE_BUFFER_FLUSH_SECONDS = config('LIKE_BUFFER_FLUSH_SECONDS', default=1.0, cast=float) #interval between background flushes, 0 flushes only when full or at exit
+LIKE_BUFFER_MAX_PENDING = config('LIKE_BUFFER_MAX_PENDING', default=500, cast=int) #durability: most toggles a crash can lose; reaching it flushes within the request
+
+# Sharded like counters
+LIKE_COUNTER_SHARDS = config('LIKE_COUNTER_SHARDS', default=0, cast=int) #counter rows per post taking like toggles so likes on one post don't queue on its row, 0 updates the post row
+LIKE_SHARD_COMPACT_SECONDS = config('LIKE_SHARD_COMPACT_SECONDS', default=5.0, cast=float) #interval between folds of the shards into like_count, 0 leaves them to compact_like_shards
+
+# Shared cache
+#a cache every worker sees (e.g. SHARED_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache with SHARED_CACHE_LOCATION=redis://host:6379),
+#for the replica pins and the cached responses; the default cache is local to each worker
+SHARED_CACHE_BACKEND = config('SHARED_CACHE_BACKEND', default='')
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+if SHARED_CACHE_BACKEND:
+    CACHES['shared'] = {'BACKEND': SHARED_CACHE_BACKEND, 'LOCATION': config('SHARED_CACHE_LOCATION', default='')}
+
+# Response cache for post reads
+RESPONSE_CACHE_SECONDS = config('RESPONSE_CACHE_SECONDS', default=60, cast=int) #lifetime of a cached post list/detail/comments response, 0 disables the cache
+RESPONSE_CACHE_ALIAS = config('RESPONSE_CACHE_ALIAS', default='shared' if SHARED_CACHE_BACKEND else '') #CACHES alias shared by every worker holding cached responses and their scope versions, empty disables the cache
+
+# Popularity ranking
+POPULARITY_HALF_LIFE_HOURS = config('POPULARITY_HALF_LIFE_HOURS', default=12.0, cast=float) #age at which a post needs twice the engagement to keep its rank
+POPULARITY_LIKE_WEIGHT = config('POPULARITY_LIKE_WEIGHT', default=1.0, cast=float) #engagement per like
+POPULARITY_COMMENT_WEIGHT = config('POPULARITY_COMMENT_WEIGHT', default=2.0, cast=float) #engagement per comment; run recompute_popularity after changing any of these
+
+# Performance metrics
+PERFORMANCE_METRICS = config('PERFORMANCE_METRICS', default=True, cast=bool) #time requests, send Server-Timing and record histograms served at /metrics/
+METRICS_TOKEN = config('METRICS_TOKEN', default='') #bearer token the /metrics/ scraper must send, empty leaves it open
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=500, cast=int) #requests at least this slow are logged with their SQL
+SLOW_REQUEST_EXEMPT_VIEWS = config('SLOW_REQUEST_EXEMPT_VIEWS', default='RegisterView,LoginView', cast=Csv()) #views slow by design (password hashing), never logged as slow
+SLOW_REQUEST_MAX_QUERIES = config('SLOW_REQUEST_MAX_QUERIES', default=200, cast=int) #statements kept per request for the slow-request log
+
+# List serialization
+FAST_LIST_SERIALIZATION = config('FAST_LIST_SERIALIZATION', default=True, cast=bool) #serialize post, feed, comment and like pages from values_list() rows (see posts/rows.py)
+
+# Follow graph index
+FOLLOW_GRAPH_INDEX = config('FOLLOW_GRAPH_INDEX', default=True, cast=bool) #answer follow lists, mutual friends and followed pulled authors from an in-process CSR index (see users/graph.py)
+FOLLOW_GRAPH_SYNC_SECONDS = config('FOLLOW_GRAPH_SYNC_SECONDS', default=0.0, cast=float) #interval between reads of the follow event log, 0 reads it before every lookup; more serves lookups from memory alone, up to that stale across workers
+FOLLOW_GRAPH_MAX_OVERLAY = config('FOLLOW_GRAPH_MAX_OVERLAY', default=50000, cast=int) #edge changes kept beside the arrays before they are merged in; a worker further behind in the log rebuilds
+FOLLOW_EVENT_RETENTION_HOURS = config('FOLLOW_EVENT_RETENTION_HOURS', default=24, cast=int) #follow events older than this are pruned by rebuild_follow_graph
+
+# People you may know
+RECOMMENDATION_LIMIT = config('RECOMMENDATION_LIMIT', default=10, cast=int) #accounts returned without ?limit=
+RECOMMENDATION_CACHE_SIZE = config('RECOMMENDATION_CACHE_SIZE', default=50, cast=int) #ranked accounts cached per user, the largest ?limit=
+RECOMMENDATION_CACHE_SECONDS = config('RECOMMENDATION_CACHE_SECONDS', default=3600, cast=int) #lifetime of a user's ranking; their own follows update it in place, other users' show up after this
+RECOMMENDATION_MAX_SOURCES = config('RECOMMENDATION_MAX_SOURCES', default=500, cast=int) #followed accounts walked through, a sample when the user follows more
+RECOMMENDATION_MAX_DEGREE = config('RECOMMENDATION_MAX_DEGREE', default=2000, cast=int) #accounts following more than this (hubs) are not walked through
+RECOMMENDATION_TIME_BUDGET_MS = config('RECOMMENDATION_TIME_BUDGET_MS', default=50, cast=int) #the walk stops after this long and ranks what it found
+
+# Threaded comments
+COMMENT_THREAD_REPLIES = config('COMMENT_THREAD_REPLIES', default=3, cast=int) #replies shown under each top-level comment without ?replies=
+COMMENT_THREAD_MAX_REPLIES = config('COMMENT_THREAD_MAX_REPLIES', default=20, cast=int) #largest ?replies=
+COMMENT_THREAD_LIMIT = config('COMMENT_THREAD_LIMIT', default=500, cast=int) #comments returned for one thread, the first ones depth first
+
+# Data export
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=1000, cast=int) #rows read per query while streaming an export
+
+# Read replicas
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int) #after a write, the client's reads stay on the primary this long; keep it above the replication lag
+REPLICA_PIN_CACHE_ALIAS = config('REPLICA_PIN_CACHE_ALIAS', default='shared') #CACHES alias holding the pins, shared by every worker; READ_REPLICAS is refused without one
+
+# Profile picture variants
+PROFILE_PICTURE_VARIANTS = { #name -> width and height in pixels of a square crop
+    'thumbnail': config('PROFILE_PICTURE_THUMBNAIL_SIZE', default=96, cast=int),
+    'medium': config('PROFILE_PICTURE_MEDIUM_SIZE', default=512, cast=int),
+}
+PROFILE_PICTURE_FORMAT = config('PROFILE_PICTURE_FORMAT', default='WEBP') #Pillow format of the variants: WEBP, JPEG or PNG
+PROFILE_PICTURE_QUALITY = config('PROFILE_PICTURE_QUALITY', default=80, cast=int) #encoder quality of the variants
+PROFILE_PICTURE_WORKERS = config('PROFILE_PICTURE_WORKERS', default=2, cast=int) #processes rendering variants per worker, 0 renders them inside the request
+PROFILE_PICTURE_MAX_BYTES = config('PROFILE_PICTURE_MAX_BYTES', default=10 * 2 ** 20, cast=int) #largest accepted upload
+
+# Write throttling
+THROTTLE_SLOTS = config('THROTTLE_SLOTS', default=65536, cast=int) #token buckets in the table, 24 bytes each; keep it above the users writing within a period
+THROTTLE_SHARED_MEMORY = config('THROTTLE_SHARED_MEMORY', default='') #name of a shared memory segment holding one table for all workers on the host, empty for one per process
+
+# Live feed updates
+LIVE_FEED_BROKER = config('LIVE_FEED_BROKER', default='social_media_api.pubsub.LocalBroker') #pub/sub behind the event streams; the default reaches the streams of this process only
+LIVE_FEED_HEARTBEAT_SECONDS = config('LIVE_FEED_HEARTBEAT_SECONDS', default=15.0, cast=float) #idle time before a stream sends a comment line, keeping proxies from closing it
+LIVE_FEED_BACKLOG = config('LIVE_FEED_BACKLOG', default=10000, cast=int) #recent events kept for clients resuming with Last-Event-ID
+LIVE_FEED_QUEUE_SIZE = config('LIVE_FEED_QUEUE_SIZE', default=256, cast=int) #events a slow client may fall behind before its stream is reset
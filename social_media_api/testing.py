@@ -0,0 +1,122 @@
+"""
+Test helpers shared by the app test suites.
+
+``QueryBudget`` records every statement a block of code sends to the
+database and how many rows its SELECTs return, so tests can pin each API
+route to a maximum number of queries and rows. ``seed_social_graph``
+creates a small but realistic dataset (follows, posts, likes, comments,
+timelines and counters) for those budgets to run against.
+``shared_cache_settings`` gives the settings that refuse per-process
+caches one the tests can use.
+"""
+
+import atexit
+import shutil
+import tempfile
+from django.conf import settings
+from django.db import connections
+from django.test import override_settings
+
+from posts import timeline
+from posts.models import Post, Like, Comment
+from users import counters as follow_counters
+from users.models import User, Follow
+
+
+#context manager counting the statements and returned rows of a block
+class QueryBudget:
+    def __init__(self, using='default'):
+        self.connection = connections[using]
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.statements = []
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def queries(self):
+        return len(self.statements)
+
+    @property
+    def rows(self):#rows returned by the recorded SELECTs, counted by re-running each one as a subquery
+        total = 0
+        with self.connection.cursor() as cursor:
+            for sql, params in self.statements:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(f'SELECT COUNT(*) FROM ({sql}) budget_rows', params)
+                total += cursor.fetchone()[0]
+        return total
+
+    def describe(self):
+        return '\n'.join(sql for sql, _ in self.statements)
+
+
+#create a deterministic graph of users, follows, posts, likes and comments and return the users in creation order;
+#counters and timelines are kept in step the way the API would keep them
+def seed_social_graph(users=15, posts_per_user=3, follows_per_user=5, likes_per_post=4, comments_per_post=3):
+    people = [
+        User.objects.create_user(username=f'seed{i:02d}', email=f'seed{i:02d}@example.com', password='pass123')
+        for i in range(users)
+    ]
+    for i, follower in enumerate(people):
+        for step in range(1, follows_per_user + 1):
+            following = people[(i + step) % users]
+            Follow.objects.create(follower=follower, following=following)
+            follow_counters.follow_added(follower.id, following.id)
+
+    posts = []
+    for i, author in enumerate(people):
+        for n in range(posts_per_user):
+            posts.append(Post.objects.create(author=author, content=f'seed post {n} by {author.username}'))
+    for i, post in enumerate(posts):
+        for step in range(likes_per_post):
+            Like.objects.create(user=people[(i + step) % users], post=post)
+        for step in range(comments_per_post):
+            Comment.objects.create(post=post, author=people[(i + step + 1) % users], content=f'seed comment {step}')
+        Post.objects.filter(id=post.id).update(like_count=likes_per_post, comment_count=comments_per_post)
+
+    for person in people:
+        timeline.rebuild(person.id)
+    return people
+
+
+#files in a directory of this test run: shared like a cache server would be, and empty on every run
+SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp(prefix='social-media-api-cache-')}
+atexit.register(shutil.rmtree, SHARED_CACHE['LOCATION'], ignore_errors=True)
+
+#override_settings with a 'shared' cache alias, which each of the settings named in `aliases` is set to
+def shared_cache_settings(*aliases, **overrides):
+    return override_settings(CACHES={**settings.CACHES, 'shared': SHARED_CACHE}, **{name: 'shared' for name in aliases}, **overrides)
+
+
+#names of the routes in a urlconf module, for checking that every route carries a budget
+def route_names(urlconf):
+    return {pattern.name for pattern in urlconf.urlpatterns if pattern.name}
+
+
+#test case mixin asserting that a request stays within a query and row budget
+class QueryBudgetMixin:
+    def assert_within_budget(self, method, url, max_queries, max_rows, data=None, expected_status=None):
+        with QueryBudget() as budget:
+            response = getattr(self.client, method)(url, data)
+        if expected_status is not None:
+            self.assertEqual(response.status_code, expected_status, getattr(response, 'data', response))
+        self.assertLessEqual(
+            budget.queries, max_queries,
+            f'{method.upper()} {url} ran {budget.queries} queries (budget {max_queries}):\n{budget.describe()}'
+        )
+        rows = budget.rows
+        self.assertLessEqual(
+            rows, max_rows, f'{method.upper()} {url} read {rows} rows (budget {max_rows}):\n{budget.describe()}'
+        )
+        return response
@@ -0,0 +1,216 @@
+"""
+Token bucket throttles for the write hot paths (likes, follows, comments).
+
+A rate of ``N/period`` in ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']`` is
+a bucket of N tokens per user that refills at N per period: a client can
+burst N requests and then keep to the rate. ``ScopedBucketThrottle``
+limits a view by its ``throttle_scope``; ``UserBucketThrottle`` is the
+``writes`` budget all throttled views share. ``WriteBucketThrottle`` checks
+both, the view's scope first, and only spends tokens on requests both
+allow, so a client refused on likes keeps its budget for follows and
+comments. A scope without a rate is not limited.
+
+Buckets live in a fixed table of ``THROTTLE_SLOTS`` slots (a 64-bit key
+hash, the tokens left and the time of the last request), so checking one
+costs a hash, a lock and a few float operations instead of the cache
+round trip and timestamp list of DRF's own throttles. Keys are
+direct-mapped: a key landing on a slot held by another key evicts it,
+which only ever lets a request through, so size the table above the number
+of users active within a period.
+
+The table is per process unless ``THROTTLE_SHARED_MEMORY`` names a POSIX
+shared memory segment, which every worker on the host then maps (the first
+creates it). A byte-range lock on the slot in a lock file keeps two
+workers from spending the same token.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError: #not on Windows; THROTTLE_SHARED_MEMORY needs it
+    fcntl = None
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+USER_SCOPE = 'writes'
+
+
+#(capacity, tokens per second) of a DRF style "N/period" rate, None for no rate
+def parse_rate(rate):
+    if rate is None:
+        return None
+    count, _, period = rate.partition('/')
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+#stable across processes, unlike hash()
+def bucket_key(scope, ident):
+    return int.from_bytes(hashlib.blake2b(f'{scope}:{ident}'.encode(), digest_size=8).digest(), 'little', signed=True)
+
+
+class BucketTable:
+    SLOT_BYTES = 24 #key, tokens, updated
+
+    def __init__(self, slots, shared_name=''):
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._memory = self._lock_file = None
+        if shared_name:
+            buffer = self._map_shared(f'{shared_name}-{slots}', slots * self.SLOT_BYTES)
+        else:
+            buffer = bytearray(slots * self.SLOT_BYTES)
+        self._view = memoryview(buffer)
+        self._keys = self._view[:slots * 8].cast('q')
+        self._values = self._view[slots * 8:].cast('d') #tokens and updated of slot i at 2i and 2i + 1
+
+    def _map_shared(self, name, size):
+        from multiprocessing import resource_tracker, shared_memory
+        if fcntl is None:
+            raise RuntimeError('THROTTLE_SHARED_MEMORY needs fcntl locks')
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._memory = shared_memory.SharedMemory(name=name)
+        #the segment outlives every worker; without this each one's resource tracker unlinks it at exit
+        resource_tracker.unregister(self._memory._name, 'shared_memory')
+        self._lock_path = os.path.join(tempfile.gettempdir(), f'{name}.lock')
+        self._lock_file = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        return self._memory.buf
+
+    #the slot of `key`, held against this process's threads and, for a shared table, the other workers
+    @contextmanager
+    def _slot(self, key):
+        slot = key % self.slots
+        with self._lock:
+            if self._lock_file is not None:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, slot)
+            try:
+                yield slot
+            finally:
+                if self._lock_file is not None:
+                    fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, slot)
+
+    #take a token from the bucket of `key`; returns 0 when one was taken, else the seconds until one is available
+    def take(self, key, capacity, per_second, now=None):
+        with self._slot(key) as slot:
+            now = time.monotonic() if now is None else now #system wide, so workers agree on it
+            if self._keys[slot] == key:
+                tokens = min(capacity, self._values[2 * slot] + (now - self._values[2 * slot + 1]) * per_second)
+            else: #empty, or held by another key
+                self._keys[slot], tokens = key, capacity
+            self._values[2 * slot + 1] = now
+            if tokens >= 1:
+                self._values[2 * slot] = tokens - 1
+                return 0
+            self._values[2 * slot] = tokens
+            return (1 - tokens) / per_second
+
+    #give back a token taken for a request that was refused after all
+    def refund(self, key, capacity):
+        with self._slot(key) as slot:
+            if self._keys[slot] == key:
+                self._values[2 * slot] = min(capacity, self._values[2 * slot] + 1)
+
+    #refill the buckets of these keys, e.g. of a new account whose id an old one had
+    def reset(self, keys):
+        for key in keys:
+            with self._slot(key) as slot:
+                if self._keys[slot] == key:
+                    self._keys[slot] = 0
+
+    def clear(self):
+        with self._lock:
+            self._view[:self.slots * 8] = bytes(self.slots * 8)
+
+    #unmap a shared table, removing the segment and its lock file too when `unlink` (the table is gone for every worker)
+    def close(self, unlink=False):
+        if self._memory is None:
+            return
+        from multiprocessing import resource_tracker
+        self._keys.release()
+        self._values.release()
+        self._view.release()
+        self._memory.close()
+        os.close(self._lock_file)
+        if unlink:
+            resource_tracker.register(self._memory._name, 'shared_memory') #unlink() unregisters it again
+            self._memory.unlink()
+            os.remove(self._lock_path)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+#the process's bucket table, mapped on first use
+def table():
+    global _table
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = BucketTable(settings.THROTTLE_SLOTS, settings.THROTTLE_SHARED_MEMORY)
+    return _table
+
+
+#takes a token from the bucket of each of its scopes in order; when one is empty the request is refused
+#and the tokens already taken are given back
+class BucketThrottle(BaseThrottle):
+    def get_scopes(self, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        user = request.user
+        ident = user.pk if user and user.is_authenticated else self.get_ident(request)
+        taken = []
+        for scope in self.get_scopes(view):
+            rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope)) if scope else None
+            if rate is None:
+                continue
+            key = bucket_key(scope, ident)
+            self.delay = table().take(key, *rate)
+            if self.delay:
+                for key, (capacity, _) in taken:
+                    table().refund(key, capacity)
+                return False
+            taken.append((key, rate))
+        return True
+
+    def wait(self):
+        return self.delay
+
+
+#the view's `throttle_scope`
+class ScopedBucketThrottle(BucketThrottle):
+    def get_scopes(self, view):
+        return [getattr(view, 'throttle_scope', None)]
+
+
+#one budget across every view it is applied to
+class UserBucketThrottle(BucketThrottle):
+    def get_scopes(self, view):
+        return [USER_SCOPE]
+
+
+#the view's `throttle_scope`, then the shared writes budget. as one throttle, since DRF runs every throttle
+#class of a view even after one refused: a request refused by its scope doesn't spend a writes token
+class WriteBucketThrottle(BucketThrottle):
+    def get_scopes(self, view):
+        return [getattr(view, 'throttle_scope', None), USER_SCOPE]
+
+
+#applied to the write hot paths, each with its throttle_scope
+WRITE_THROTTLES = (WriteBucketThrottle,)
+
+
+#refill every bucket of a user, whatever its scope
+def reset_user(user_id):
+    scopes = set(api_settings.DEFAULT_THROTTLE_RATES) | {USER_SCOPE}
+    table().reset([bucket_key(scope, user_id) for scope in scopes])
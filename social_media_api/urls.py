@@ -14,11 +14,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from . import metrics
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -36,4 +39,5 @@ urlpatterns = [
     path('api/', include('posts.urls')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-]
+    path('metrics/', metrics.metrics_view, name='metrics'), #prometheus scrape target
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) #uploads and picture variants, only with DEBUG on; serve MEDIA_ROOT from the web server otherwise
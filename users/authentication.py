@@ -0,0 +1,144 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+#in-process LRU cache with a per-entry time to live, safe to share between request threads.
+#on_remove(key, value) is called for every entry that leaves the cache
+class LRUCache:
+    def __init__(self, max_size, ttl, on_remove=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_remove = on_remove
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _removed(self, key, value):
+        if self.on_remove is not None:
+            self.on_remove(key, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self._removed(key, value)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, (old, _) = self._entries.popitem(last=False)
+                self._removed(evicted, old)
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._removed(key, entry[0])
+
+    def clear(self):
+        with self._lock:
+            for key, (value, _) in self._entries.items():
+                self._removed(key, value)
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+#token key -> token (with its user and profile loaded) cache in front of the database. the in-process LRU
+#answers most lookups; when AUTH_TOKEN_CACHE_ALIAS names a Django cache it is used as a shared second level,
+#so workers see each other's invalidations. entries are dropped by signals (see users/signals.py) when a
+#token is deleted or its user or profile is saved, and expire after AUTH_TOKEN_CACHE_TTL seconds regardless
+class TokenCache:
+    key_prefix = 'auth:token:'
+
+    def __init__(self):
+        self._user_keys = {} #user id -> token keys held locally, so invalidating a user needs no query
+        self.local = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL, on_remove=self._forget)
+
+    def _forget(self, key, token):
+        keys = self._user_keys.get(token.user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[token.user_id]
+
+    @property
+    def shared(self):
+        alias = settings.AUTH_TOKEN_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def _set_local(self, key, token):
+        self.local.set(key, token)
+        self._user_keys.setdefault(token.user_id, set()).add(key)
+
+    def get(self, key):
+        token = self.local.get(key)
+        if token is None and self.shared is not None:
+            token = self.shared.get(self.key_prefix + key)
+            if token is not None:
+                self._set_local(key, token)
+        return token
+
+    def set(self, key, token):
+        self._set_local(key, token)
+        if self.shared is not None:
+            self.shared.set(self.key_prefix + key, token, settings.AUTH_TOKEN_CACHE_TTL)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self.key_prefix + key)
+
+    #drop every cached token of a user; the shared cache may hold tokens this worker never saw
+    def delete_user(self, user_id):
+        keys = set(self._user_keys.get(user_id, ()))
+        if self.shared is not None:
+            keys.update(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+        for key in keys:
+            self.delete(key)
+
+    def clear(self):
+        self.local.clear()
+
+token_cache = TokenCache()
+
+#each request gets its own copies so a view mutating request.user can't leak into other requests
+def _copy_token(token):
+    token = copy.copy(token)
+    user = copy.copy(token.user)
+    profile = user._state.fields_cache.get('profile')
+    if profile is not None:
+        user._state.fields_cache['profile'] = copy.copy(profile)
+    token._state.fields_cache['user'] = user
+    return token
+
+#TokenAuthentication with the token -> user (and profile) lookup served from TokenCache, so an
+#authenticated request costs no queries in the steady state
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            try:
+                token = Token.objects.select_related('user', 'user__profile').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            token_cache.set(key, token)
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        token = _copy_token(token)
+        return (token.user, token)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db.models import Count, F
+from .models import User, Follow
+from .graph import follow_graph
+
+#denormalized follower_count/following_count on User, adjusted with F-expressions alongside Follow writes
+
+def _adjust(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta}) #counters never go negative, even after drift
+    queryset.update(**{field: F(field) + delta})
+
+def follow_added(follower_id, following_id):
+    _adjust(User.objects.filter(id=follower_id), 'following_count', 1)
+    _adjust(User.objects.filter(id=following_id), 'follower_count', 1)
+
+def follow_removed(follower_id, following_id):
+    _adjust(User.objects.filter(id=follower_id), 'following_count', -1)
+    _adjust(User.objects.filter(id=following_id), 'follower_count', -1)
+
+#release a user's follow edges from the counters of the other side before the cascade deletes them
+def release(user):
+    _adjust(User.objects.filter(followers__follower=user), 'follower_count', -1)
+    _adjust(User.objects.filter(following__following=user), 'following_count', -1)
+
+#mutual friends of the viewer and each user: accounts the viewer follows that also follow that user.
+#one grouped query for the whole page (or the graph index), returned as {user_id: count}
+def mutual_friend_counts(viewer, user_ids):
+    if viewer is None or not viewer.is_authenticated or not user_ids:
+        return {}
+    if settings.FOLLOW_GRAPH_INDEX:
+        return follow_graph.mutual_counts(viewer.id, user_ids)
+    viewer_following = Follow.objects.filter(follower=viewer).values('following_id')
+    rows = (
+        Follow.objects.filter(following_id__in=user_ids, follower_id__in=viewer_following)
+        .values('following_id').annotate(n=Count('id')).values_list('following_id', 'n')
+    )
+    return dict(rows)
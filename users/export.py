@@ -0,0 +1,76 @@
+import json
+import zlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from posts.models import Post, Comment, Like
+from .models import User, Follow
+
+#a user's data as NDJSON: one JSON object per line, the account first, then each section in id order. every
+#line carries its `type` and `id`, and "<type>:<id>" of the last line received is a cursor that resumes the
+#export right after it. rows are read in keyset batches of EXPORT_CHUNK_SIZE (WHERE owner = ? AND id > ?
+#ORDER BY id, over the owner's foreign key index), so memory stays flat however large the account is;
+#QuerySet.iterator() alone wouldn't do, mysqlclient buffers a whole result set on the client
+
+#(type, model, owner field, columns) in export order
+SECTIONS = (
+    ('post', Post, 'author_id', ('id', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count')),
+    ('comment', Comment, 'author_id', ('id', 'post_id', 'parent_id', 'content', 'created_at', 'updated_at')),
+    ('like', Like, 'user_id', ('id', 'post_id', 'created_at')),
+    ('following', Follow, 'follower_id', ('id', 'following_id', 'created_at')),
+    ('follower', Follow, 'following_id', ('id', 'follower_id', 'created_at')),
+)
+ACCOUNT = 'user'
+TYPES = (ACCOUNT,) + tuple(section[0] for section in SECTIONS)
+
+#(type, last id) from a "<type>:<id>" cursor; ValueError when it isn't one
+def parse_cursor(cursor):
+    kind, _, last_id = cursor.partition(':')
+    if kind not in TYPES:
+        raise ValueError(cursor)
+    return kind, int(last_id)
+
+def _line(kind, row):
+    return json.dumps({'type': kind, **row}, cls=DjangoJSONEncoder).encode() + b'\n'
+
+#the export as a generator of bytes, one chunk of lines per batch, read from the database alias `using`
+def chunks(user_id, cursor=None, using='default'):
+    resume_type, last_id = parse_cursor(cursor) if cursor else (None, 0)
+    if resume_type is None:
+        account = (
+            User.objects.using(using).filter(id=user_id)
+            .values('id', 'username', 'email', 'date_joined', 'profile__bio', 'profile__location').first()
+        )
+        if account is None:
+            return
+        account['bio'], account['location'] = account.pop('profile__bio'), account.pop('profile__location')
+        yield _line(ACCOUNT, account)
+
+    started = resume_type in (None, ACCOUNT)
+    for kind, model, owner, columns in SECTIONS:
+        if not started and kind != resume_type:
+            continue
+        after = last_id if not started else 0
+        started = True
+        rows = model.objects.using(using).filter(**{owner: user_id}).order_by('id').values(*columns)
+        while True:
+            batch = list(rows.filter(id__gt=after)[:settings.EXPORT_CHUNK_SIZE])
+            if batch:
+                yield b''.join(_line(kind, row) for row in batch)
+            if len(batch) < settings.EXPORT_CHUNK_SIZE:
+                break
+            after = batch[-1]['id']
+
+#chunks as an async iterator, each read in the thread the sync views run in. under ASGI, django reads a sync
+#iterator to the end into a list before sending any of it, which would hold the whole export in memory
+async def aiterate(content):
+    content = iter(content)
+    while (chunk := await sync_to_async(next)(content, None)) is not None:
+        yield chunk
+
+#gzip the chunks on the fly, one gzip stream flushed after each chunk so the client gets every batch as it is read
+def gzipped(content):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) #wbits 31: gzip header and trailer
+    for chunk in content:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
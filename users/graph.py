@@ -0,0 +1,388 @@
+import heapq
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate, islice
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from .models import User, Follow, FollowEvent
+
+#in-process index of the follow graph (FOLLOW_GRAPH_INDEX). each direction is stored in CSR layout: one
+#sorted array holding every edge's target, grouped by source, and an offsets array indexed by user id, so a
+#user's followers or followings are the slice targets[offsets[id]:offsets[id + 1]]. arrays are typed
+#('i' or 'q'), 4 to 8 bytes per edge and direction instead of a Python int and list slot per edge.
+#"does A follow B" is a binary search in A's slice, mutual friends an intersection of two slices.
+#
+#changes since the build sit in small per-user overlays (added ids sorted, removed ids in a set) and are
+#merged into fresh arrays once FOLLOW_GRAPH_MAX_OVERLAY of them pile up. they arrive through FollowEvent,
+#an append-only log written in the same transaction as the Follow rows (see signals.py), which every worker
+#reads from the last event it applied: at most once per FOLLOW_GRAPH_SYNC_SECONDS, and before every lookup
+#with the default of 0. the read also checks that the last applied event is still there, unchanged, so a
+#rolled back or pruned log (or a RESET event from `rebuild_follow_graph`) makes the worker rebuild.
+#event ids are allocated before their transactions commit, so an id skipped by a read may still show up;
+#such gaps are polled again for GAP_SECONDS. the log and the Follow table are always read from the primary
+#(DB_ALIAS), also in requests served by a read replica: the cursor comes from the primary, and a replica
+#that hasn't caught up with it would make every log read look diverged and force a full rebuild
+
+GAP_SECONDS = 60
+DB_ALIAS = 'default'
+
+def _typecode(largest):#smallest array type holding ids or offsets up to `largest`
+    return 'i' if largest < 2 ** 31 else 'q'
+
+
+#one direction of the graph: source id -> sorted target ids
+class Adjacency:
+    def __init__(self, offsets, targets):
+        self.offsets, self.targets = offsets, targets
+        self.added = {} #source -> sorted targets not in the arrays
+        self.removed = {} #source -> targets in the arrays that are gone
+        self.changes = 0 #overlay updates since the arrays were built
+
+    #adjacency from (source, target) pairs sorted by source, then target
+    @classmethod
+    def from_sorted(cls, pairs, largest_id, edges):
+        offsets, targets = array(_typecode(edges), [0]), array(_typecode(largest_id))
+        for source, target in pairs:
+            if source >= len(offsets):
+                offsets.extend([len(targets)] * (source + 1 - len(offsets)))
+            targets.append(target)
+        offsets.append(len(targets))
+        return cls(offsets, targets)
+
+    #the same edges the other way round, sources of each target in ascending order (a counting sort)
+    def transposed(self):
+        offsets, targets = self.offsets, self.targets
+        counts = array(offsets.typecode, bytes(offsets.itemsize * (max(targets, default=0) + 2)))
+        for target in targets:
+            counts[target + 1] += 1
+        reverse_offsets = array(offsets.typecode, accumulate(counts))
+        position = array(offsets.typecode, reverse_offsets)
+        sources = array(_typecode(len(offsets)))
+        sources.frombytes(bytes(sources.itemsize * len(targets)))
+        for source in range(len(offsets) - 1):
+            for i in range(offsets[source], offsets[source + 1]):
+                target = targets[i]
+                sources[position[target]] = source
+                position[target] += 1
+        return Adjacency(reverse_offsets, sources)
+
+    def _bounds(self, source):
+        if 0 <= source < len(self.offsets) - 1:
+            return self.offsets[source], self.offsets[source + 1]
+        return 0, 0
+
+    def _stored(self, source, target):
+        lo, hi = self._bounds(source)
+        i = bisect_left(self.targets, target, lo, hi)
+        return i < hi and self.targets[i] == target
+
+    def has(self, source, target):
+        if target in self.removed.get(source, ()):
+            return False
+        if self._stored(source, target):
+            return True
+        added = self.added.get(source, ())
+        i = bisect_left(added, target)
+        return i < len(added) and added[i] == target
+
+    def degree(self, source):
+        lo, hi = self._bounds(source)
+        return hi - lo - len(self.removed.get(source, ())) + len(self.added.get(source, ()))
+
+    #targets of `source` in ascending order, from position `start` to `stop`
+    def neighbors(self, source, start=0, stop=None):
+        lo, hi = self._bounds(source)
+        added, removed = self.added.get(source), self.removed.get(source)
+        if added is None and removed is None:
+            stop = hi if stop is None else min(lo + stop, hi)
+            return self.targets[lo + start:stop].tolist()
+        stored = self.targets[lo:hi]
+        if removed:
+            stored = (target for target in stored if target not in removed)
+        return list(islice(heapq.merge(stored, added or ()), start, stop))
+
+    def add(self, source, target):
+        removed = self.removed.get(source)
+        if removed and target in removed:
+            removed.discard(target)
+            if not removed:
+                del self.removed[source]
+        elif not self._stored(source, target):
+            added = self.added.setdefault(source, [])
+            i = bisect_left(added, target)
+            if i < len(added) and added[i] == target:
+                return
+            added.insert(i, target)
+        else:
+            return
+        self.changes += 1
+
+    def remove(self, source, target):
+        added = self.added.get(source)
+        if added and target in added:
+            added.remove(target)
+            if not added:
+                del self.added[source]
+        elif self._stored(source, target) and target not in self.removed.get(source, ()):
+            self.removed.setdefault(source, set()).add(target)
+        else:
+            return
+        self.changes += 1
+
+    #the arrays with the overlays merged in
+    def compacted(self):
+        sources = len(self.offsets) - 1
+        if self.added:
+            sources = max(sources, max(self.added) + 1)
+        largest_added = max((added[-1] for added in self.added.values()), default=0)
+        typecode = 'q' if 'q' in (self.targets.typecode, _typecode(largest_added)) else 'i'
+        offsets, targets = array(_typecode(self.edges), [0]), array(typecode)
+        for source in range(sources):
+            if source in self.added or source in self.removed:
+                targets.extend(self.neighbors(source))
+            else:
+                lo, hi = self._bounds(source)
+                targets.extend(self.targets[lo:hi])
+            offsets.append(len(targets))
+        return Adjacency(offsets, targets)
+
+    @property
+    def edges(self):
+        return len(self.targets) + sum(map(len, self.added.values())) - sum(map(len, self.removed.values()))
+
+    @property
+    def nbytes(self):
+        return len(self.offsets) * self.offsets.itemsize + len(self.targets) * self.targets.itemsize
+
+
+#followers or followings of one user in ascending id order; a sequence the paginator can count and slice
+class Neighbors:
+    def __init__(self, graph, direction, user_id):
+        self.graph, self.direction, self.user_id = graph, direction, user_id
+
+    def __len__(self):
+        with self.graph._lock:
+            return getattr(self.graph, self.direction).degree(self.user_id)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) and index.step is None and (index.start or 0) >= 0 and (index.stop or 0) >= 0:
+            with self.graph._lock:
+                return getattr(self.graph, self.direction).neighbors(self.user_id, index.start or 0, index.stop)
+        return self[:][index] #single items and negative bounds, rare enough to copy the list for
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __contains__(self, other):
+        with self.graph._lock:
+            return getattr(self.graph, self.direction).has(self.user_id, other)
+
+
+#users in the order of an id sequence, fetched a page at a time; what the follow list views paginate
+class Users:
+    ordered = True #keeps the paginator from warning as for an unordered queryset
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        ids = self.ids[index] if isinstance(index, slice) else [self.ids[index]]
+        users = User.objects.in_bulk(ids)
+        page = [users[user_id] for user_id in ids if user_id in users] #skips users deleted since the index saw them
+        return page if isinstance(index, slice) else page[0]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+class FollowGraph:
+    def __init__(self):
+        self._lock = threading.Lock() #guards the adjacencies during lookups and updates
+        self._sync_lock = threading.Lock() #one log read or rebuild at a time
+        self.following = self.followers = None
+        self._cursor, self._cursor_event = 0, None #id and (kind, follower, following) of the last applied event
+        self._gaps = {} #event id -> monotonic deadline, for ids skipped by a log read
+        self._synced = float('-inf') #monotonic time the last log read started
+
+    #------------------------------------lookups------------------------------------
+    def followers_of(self, user_id):
+        self.sync_if_stale()
+        return Neighbors(self, 'followers', user_id)
+
+    def following_of(self, user_id):
+        self.sync_if_stale()
+        return Neighbors(self, 'following', user_id)
+
+    def follows(self, follower_id, following_id):
+        self.sync_if_stale()
+        with self._lock:
+            return self.following.has(follower_id, following_id)
+
+    #mutual friends of the viewer and each user: accounts the viewer follows that also follow that user,
+    #as {user_id: count} without the zeros
+    def mutual_counts(self, viewer_id, user_ids):
+        self.sync_if_stale()
+        counts = {}
+        with self._lock:
+            followed = self.following.neighbors(viewer_id)
+            if not followed:
+                return counts
+            followed_set = set(followed)
+            for user_id in user_ids:
+                if len(followed) <= self.followers.degree(user_id): #binary searches in the longer list
+                    n = sum(1 for other in followed if self.followers.has(user_id, other))
+                else:
+                    n = sum(1 for other in self.followers.neighbors(user_id) if other in followed_set)
+                if n:
+                    counts[user_id] = n
+        return counts
+
+    #accounts two hops away along followings with the number of paths to each, as ({user_id: paths}, complete).
+    #walks at most `max_sources` of the user's followings (a sample seeded by the user id), skips the ones
+    #following more than `max_degree` accounts, and stops once time.perf_counter() passes `deadline`, with
+    #complete False. the user and the accounts they already follow are left out
+    def two_hop_counts(self, user_id, max_sources, max_degree, deadline):
+        self.sync_if_stale()
+        with self._lock:
+            sources = self.following.neighbors(user_id)
+        excluded = {user_id, *sources}
+        if len(sources) > max_sources:
+            sources = random.Random(user_id).sample(sources, max_sources)
+        counts = Counter()
+        complete = True
+        for source in sources:
+            if time.perf_counter() > deadline:
+                complete = False
+                break
+            with self._lock: #held per source, lookups from other threads go in between
+                if self.following.degree(source) > max_degree:
+                    continue
+                targets = self.following.neighbors(source)
+            counts.update(targets)
+        for user in excluded:
+            counts.pop(user, None)
+        return counts, complete
+
+    def stats(self):
+        self.sync_if_stale()
+        with self._lock:
+            return {
+                'offsets': len(self.following.offsets) + len(self.followers.offsets), #one per user id and direction
+                'edges': self.following.edges,
+                'bytes': self.following.nbytes + self.followers.nbytes,
+                'overlay': self.following.changes,
+                'cursor': self._cursor,
+            }
+
+    #------------------------------------freshness------------------------------------
+    def sync_if_stale(self):
+        requested = time.monotonic()
+        if self.following is not None and requested - self._synced < settings.FOLLOW_GRAPH_SYNC_SECONDS:
+            return
+        with self._sync_lock:
+            if self.following is not None and self._synced >= requested:
+                return #a log read that started after this call covered it
+            started = time.monotonic()
+            if self.following is None or not self._read_log():
+                self._build()
+            self._synced = started
+
+    #next lookup reads the log; called as this process writes an event and again once it commits
+    def expire(self):
+        self._synced = float('-inf')
+
+    #apply the events after the cursor; False when the log no longer matches what was applied
+    def _read_log(self):
+        now = time.monotonic()
+        self._gaps = {event_id: deadline for event_id, deadline in self._gaps.items() if deadline > now}
+        limit = settings.FOLLOW_GRAPH_MAX_OVERLAY #more events than that are cheaper to rebuild from
+        query = Q(id__gte=self._cursor)
+        if self._gaps:
+            query |= Q(id__in=list(self._gaps))
+        events = list(
+            FollowEvent.objects.using(DB_ALIAS).filter(query).order_by('id')
+            .values_list('id', 'kind', 'follower_id', 'following_id')[:limit + 1]
+        )
+        if len(events) > limit:
+            return False
+        if self._cursor:
+            head = next((event for event in events if event[0] == self._cursor), None)
+            if head is None or head[1:] != self._cursor_event:
+                return False
+        with self._lock:
+            expected = self._cursor + 1
+            for event_id, kind, follower_id, following_id in events:
+                if event_id > self._cursor:
+                    self._gaps.update((missing, now + GAP_SECONDS) for missing in range(expected, event_id))
+                    expected = event_id + 1
+                    self._cursor, self._cursor_event = event_id, (kind, follower_id, following_id)
+                elif self._gaps.pop(event_id, None) is None:
+                    continue #the cursor itself
+                if kind == FollowEvent.RESET:
+                    return False
+                self._apply(kind, follower_id, following_id)
+        if self.following.changes > limit:
+            self._compact()
+        return True
+
+    def _apply(self, kind, follower_id, following_id):
+        if kind == FollowEvent.ADDED:
+            self.following.add(follower_id, following_id)
+            self.followers.add(following_id, follower_id)
+        elif kind == FollowEvent.REMOVED:
+            self.following.remove(follower_id, following_id)
+            self.followers.remove(following_id, follower_id)
+        elif kind == FollowEvent.USER_REMOVED:
+            for other in self.following.neighbors(follower_id):
+                self.following.remove(follower_id, other)
+                self.followers.remove(other, follower_id)
+            for other in self.followers.neighbors(follower_id):
+                self.followers.remove(follower_id, other)
+                self.following.remove(other, follower_id)
+
+    def _compact(self):#lookups keep using the old arrays while the new ones are built
+        following, followers = self.following.compacted(), self.followers.compacted()
+        with self._lock:
+            self.following, self.followers = following, followers
+
+    #build both directions from the Follow table, positioned after the newest event
+    def _build(self):
+        head = FollowEvent.objects.using(DB_ALIAS).order_by('-id').values_list('id', 'kind', 'follower_id', 'following_id').first()
+        shape = Follow.objects.using(DB_ALIAS).aggregate(edges=Count('id'), followers=Max('follower_id'), followings=Max('following_id'))
+        pairs = Follow.objects.using(DB_ALIAS).order_by('follower_id', 'following_id').values_list('follower_id', 'following_id')
+        following = Adjacency.from_sorted(
+            pairs.iterator(chunk_size=10000), max(shape['followers'] or 0, shape['followings'] or 0), shape['edges']
+        )
+        followers = following.transposed()
+        with self._lock:
+            self.following, self.followers = following, followers
+            self._cursor, self._cursor_event = (head[0], head[1:]) if head else (0, None)
+            self._gaps = {}
+
+    #drop the index, e.g. to measure a cold build; the next lookup rebuilds it
+    def clear(self):
+        with self._sync_lock, self._lock:
+            self.following = self.followers = None
+            self._cursor, self._cursor_event, self._gaps = 0, None, {}
+            self._synced = float('-inf')
+
+    #------------------------------------writes------------------------------------
+    #log a change to the graph in the current transaction
+    def record(self, kind, follower_id=None, following_id=None):
+        if not settings.FOLLOW_GRAPH_INDEX:
+            return None
+        event = FollowEvent.objects.create(kind=kind, follower_id=follower_id, following_id=following_id)
+        self.expire()
+        transaction.on_commit(self.expire) #another thread may have read the log before this commit
+        return event
+
+
+follow_graph = FollowGraph()
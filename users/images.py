@@ -0,0 +1,25 @@
+import io
+from PIL import Image, ImageOps
+
+#resized, re-encoded variants of an uploaded profile picture. this module runs in the picture pipeline's worker
+#processes (see users/pictures.py), which are spawned rather than forked, so it imports nothing from Django
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+#{variant name: encoded bytes} of square crops of the picture at `path`, sizes being {variant name: pixels}
+def render(path, sizes, image_format, quality):
+    largest = max(sizes.values())
+    with Image.open(path) as image:
+        image.draft('RGB', (largest, largest)) #JPEG only: decode at 1/2 to 1/8 scale when that still covers the largest variant
+        image = ImageOps.exif_transpose(image)
+        alpha = image_format != 'JPEG' and (image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info)
+        image = image.convert('RGBA' if alpha else 'RGB')
+        variants = {}
+        #largest first: each smaller variant is resized from the previous one instead of the original
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            size = min(size, *image.size) #never upscale
+            image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            encoded = io.BytesIO()
+            image.save(encoded, image_format, quality=quality)
+            variants[name] = encoded.getvalue()
+    return variants
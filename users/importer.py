@@ -0,0 +1,339 @@
+import csv
+import gzip
+import json
+import os
+import time
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from posts.models import Post, Comment, Like
+from posts import ranking, response_cache, search, timeline
+from .graph import follow_graph
+from .models import User, Profile, Follow, FollowEvent
+
+#bulk loading of users, follows, posts, comments and likes (see the `import_data` command). records are read
+#one at a time and queued per type as rows of column values; a full queue is written with one executemany()
+#of a plain INSERT, after the queues of the types it references. that skips bulk_create's per-value field
+#preparation, which costs more than the insert itself at this volume. ids are assigned here, above the largest
+#id in the table, so every reference (usernames, the source ids of posts and comments) resolves through an
+#in-memory map without reading rows back; it also means nothing else may insert users, posts or comments while
+#an import runs. no signals fire, so counters, the search index, timelines and the follow graph index are
+#derived afterwards in batches (see Importer.derive)
+
+TYPES = ('user', 'follow', 'post', 'comment', 'like')
+#the types each type's rows point at; their queued rows are written first
+REFERENCES = {'user': (), 'follow': ('user',), 'post': ('user',), 'comment': ('user', 'post'), 'like': ('user', 'post')}
+#(model, columns) written per type; follows and likes that already exist are skipped by the insert
+COLUMNS = {
+    'user': (User, (
+        'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'is_staff', 'is_active', 'date_joined',
+        'email', 'follower_count', 'following_count',
+    )),
+    'profile': (Profile, ('user_id', 'bio', 'profile_picture', 'picture_variants', 'location')),
+    'follow': (Follow, ('follower_id', 'following_id', 'created_at')),
+    'post': (Post, ('id', 'author_id', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count', 'popularity')),
+    'comment': (Comment, (
+        'id', 'post_id', 'author_id', 'parent_id', 'path', 'depth', 'reply_count', 'content', 'created_at', 'updated_at',
+    )),
+    'like': (Like, ('user_id', 'post_id', 'created_at')),
+}
+IGNORE_CONFLICTS = ('follow', 'like')
+TABLES = [model._meta.db_table for model, _ in COLUMNS.values()]
+
+
+#records of a JSONL or CSV file (optionally gzipped) as dicts. JSONL lines carry their `type`; CSV rows get
+#`kind`, by default the file name without the plural s (users.csv, follows.csv.gz, ...).
+#ValueError names the line of malformed input
+def records(path, kind=None):
+    name = os.path.basename(path).removesuffix('.gz')
+    stem, extension = os.path.splitext(name)
+    opened = gzip.open(path, 'rt', encoding='utf-8', newline='') if path.endswith('.gz') else open(path, encoding='utf-8', newline='')
+    with opened as lines:
+        if extension == '.csv':
+            kind = kind or stem.removesuffix('s')
+            if kind not in TYPES:
+                raise ValueError(f'{path}: pass the record type of CSV files not named after one ({", ".join(TYPES)})')
+            for row in csv.DictReader(lines):
+                row['type'] = kind
+                yield row
+            return
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise ValueError(f'{path}:{number}: {error}')
+            if kind:
+                record.setdefault('type', kind)
+            yield record
+
+
+#INSERT statement for a type's columns, in the database's placeholder style
+def insert_sql(kind):
+    model, columns = COLUMNS[kind]
+    on_conflict = OnConflict.IGNORE if kind in IGNORE_CONFLICTS else None
+    suffix = connection.ops.on_conflict_suffix_sql([], on_conflict, [], [])
+    return '%s %s (%s) VALUES (%s)%s' % (
+        connection.ops.insert_statement(on_conflict=on_conflict), connection.ops.quote_name(model._meta.db_table),
+        ', '.join(connection.ops.quote_name(column) for column in columns), ', '.join(['%s'] * len(columns)),
+        f' {suffix}' if suffix else '',
+    )
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    stamp = parse_datetime(value)
+    if stamp is None:
+        raise ValueError(value)
+    if settings.USE_TZ and timezone.is_naive(stamp):
+        stamp = timezone.make_aware(stamp)
+    return stamp
+
+
+class Importer:
+    def __init__(self, batch_size=5000, report=None):
+        self.batch_size = batch_size
+        self.report = report #called with the importer after every batch written
+        self.adapt_time = connection.ops.adapt_datetimefield_value
+        self.now = timezone.now()
+        self.db_now = self.adapt_time(self.now)
+        self.new_score = ranking.popularity(0, 0, self.now)
+        self.password = make_password(None) #unusable password for records without a hash; hashing per user would dominate
+
+        self.usernames = dict(User.objects.values_list('username', 'id'))
+        self.emails = set(User.objects.values_list('email', flat=True))
+        self.posts = {} #source post id -> post id
+        self.comments = {} #source comment id -> (comment id, post id, path, depth)
+        self.first_id = {model: (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1 for model in (User, Post, Comment)}
+        self.next_id = dict(self.first_id)
+
+        self.queues = {kind: [] for kind in COLUMNS}
+        self.statements = {kind: insert_sql(kind) for kind in COLUMNS}
+        self.builders = {kind: getattr(self, f'_{kind}') for kind in TYPES}
+        self.read, self.written, self.skipped = Counter(), Counter(), Counter() #skipped is keyed by (type, reason)
+        self.followers, self.follow_users, self.post_authors = set(), set(), set()
+        self.counted_posts, self.parents = set(), set() #posts and comments whose counters gained rows
+        self.started = time.perf_counter()
+
+    #a record's timestamp as the database stores it, the start of the import when it has none
+    def _db_time(self, stamp):
+        return self.db_now if stamp is None else self.adapt_time(stamp)
+
+    def _id(self, model):
+        self.next_id[model] += 1
+        return self.next_id[model] - 1
+
+    def _user_id(self, username):
+        return self.usernames.get(username or '')
+
+    def _skip(self, kind, reason):
+        self.skipped[kind, reason] += 1
+
+    def rows_per_second(self):
+        return sum(self.written.values()) / max(time.perf_counter() - self.started, 1e-9)
+
+    #queue one record, writing its type's queue once it holds a batch
+    def add(self, record):
+        kind = record.get('type')
+        if kind not in TYPES:
+            self._skip(kind, 'unknown type')
+            return
+        self.read[kind] += 1
+        try:
+            row = self.builders[kind](record)
+        except (KeyError, ValueError):
+            row = None
+            self._skip(kind, 'malformed')
+        if row is not None:
+            self.queues[kind].append(row)
+            if len(self.queues[kind]) >= self.batch_size:
+                self.flush(kind)
+
+    #fields are all read before anything is recorded, so a malformed record leaves no trace in the maps
+    def _user(self, record):
+        username, email = record['username'], record.get('email') or ''
+        date_joined = _timestamp(record.get('date_joined'))
+        if not username or username in self.usernames:
+            self._skip('user', 'username taken')
+            return None
+        if email in self.emails:
+            self._skip('user', 'email taken')
+            return None
+        user_id = self.usernames[username] = self._id(User)
+        self.emails.add(email)
+        self.queues['profile'].append((user_id, record.get('bio') or '', '', '{}', record.get('location') or ''))
+        return (
+            user_id, record.get('password') or self.password, False, username,
+            record.get('first_name') or '', record.get('last_name') or '', False, True,
+            self._db_time(date_joined), email, 0, 0,
+        )
+
+    def _follow(self, record):
+        follower_id, following_id = self._user_id(record['follower']), self._user_id(record['following'])
+        created_at = _timestamp(record.get('created_at'))
+        if follower_id is None or following_id is None:
+            self._skip('follow', 'unknown user')
+            return None
+        if follower_id == following_id:
+            self._skip('follow', 'self follow')
+            return None
+        self.followers.add(follower_id)
+        self.follow_users.update((follower_id, following_id))
+        return (follower_id, following_id, self._db_time(created_at))
+
+    #new posts start with the score of no engagement; likes and comments are added in derive()
+    def _post(self, record):
+        author_id, content = self._user_id(record['author']), record['content']
+        created_at = _timestamp(record.get('created_at'))
+        updated_at = _timestamp(record.get('updated_at')) or created_at
+        if author_id is None:
+            self._skip('post', 'unknown user')
+            return None
+        post_id = self._id(Post)
+        if record.get('id') not in (None, ''):
+            self.posts[str(record['id'])] = post_id
+        self.post_authors.add(author_id)
+        return (
+            post_id, author_id, content, self._db_time(created_at), self._db_time(updated_at), 0, 0,
+            ranking.popularity(0, 0, created_at) if created_at else self.new_score,
+        )
+
+    def _comment(self, record):
+        author_id, post_id, content = self._user_id(record['author']), self.posts.get(str(record['post'])), record['content']
+        created_at = _timestamp(record.get('created_at'))
+        updated_at = _timestamp(record.get('updated_at')) or created_at
+        if author_id is None or post_id is None:
+            self._skip('comment', 'unknown user' if author_id is None else 'unknown post')
+            return None
+        parent_id, path, depth = None, '', 0
+        if record.get('parent') not in (None, ''):
+            parent = self.comments.get(str(record['parent']))
+            if parent is None or parent[1] != post_id or parent[3] >= Comment.MAX_DEPTH:
+                self._skip('comment', 'unknown parent')
+                return None
+            parent_id, _, path, depth = parent
+            depth += 1
+            self.parents.add(parent_id)
+        comment_id = self._id(Comment)
+        path += Comment.path_segment(comment_id)
+        if record.get('id') not in (None, ''):
+            self.comments[str(record['id'])] = (comment_id, post_id, path, depth)
+        self.counted_posts.add(post_id)
+        return (
+            comment_id, post_id, author_id, parent_id, path, depth, 0, content,
+            self._db_time(created_at), self._db_time(updated_at),
+        )
+
+    def _like(self, record):
+        user_id, post_id = self._user_id(record['user']), self.posts.get(str(record['post']))
+        created_at = _timestamp(record.get('created_at'))
+        if user_id is None or post_id is None:
+            self._skip('like', 'unknown user' if user_id is None else 'unknown post')
+            return None
+        self.counted_posts.add(post_id)
+        return (user_id, post_id, self._db_time(created_at))
+
+    #write a type's queue, and before it the queues of the types it references
+    def flush(self, kind):
+        for referenced in REFERENCES[kind]:
+            self.flush(referenced)
+        rows, self.queues[kind] = self.queues[kind], []
+        if not rows:
+            return
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(self.statements[kind], rows)
+            if kind == 'user':
+                cursor.executemany(self.statements['profile'], self.queues['profile'])
+                self.queues['profile'] = []
+        self.written[kind] += len(rows)
+        if self.report:
+            self.report(self)
+
+    #write every queue, then move the ids of tables that use sequences (e.g. PostgreSQL) past the assigned ones
+    def finish(self):
+        for kind in TYPES:
+            self.flush(kind)
+        statements = connection.ops.sequence_reset_sql(no_style(), [User, Profile, Post, Comment])
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+    def _chunks(self, ids):
+        ids = sorted(ids)
+        for start in range(0, len(ids), self.batch_size):
+            yield ids[start:start + self.batch_size]
+
+    #what the signals and write paths would have maintained row by row, as (step, rows) pairs once done.
+    #every step is a few set-based statements per batch of ids
+    def derive(self, timelines=True):
+        yield 'user counters', self._follow_counts()
+        yield 'post counters', self._post_counts()
+        yield 'reply counts', self._reply_counts()
+        yield 'search index', self._search_index()
+        if timelines:
+            yield 'timelines', self._timelines()
+        if self.follow_users:
+            follow_graph.record(FollowEvent.RESET) #every worker rebuilds its index on the next lookup
+
+    def _follow_counts(self):
+        for ids in self._chunks(self.follow_users):
+            User.objects.filter(id__in=ids).update(
+                follower_count=_count(Follow, 'following_id'), following_count=_count(Follow, 'follower_id'),
+            )
+        return len(self.follow_users)
+
+    #the engagement part of the score comes off before the recount and goes back on after it (see posts/ranking.py)
+    def _post_counts(self):
+        for ids in self._chunks(self.counted_posts):
+            posts = Post.objects.filter(id__in=ids)
+            with transaction.atomic():
+                posts.update(popularity=F('popularity') - ranking.engagement_term())
+                posts.update(like_count=_count(Like, 'post_id'), comment_count=_count(Comment, 'post_id'))
+                posts.update(popularity=F('popularity') + ranking.engagement_term())
+            old = [post_id for post_id in ids if post_id < self.first_id[Post]]
+            response_cache.invalidate(*(f'post:{post_id}' for post_id in old), *(f'comments:{post_id}' for post_id in old))
+        if self.counted_posts or self.post_authors:
+            response_cache.invalidate(response_cache.POSTS, response_cache.RANKED)
+        return len(self.counted_posts)
+
+    def _reply_counts(self):
+        for ids in self._chunks(self.parents):
+            Comment.objects.filter(id__in=ids).update(reply_count=_count(Comment, 'parent_id'))
+        return len(self.parents)
+
+    def _search_index(self):
+        new, indexed = range(self.first_id[Post], self.next_id[Post]), 0
+        rows = Post.objects.filter(id__gte=new.start, id__lt=new.stop).order_by('id').values_list('id', 'content')
+        last_id = 0
+        while True:
+            batch = list(rows.filter(id__gt=last_id)[:self.batch_size])
+            if not batch:
+                return indexed
+            search.index_posts(batch, batch_size=self.batch_size)
+            last_id = batch[-1][0]
+            indexed += len(batch)
+
+    #the timelines of users who followed someone or follow an author with new posts
+    def _timelines(self):
+        users = set(self.followers)
+        for ids in self._chunks(self.post_authors):
+            users.update(Follow.objects.filter(following_id__in=ids).values_list('follower_id', flat=True))
+        for user_id in sorted(users):
+            timeline.rebuild(user_id)
+        return len(users)
+
+
+#number of `model` rows whose `field` points at the row being updated
+def _count(model, field):
+    rows = model.objects.filter(**{field: OuterRef('id')}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(n=Count('id')).values('n')), 0)
@@ -0,0 +1,38 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from users import export
+from users.models import User
+
+#the same NDJSON export as GET /api/users/export/, for exports run on the server (large accounts, data requests)
+class Command(BaseCommand):
+    help = "Stream a user's account, posts, comments, likes and follows as NDJSON to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', help='file to write, stdout by default')
+        parser.add_argument('--gzip', action='store_true', help='gzip the output')
+        parser.add_argument('--cursor', help='<type>:<id> of the last line of an interrupted export, to resume after it')
+
+    def handle(self, *args, **options):
+        user_id = User.objects.filter(username=options['username']).values_list('id', flat=True).first()
+        if user_id is None:
+            raise CommandError(f"No user named {options['username']!r}.")
+        cursor = options['cursor']
+        if cursor:
+            try:
+                export.parse_cursor(cursor)
+            except ValueError:
+                raise CommandError('--cursor expects <type>:<id> from the last line written.')
+
+        content = export.chunks(user_id, cursor)
+        if options['gzip']:
+            content = export.gzipped(content)
+        out = open(options['output'], 'ab' if cursor else 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in content:
+                out.write(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
@@ -0,0 +1,59 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from users import importer
+
+#load users, follows, posts, comments and likes exported from elsewhere (a migration, a seed data set) in bulk.
+#run it while the API takes no writes: ids are assigned by the import (see users/importer.py)
+class Command(BaseCommand):
+    help = 'Bulk load users, follows, posts, comments and likes from JSONL or CSV files, in the order given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='.jsonl or .csv files, optionally .gz; rows must come after the rows they reference')
+        parser.add_argument('--type', choices=importer.TYPES, help='record type of every row, for files without one')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows per bulk insert')
+        parser.add_argument(
+            '--defer-constraints', action='store_true',
+            help='skip foreign key checks while loading and check every loaded table once at the end',
+        )
+        parser.add_argument('--skip-timelines', action='store_true', help='leave timelines to a later `rebuild_timelines`')
+        parser.add_argument('--progress-seconds', type=float, default=5, help='seconds between progress lines')
+
+    def handle(self, *args, **options):
+        last_report = [time.perf_counter()]
+
+        def report(load):
+            if time.perf_counter() - last_report[0] >= options['progress_seconds']:
+                last_report[0] = time.perf_counter()
+                self.stdout.write(f'{self._counts(load.written)} ({load.rows_per_second():,.0f} rows/s)')
+
+        load = importer.Importer(batch_size=options['batch_size'], report=report)
+        try:
+            if options['defer_constraints']:
+                with connection.constraint_checks_disabled():
+                    self._load(load, options)
+                connection.check_constraints(table_names=importer.TABLES) #IntegrityError names the first bad row
+            else:
+                self._load(load, options)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'{error} (loaded so far: {self._counts(load.written)})')
+        seconds = time.perf_counter() - load.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {self._counts(load.written)} in {seconds:.1f}s ({load.rows_per_second():,.0f} rows/s).'
+        ))
+        for (kind, reason), count in sorted(load.skipped.items(), key=str):
+            self.stdout.write(self.style.WARNING(f'Skipped {count} {kind} row(s): {reason}.'))
+
+        for step, count in load.derive(timelines=not options['skip_timelines']):
+            self.stdout.write(f'Updated {step}: {count} row(s).')
+        if options['skip_timelines']:
+            self.stdout.write('Timelines were not rebuilt; run `python manage.py rebuild_timelines`.')
+
+    def _load(self, load, options):
+        for path in options['files']:
+            for record in importer.records(path, options['type']):
+                load.add(record)
+        load.finish()
+
+    def _counts(self, counts):
+        return ', '.join(f'{counts[kind]} {kind}(s)' for kind in importer.TYPES if counts[kind]) or 'nothing'
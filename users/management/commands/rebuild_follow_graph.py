@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users.graph import FollowGraph, follow_graph
+from users.models import FollowEvent
+
+#every worker builds its follow graph index on the first lookup and then follows the event log; Follow rows
+#written without events (bulk_create, raw SQL, a restored backup) only show up after this command, which logs a
+#reset that makes each worker rebuild on its next lookup. also prunes the log; run it periodically (e.g. from cron)
+class Command(BaseCommand):
+    help = 'Make every worker rebuild its follow graph index from the Follow table and prune old follow events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-hours', type=int, default=settings.FOLLOW_EVENT_RETENTION_HOURS, help='follow events kept for lagging workers'
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help='events deleted per statement')
+
+    def handle(self, *args, **options):
+        reset = follow_graph.record(FollowEvent.RESET)
+        started = time.perf_counter()
+        stats = FollowGraph().stats() #the build every worker is about to do
+        seconds = time.perf_counter() - started
+
+        cutoff = timezone.now() - timedelta(hours=options['keep_hours'])
+        old = FollowEvent.objects.filter(created_at__lt=cutoff)
+        if reset is not None:
+            old = old.filter(id__lt=reset.id) #never the reset itself
+        pruned = 0
+        while True:
+            batch = list(old.order_by('id').values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            pruned += FollowEvent.objects.filter(id__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built the follow graph: {stats['edges']} edge(s) in {stats['bytes'] / 2 ** 20:.1f} MiB, {seconds:.2f}s. "
+            f"Pruned {pruned} follow event(s)."
+        ))
+        if reset is None:
+            self.stdout.write('FOLLOW_GRAPH_INDEX is off; workers read the Follow table directly.')
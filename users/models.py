@@ -1,19 +1,25 @@
 from django.db import models
 from django.contrib.auth.models import User, AbstractUser
+from social_media_api.models import MaintainedFieldsMixin
 
 # Create your models here.
 # custom user model extending AbstractUser
-class User(AbstractUser):
+class User(MaintainedFieldsMixin, AbstractUser):
+    COUNTER_FIELDS = ('follower_count', 'following_count')
+    
     email = models.EmailField(unique=True)
+    follower_count = models.PositiveIntegerField(default=0, db_index=True) #denormalized, kept in step with Follow rows
+    following_count = models.PositiveIntegerField(default=0) #denormalized, kept in step with Follow rows
     
     def __str__(self):
         return self.username
-
+    
 # profile model to extend user information 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='images/', blank=True)
+    picture_variants = models.JSONField(default=dict, blank=True) #variant name -> stored file, filled in once rendered (see users/pictures.py)
     location = models.CharField(max_length=100, blank=True)
     
     def __str__(self):
@@ -31,3 +37,22 @@ class Follow(models.Model):
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
     
+
+#append-only log of follow graph changes, read by every worker's in-process index (users/graph.py).
+#plain ids rather than foreign keys: events outlive the users they mention
+class FollowEvent(models.Model):
+    ADDED, REMOVED, USER_REMOVED, RESET = 1, 2, 3, 4
+    KINDS = (
+        (ADDED, 'follow added'),
+        (REMOVED, 'follow removed'),
+        (USER_REMOVED, 'user removed'), #all edges of follower_id, for the cascade of a user deletion
+        (RESET, 'reset'), #rebuild from the Follow table, see the rebuild_follow_graph command
+    )
+
+    kind = models.PositiveSmallIntegerField(choices=KINDS)
+    follower_id = models.BigIntegerField(null=True)
+    following_id = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.follower_id} -> {self.following_id}'
@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from .authentication import token_cache
+from .images import EXTENSIONS, render
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+#profile picture variants (PROFILE_PICTURE_VARIANTS), rendered off the request. the upload is streamed to a
+#temporary file and moved into MEDIA_ROOT as it is; after the profile is committed its path is handed to a pool
+#of PROFILE_PICTURE_WORKERS processes that decode it once and encode every variant, and a thread of this
+#process stores the results under names made from their content hash (identical pictures share files, and a
+#name never changes content, so they can be cached forever) and records them on the profile. the profile
+#only takes them if it still has the same picture, so a newer upload is never overwritten by an older one
+class PicturePipeline:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pool = None
+        self._rendered = queue.Queue() #(profile id, user id, picture name, future) of finished renders
+        self._storer = None
+        self._outstanding = 0
+
+    #render the variants of a profile's current picture; call once the profile is committed
+    def submit(self, profile_id, user_id, picture):
+        arguments = (
+            default_storage.path(picture), settings.PROFILE_PICTURE_VARIANTS,
+            settings.PROFILE_PICTURE_FORMAT, settings.PROFILE_PICTURE_QUALITY,
+        )
+        if settings.PROFILE_PICTURE_WORKERS <= 0: #in the calling thread, e.g. in tests
+            self._store(profile_id, user_id, picture, render(*arguments))
+            return
+        with self._lock:
+            self._outstanding += 1
+            self._start()
+        try:
+            future = self._pool.submit(render, *arguments)
+        except Exception:
+            with self._idle:
+                self._outstanding -= 1
+                self._idle.notify_all()
+            raise
+        future.add_done_callback(lambda future: self._rendered.put((profile_id, user_id, picture, future)))
+
+    #block until every submitted picture is stored; False when the timeout ran out first
+    def wait(self, timeout=None):
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def _start(self):
+        if self._pool is None:
+            #spawned: forking a process that runs request threads could copy a lock some thread holds
+            context = multiprocessing.get_context('spawn')
+            self._pool = ProcessPoolExecutor(max_workers=settings.PROFILE_PICTURE_WORKERS, mp_context=context)
+        if self._storer is None or not self._storer.is_alive():
+            self._storer = threading.Thread(target=self._run, name='profile-picture-store', daemon=True)
+            self._storer.start()
+
+    def _run(self):
+        while True:
+            profile_id, user_id, picture, future = self._rendered.get()
+            try:
+                self._store(profile_id, user_id, picture, future.result())
+            except Exception:
+                logger.exception('rendering the variants of profile picture %s failed', picture)
+            finally:
+                if self._rendered.empty():
+                    connection.close() #the storer thread's own connection, reopened for the next picture
+                with self._idle:
+                    self._outstanding -= 1
+                    self._idle.notify_all()
+
+    def _store(self, profile_id, user_id, picture, rendered):
+        variants = {}
+        for name, data in rendered.items():
+            digest = hashlib.sha256(data).hexdigest()
+            variants[name] = f'avatars/{digest[:2]}/{digest}.{EXTENSIONS[settings.PROFILE_PICTURE_FORMAT]}'
+            if not default_storage.exists(variants[name]):
+                default_storage.save(variants[name], ContentFile(data))
+        if Profile.objects.filter(id=profile_id, profile_picture=picture).update(picture_variants=variants):
+            token_cache.delete_user(user_id) #cached tokens carry the profile; update() sends no signal
+
+pipeline = PicturePipeline()
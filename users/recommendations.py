@@ -0,0 +1,101 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from .models import Follow
+from .graph import follow_graph
+
+#"people you may know": accounts followed by the accounts a user follows, ranked by how many of those
+#follow them (the mutual_friends count of UserSerializer). the walk goes through the graph index and is
+#pruned for power-law graphs: at most RECOMMENDATION_MAX_SOURCES first hops, none through hubs that follow
+#more than RECOMMENDATION_MAX_DEGREE accounts, and no longer than RECOMMENDATION_TIME_BUDGET_MS. the
+#best candidates it finds are then ranked by their exact counts.
+#
+#each user's ranking is cached for RECOMMENDATION_CACHE_SECONDS, in each worker's own cache. every read
+#drops the accounts the user follows by now, so a follow shows on every worker whichever one took it. a
+#follow also notes the followed id in the cached entry (no queries on the write path), and the next read
+#on that worker rescores the accounts it follows instead of walking again; a note another worker never
+#sees, or one lost to a concurrent request, only delays those candidates. an unfollow drops the entry
+
+KEY_PREFIX = 'recommendations:'
+
+def _key(user_id):
+    return f'{KEY_PREFIX}{user_id}'
+
+#ids of the accounts the user follows
+def _following(user_id):
+    if settings.FOLLOW_GRAPH_INDEX:
+        return follow_graph.following_of(user_id)
+    return set(Follow.objects.filter(follower_id=user_id).values_list('following_id', flat=True))
+
+#[(user_id, mutual count)] best first, from a full walk
+def _rank(user_id):
+    size = settings.RECOMMENDATION_CACHE_SIZE
+    if not settings.FOLLOW_GRAPH_INDEX: #one grouped query; hubs pruned through the stored following_count
+        followed = Follow.objects.filter(follower_id=user_id).values('following_id')
+        rows = (
+            Follow.objects.filter(follower_id__in=followed, follower__following_count__lte=settings.RECOMMENDATION_MAX_DEGREE)
+            .exclude(following_id__in=followed).exclude(following_id=user_id)
+            .values('following_id').annotate(n=Count('id')).order_by('-n', 'following_id')
+            .values_list('following_id', 'n')[:size]
+        )
+        return list(rows)
+    deadline = time.perf_counter() + settings.RECOMMENDATION_TIME_BUDGET_MS / 1000
+    paths, _ = follow_graph.two_hop_counts(
+        user_id, settings.RECOMMENDATION_MAX_SOURCES, settings.RECOMMENDATION_MAX_DEGREE, deadline
+    )
+    shortlist = sorted(paths, key=lambda candidate: (-paths[candidate], candidate))[:size * 2]
+    return _rescore(user_id, shortlist)
+
+#exact mutual counts of the candidates, best first
+def _rescore(user_id, candidates):
+    counts = follow_graph.mutual_counts(user_id, candidates)
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:settings.RECOMMENDATION_CACHE_SIZE]
+
+#fold the user's follows since the ranking was cached into it
+def _refresh(user_id, ranked, followed):
+    if not settings.FOLLOW_GRAPH_INDEX:
+        return _rank(user_id)
+    candidates = {candidate for candidate, _ in ranked}
+    for author_id in followed:
+        accounts = follow_graph.following_of(author_id)
+        if len(accounts) <= settings.RECOMMENDATION_MAX_DEGREE:
+            candidates.update(accounts)
+    following = _following(user_id)
+    candidates = [candidate for candidate in candidates if candidate != user_id and candidate not in following]
+    return _rescore(user_id, candidates)
+
+#store an entry until the walk it came from expires; updates don't extend its life
+def _store(key, entry):
+    timeout = entry['expires'] - time.time()
+    if timeout > 0:
+        cache.set(key, entry, timeout)
+
+#ids of up to `limit` recommended accounts for the user, best first
+def for_user(user_id, limit):
+    key = _key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        entry = {'ranked': _rank(user_id), 'followed': [], 'expires': time.time() + settings.RECOMMENDATION_CACHE_SECONDS}
+        _store(key, entry)
+    elif entry['followed']:
+        entry.update(ranked=_refresh(user_id, entry['ranked'], entry['followed']), followed=[])
+        _store(key, entry)
+    following = _following(user_id)
+    return [candidate for candidate, _ in entry['ranked'] if candidate not in following][:limit]
+
+#note a new follow in the user's cached ranking, applied on the next read
+def follow_added(follower_id, following_id):
+    key = _key(follower_id)
+    entry = cache.get(key)
+    if entry is not None:
+        entry['followed'].append(following_id)
+        _store(key, entry)
+
+def follow_removed(follower_id, following_id):
+    invalidate(follower_id)
+
+#forget the user's cached ranking
+def invalidate(user_id):
+    cache.delete(_key(user_id))
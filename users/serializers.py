@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 from .models import User, Profile, Follow
 from django.contrib.auth import authenticate
+from . import counters
 
 # converts user registration data to JSON and creates new user instances
 class RegisterSerializer(serializers.ModelSerializer):
@@ -33,33 +36,43 @@ class LoginSerializer(serializers.Serializer):
 
 # converts profile model instances to JSON allowing authenticated users to view and update their profile information
 class ProfileSerializer(serializers.ModelSerializer):
+    picture_variants = serializers.SerializerMethodField() #resized picture urls, empty until they are rendered
+
     class Meta:
         model = Profile
-        fields = ('bio', 'profile_picture', 'location')
+        fields = ('bio', 'profile_picture', 'picture_variants', 'location')
+
+    def get_picture_variants(self, obj):
+        return {name: default_storage.url(stored) for name, stored in obj.picture_variants.items()}
+
+    def validate_profile_picture(self, value):
+        if value and value.size > settings.PROFILE_PICTURE_MAX_BYTES:
+            raise serializers.ValidationError(f'Pictures can be at most {settings.PROFILE_PICTURE_MAX_BYTES // 2 ** 20} MiB.')
+        return value
+
+#serializes a page of users with one batched mutual friends query instead of one per user
+class UserListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        self.child.mutual_counts = counters.mutual_friend_counts(
+            getattr(request, 'user', None), [user.id for user in users]
+        )
+        return super().to_representation(users)
 
 class UserSerializer(serializers.ModelSerializer):
-    # nested profile serializer to include in output
-    follower_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
+    # follower/following counts are stored on the user; mutual friends are relative to the requesting user
     mutual_friends = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'follower_count', 'following_count', 'mutual_friends')
-        
-    def get_follower_count(self, obj): #count of followers
-        return obj.followers.count()
-    
-    def get_following_count(self, obj): #count of users this user is following
-        return obj.following.count()
+        read_only_fields = ('follower_count', 'following_count')
+        list_serializer_class = UserListSerializer
     
-    def get_mutual_friends(self, obj): #get users following this user
-        followers = set(obj.followers.values_list('follower_id', flat=True))
-        #ids this user is following
-        following = set(obj.following.values_list('following_id', flat=True))
-        
-        #intexection
-        mutuals = followers.intersection(following)
-        return len(mutuals)
-        
-        
+    def get_mutual_friends(self, obj): #accounts the requesting user follows that also follow this user
+        mutual_counts = getattr(self, 'mutual_counts', None)
+        if mutual_counts is None: #single user, e.g. the detail view
+            request = self.context.get('request')
+            mutual_counts = counters.mutual_friend_counts(getattr(request, 'user', None), [obj.id])
+        return mutual_counts.get(obj.id, 0)
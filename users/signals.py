@@ -1,6 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import User, Profile
+from .models import User, Profile, Follow, FollowEvent
+from rest_framework.authtoken.models import Token
+from . import counters
+from .authentication import token_cache
+from .graph import follow_graph
+from social_media_api import throttling
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -11,7 +16,50 @@ def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
         
+#signal to start a new account with full write buckets, even where a deleted account with its id left them empty
+@receiver(post_save, sender=User)
+def reset_user_throttles(sender, instance, created, **kwargs):
+    if created:
+        throttling.reset_user(instance.id)
+
 #signal to save profile on user save
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
+
+#signal to release the user's follow edges from other users' counters before the cascade removes them
+@receiver(pre_delete, sender=User)
+def release_follow_counters(sender, instance, **kwargs):
+    counters.release(instance)
+
+#signals to drop cached tokens once the user behind them (e.g. deactivated) or their profile changes
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if not created:
+        token_cache.delete_user(instance.id)
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_tokens(sender, instance, created, **kwargs):
+    if not created:
+        token_cache.delete_user(instance.user_id)
+
+#signal to drop a deleted token (logout, rotation or user deletion) from the cache
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
+
+#signals logging follow graph changes for the in-process index, in the transaction that makes them.
+#a user deletion logs one event for all of the user's edges instead of one per cascaded Follow row
+@receiver(post_save, sender=Follow)
+def record_follow(sender, instance, created, **kwargs):
+    if created:
+        follow_graph.record(FollowEvent.ADDED, instance.follower_id, instance.following_id)
+
+@receiver(post_delete, sender=Follow)
+def record_unfollow(sender, instance, origin=None, **kwargs):
+    if not (isinstance(origin, User) or getattr(origin, 'model', None) is User):
+        follow_graph.record(FollowEvent.REMOVED, instance.follower_id, instance.following_id)
+
+@receiver(post_delete, sender=User)
+def record_user_removed(sender, instance, **kwargs):
+    follow_graph.record(FollowEvent.USER_REMOVED, instance.id)
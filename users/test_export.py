@@ -0,0 +1,95 @@
+import gzip
+import json
+import os
+import tempfile
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from posts.models import Post, Comment, Like
+from users import export
+from users.models import User, Follow
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', email='exporter@example.com', password='pass123')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass123')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        self.posts = [Post.objects.create(author=self.user, content=f'post {n}') for n in range(5)]
+        Post.objects.create(author=self.other, content='not mine')
+        Comment.objects.create(post=self.posts[0], author=self.user, content='my comment')
+        Comment.objects.create(post=self.posts[0], author=self.other, content='their comment')
+        Like.objects.create(user=self.user, post=self.posts[1])
+        Follow.objects.create(follower=self.user, following=self.other)
+        Follow.objects.create(follower=self.other, following=self.user)
+
+    def records(self, content):
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def get(self, **params):
+        response = self.client.get(reverse('user-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_streams_the_users_content(self):
+        """Should stream the account and every section in id order, a batch per query"""
+        response = self.get()
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        with self.assertNumQueries(1 + 3 + 1 + 1 + 1 + 1): #account, 5 posts in batches of 2, one row per other section
+            records = self.records(b''.join(response.streaming_content))
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['user'] + ['post'] * 5 + ['comment', 'like', 'following', 'follower'],
+        )
+        self.assertEqual(records[0]['username'], 'exporter')
+        self.assertEqual([record['content'] for record in records[1:6]], [f'post {n}' for n in range(5)])
+        self.assertEqual(records[6]['content'], 'my comment')
+        self.assertEqual(records[8]['following_id'], self.other.id)
+
+    def test_cursor_resumes_after_the_last_line(self):
+        """Should continue right after the line named by the cursor"""
+        records = self.records(b''.join(self.get(cursor=f'post:{self.posts[2].id}').streaming_content))
+        self.assertEqual([record['type'] for record in records], ['post', 'post', 'comment', 'like', 'following', 'follower'])
+        self.assertEqual(records[0]['id'], self.posts[3].id)
+
+        response = self.client.get(reverse('user-export'), {'cursor': 'secrets:1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_gzip_when_accepted(self):
+        """Should gzip the stream for clients that accept it"""
+        response = self.client.get(reverse('user-export'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        plain = b''.join(export.chunks(self.user.id))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    async def test_streams_batches_under_asgi(self):
+        """Should stream an async iterator under ASGI, which django would otherwise read into memory first"""
+        token = await Token.objects.aget(user=self.user)
+        response = await self.async_client.get(reverse('user-export'), headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 1 + 3 + 4) #the account, then a chunk per batch
+        self.assertEqual(b''.join(chunks), await sync_to_async(lambda: b''.join(export.chunks(self.user.id)))())
+
+    def test_management_command(self):
+        """Should write the same export to a file, resuming by appending"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.ndjson.gz')
+            call_command('export_user_data', 'exporter', output=path, gzip=True)
+            with gzip.open(path) as exported:
+                self.assertEqual(exported.read(), b''.join(export.chunks(self.user.id)))
+            call_command('export_user_data', 'exporter', output=path, gzip=True, cursor=f'like:{10 ** 6}')
+            with gzip.open(path) as exported:
+                self.assertEqual(len(exported.read().splitlines()), 12) #the resumed export added following and follower
+
+    def test_requires_authentication(self):
+        """Should refuse anonymous exports"""
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('user-export')).status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from social_media_api.testing import seed_social_graph
+from users import counters
+from users.graph import follow_graph
+from users.models import User, Follow, FollowEvent
+
+
+#the index against the Follow table it replaces
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.people = seed_social_graph(users=12, posts_per_user=0, follows_per_user=4)
+
+    def assert_matches_table(self):
+        edges = set(Follow.objects.values_list('follower_id', 'following_id'))
+        for person in User.objects.all():
+            self.assertEqual(list(follow_graph.following_of(person.id)), sorted(b for a, b in edges if a == person.id))
+            self.assertEqual(list(follow_graph.followers_of(person.id)), sorted(a for a, b in edges if b == person.id))
+        viewer, user_ids = self.people[0], list(User.objects.values_list('id', flat=True))
+        with override_settings(FOLLOW_GRAPH_INDEX=False):
+            expected = counters.mutual_friend_counts(viewer, user_ids)
+        self.assertEqual(follow_graph.mutual_counts(viewer.id, user_ids), expected)
+
+    def test_answers_like_the_follow_table(self):
+        """Should list followers, followings and mutual friends exactly as the Follow table does"""
+        self.assert_matches_table()
+        a, b, c = self.people[0], self.people[1], self.people[6]
+        self.assertTrue(follow_graph.follows(a.id, b.id))
+        self.assertFalse(follow_graph.follows(b.id, a.id))
+        self.assertFalse(follow_graph.follows(a.id, c.id))
+        self.assertEqual(follow_graph.following_of(a.id)[1:3], list(follow_graph.following_of(a.id))[1:3])
+        self.assertEqual(len(follow_graph.followers_of(10 ** 9)), 0) #unknown users have no edges
+
+    def test_follows_unfollows_and_deletions_are_applied(self):
+        """Should apply follows, unfollows and user deletions from the event log without a rebuild"""
+        follow_graph.sync_if_stale()
+        a, b, c = self.people[0], self.people[6], self.people[7]
+        Follow.objects.create(follower=a, following=b)
+        Follow.objects.create(follower=b, following=a)
+        Follow.objects.get(follower=a, following=self.people[1]).delete()
+        self.assertTrue(follow_graph.follows(a.id, b.id))
+        self.assertFalse(follow_graph.follows(a.id, self.people[1].id))
+        self.assertIn(b.id, follow_graph.followers_of(a.id))
+        c_id = c.id
+        c.delete()
+        self.assertEqual(FollowEvent.objects.filter(kind=FollowEvent.REMOVED).count(), 1) #the cascade logs one USER_REMOVED
+        self.assertNotIn(c_id, follow_graph.following_of(self.people[3].id))
+        self.assertEqual(len(follow_graph.following_of(c_id)), 0)
+        self.assert_matches_table()
+
+    @override_settings(FOLLOW_GRAPH_MAX_OVERLAY=3)
+    def test_overlay_is_compacted(self):
+        """Should merge pending changes into the arrays once the overlay is full and keep answering the same"""
+        follow_graph.sync_if_stale()
+        a = self.people[0]
+        for other in self.people[5:9]:
+            Follow.objects.create(follower=a, following=other)
+            follow_graph.sync_if_stale()
+        self.assertLessEqual(follow_graph.stats()['overlay'], 3)
+        self.assert_matches_table()
+
+    def test_rebuilds_when_the_log_diverges(self):
+        """Should rebuild from the Follow table when the last applied event is gone from the log"""
+        follow_graph.sync_if_stale()
+        FollowEvent.objects.all().delete() #e.g. the transaction that wrote them rolled back
+        Follow.objects.bulk_create([Follow(follower=self.people[0], following=self.people[8])]) #no event
+        FollowEvent.objects.create(kind=FollowEvent.ADDED, follower_id=self.people[2].id, following_id=self.people[3].id)
+        self.assertTrue(follow_graph.follows(self.people[0].id, self.people[8].id))
+        self.assert_matches_table()
+
+    def test_late_events_fill_gaps(self):
+        """Should apply an event whose id was skipped because its transaction committed after a later one"""
+        follow_graph.sync_if_stale()
+        cursor = follow_graph.stats()['cursor']
+        a, b, c = self.people[0], self.people[6], self.people[7]
+        Follow.objects.bulk_create([Follow(follower=a, following=b), Follow(follower=a, following=c)])
+        FollowEvent.objects.create(id=cursor + 2, kind=FollowEvent.ADDED, follower_id=a.id, following_id=c.id)
+        self.assertTrue(follow_graph.follows(a.id, c.id))
+        self.assertFalse(follow_graph.follows(a.id, b.id))
+        FollowEvent.objects.create(id=cursor + 1, kind=FollowEvent.ADDED, follower_id=a.id, following_id=b.id)
+        self.assertTrue(follow_graph.follows(a.id, b.id))
+        self.assert_matches_table()
+
+
+class RebuildFollowGraphCommandTest(TestCase):
+    def test_reset_and_prune(self):
+        """Should make workers pick up rows written without events and prune old events"""
+        a, b = seed_social_graph(users=2, posts_per_user=0, follows_per_user=0)
+        follow_graph.sync_if_stale()
+        Follow.objects.bulk_create([Follow(follower=a, following=b)])
+        self.assertFalse(follow_graph.follows(a.id, b.id))
+        old = FollowEvent.objects.create(kind=FollowEvent.ADDED, follower_id=b.id, following_id=a.id)
+        FollowEvent.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=2))
+
+        out = StringIO()
+        call_command('rebuild_follow_graph', stdout=out)
+        self.assertIn('1 edge(s)', out.getvalue())
+        self.assertTrue(follow_graph.follows(a.id, b.id))
+        self.assertFalse(FollowEvent.objects.filter(id=old.id).exists())
+        self.assertTrue(FollowEvent.objects.filter(kind=FollowEvent.RESET).exists())
+
+
+class FollowListEndpointTest(APITestCase):
+    def setUp(self):
+        self.people = seed_social_graph(users=15, posts_per_user=0, follows_per_user=12)
+        self.token = Token.objects.create(user=self.people[0])
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_lists_page_through_the_index(self):
+        """Should page follower and following lists by user id with counts and mutual friends from the index"""
+        target = self.people[3]
+        for name, expected in (
+            ('followers-list', Follow.objects.filter(following=target).values_list('follower_id', flat=True)),
+            ('following-list', Follow.objects.filter(follower=target).values_list('following_id', flat=True)),
+        ):
+            first = self.client.get(reverse(name, args=[target.id])).data
+            second = self.client.get(reverse(name, args=[target.id]), {'page': 2}).data
+            self.assertEqual(first['count'], 12)
+            self.assertEqual([user['id'] for user in first['results'] + second['results']], sorted(expected))
+            with override_settings(FOLLOW_GRAPH_INDEX=False):
+                self.assertEqual(self.client.get(reverse(name, args=[target.id])).data, first)
@@ -0,0 +1,110 @@
+import io
+import json
+import os
+import tempfile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from posts.models import Post, Comment, Like, PostToken, TimelineEntry
+from posts import ranking
+from users.models import User, Profile, Follow
+
+
+class ImportDataTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as out:
+            out.write(content)
+        return path
+
+    def jsonl(self, name, records):
+        return self.write(name, ''.join(json.dumps(record) + '\n' for record in records))
+
+    def load(self, *paths, **options):
+        out = io.StringIO()
+        call_command('import_data', *paths, batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_loads_records_and_derives_counters(self):
+        """Should load every type, resolve usernames and source ids, and fill counters, paths, index and timelines"""
+        existing = User.objects.create_user(username='existing', email='existing@example.com', password='pass123')
+        path = self.jsonl('data.jsonl', [
+            {'type': 'user', 'username': 'ann', 'email': 'ann@example.com', 'bio': 'hi', 'date_joined': '2024-01-02T03:04:05Z'},
+            {'type': 'user', 'username': 'bob', 'email': 'bob@example.com'},
+            {'type': 'follow', 'follower': 'bob', 'following': 'ann'},
+            {'type': 'follow', 'follower': 'existing', 'following': 'ann'},
+            {'type': 'post', 'id': 'p1', 'author': 'ann', 'content': 'Imported hello', 'created_at': '2024-02-01T00:00:00Z'},
+            {'type': 'comment', 'id': 'c1', 'post': 'p1', 'author': 'bob', 'content': 'first'},
+            {'type': 'comment', 'id': 'c2', 'post': 'p1', 'author': 'ann', 'content': 'reply', 'parent': 'c1'},
+            {'type': 'like', 'user': 'bob', 'post': 'p1'},
+            {'type': 'like', 'user': 'existing', 'post': 'p1'},
+        ])
+        output = self.load(path)
+        self.assertIn('Loaded 2 user(s), 2 follow(s), 1 post(s), 2 comment(s), 2 like(s)', output)
+
+        ann, bob = User.objects.get(username='ann'), User.objects.get(username='bob')
+        self.assertFalse(ann.has_usable_password())
+        self.assertEqual(ann.date_joined.year, 2024)
+        self.assertEqual(Profile.objects.get(user=ann).bio, 'hi')
+        self.assertTrue(Profile.objects.filter(user=bob).exists())
+        self.assertEqual((ann.follower_count, bob.following_count), (2, 1))
+        self.assertEqual(User.objects.get(id=existing.id).following_count, 1)
+
+        post = Post.objects.get()
+        self.assertEqual((post.author_id, post.created_at.month, post.like_count, post.comment_count), (ann.id, 2, 2, 2))
+        self.assertAlmostEqual(post.popularity, ranking.popularity(2, 2, post.created_at))
+        first, reply = Comment.objects.order_by('id')
+        self.assertEqual((first.reply_count, reply.parent_id, reply.depth), (1, first.id, 1))
+        self.assertEqual(reply.path, Comment.path_segment(first.id) + Comment.path_segment(reply.id))
+        self.assertTrue(PostToken.objects.filter(post=post, token='imported').exists())
+        self.assertEqual(set(TimelineEntry.objects.values_list('user_id', flat=True)), {bob.id, existing.id})
+
+        created = Post.objects.create(author=ann, content='after the import')
+        self.assertGreater(created.id, post.id)
+
+    def test_csv_files_named_after_their_type(self):
+        """Should read CSV files, taking the record type from the file name"""
+        users = self.write('users.csv', 'username,email\ncara,cara@example.com\ndan,dan@example.com\n')
+        follows = self.write('follows.csv', 'follower,following\ncara,dan\n')
+        posts = self.write('export.csv', 'id,author,content\n7,dan,from csv\n')
+        self.load(users, follows)
+        self.load(posts, type='post')
+        self.assertEqual(User.objects.get(username='dan').follower_count, 1)
+        self.assertEqual(Post.objects.get().content, 'from csv')
+
+    def test_skips_rows_it_cannot_place(self):
+        """Should skip taken usernames and rows referencing unknown users, posts or parents, and report them"""
+        User.objects.create_user(username='taken', email='taken@example.com', password='pass123')
+        path = self.jsonl('data.jsonl', [
+            {'type': 'user', 'username': 'taken', 'email': 'other@example.com'},
+            {'type': 'user', 'username': 'eve', 'email': 'eve@example.com'},
+            {'type': 'follow', 'follower': 'eve', 'following': 'nobody'},
+            {'type': 'follow', 'follower': 'eve', 'following': 'eve'},
+            {'type': 'like', 'user': 'eve', 'post': 'missing'},
+            {'type': 'post', 'id': 1, 'author': 'eve', 'content': 'ok', 'created_at': 'yesterday'},
+            {'type': 'post', 'id': 2, 'author': 'eve', 'content': 'ok'},
+            {'type': 'comment', 'post': 2, 'author': 'eve', 'content': 'orphan', 'parent': 99},
+            {'type': 'like', 'user': 'eve', 'post': 2},
+            {'type': 'like', 'user': 'eve', 'post': 2},
+        ])
+        output = self.load(path)
+        self.assertIn('Skipped 1 user row(s): username taken.', output)
+        self.assertIn('Skipped 1 follow row(s): self follow.', output)
+        self.assertIn('Skipped 1 post row(s): malformed.', output)
+        self.assertIn('Skipped 1 comment row(s): unknown parent.', output)
+        self.assertEqual((Follow.objects.count(), Comment.objects.count(), Like.objects.count()), (0, 0, 1))
+        self.assertEqual(Post.objects.get().like_count, 1)
+
+    def test_defer_constraints(self):
+        """Should load with constraint checks deferred and check the tables afterwards"""
+        path = self.jsonl('data.jsonl', [
+            {'type': 'user', 'username': 'fay', 'email': 'fay@example.com'},
+            {'type': 'post', 'author': 'fay', 'content': 'deferred'},
+        ])
+        self.load(path, defer_constraints=True, skip_timelines=True)
+        self.assertEqual(Post.objects.get().author.username, 'fay')
@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from users import images
+from users.models import User, Profile
+
+def picture(width=800, height=600, image_format='PNG', mode='RGB', color='teal'):
+    encoded = io.BytesIO()
+    Image.new(mode, (width, height), color).save(encoded, image_format)
+    encoded.seek(0)
+    encoded.name = f'upload.{image_format.lower()}'
+    return encoded
+
+class ProfilePictureTest(APITestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, PROFILE_PICTURE_WORKERS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(username='pictured', email='pictured@example.com', password='pass123')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(reverse('profile'), {'profile_picture': upload}, format='multipart')
+
+    def test_upload_renders_variants_after_the_response(self):
+        """Should answer before rendering, then expose content-hash named variants of the configured sizes"""
+        response = self.upload(picture())
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.data['picture_variants'], {})
+
+        variants = Profile.objects.get(user=self.user).picture_variants
+        self.assertEqual(set(variants), {'thumbnail', 'medium'})
+        for name, size in (('thumbnail', 96), ('medium', 512)):
+            with default_storage.open(variants[name]) as stored:
+                self.assertEqual(Image.open(stored).size, (size, size))
+            self.assertRegex(variants[name], r'^avatars/[0-9a-f]{2}/[0-9a-f]{64}\.webp$')
+
+        urls = self.client.get(reverse('profile')).data['picture_variants'] #the cached token saw the update
+        self.assertEqual(urls['thumbnail'], default_storage.url(variants['thumbnail']))
+
+    def test_same_picture_shares_files(self):
+        """Should store identical variants once"""
+        self.upload(picture())
+        first = Profile.objects.get(user=self.user).picture_variants
+        self.upload(picture())
+        self.assertEqual(Profile.objects.get(user=self.user).picture_variants, first)
+        self.assertEqual(len(os.listdir(os.path.dirname(default_storage.path(first['medium'])))), 1)
+
+    def test_rejects_large_and_invalid_uploads(self):
+        """Should refuse pictures over PROFILE_PICTURE_MAX_BYTES and files that aren't images"""
+        with override_settings(PROFILE_PICTURE_MAX_BYTES=100):
+            response = self.upload(picture())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('profile_picture', response.data)
+
+        text = io.BytesIO(b'not a picture')
+        text.name = 'notes.png'
+        self.assertEqual(self.upload(text).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_render_keeps_small_pictures_and_transparency(self):
+        """Should crop to a square without upscaling, keeping alpha unless encoding JPEG"""
+        with tempfile.NamedTemporaryFile(suffix='.png') as source:
+            source.write(picture(200, 50, mode='RGBA', color=(0, 128, 128, 100)).getvalue())
+            source.flush()
+            rendered = images.render(source.name, {'thumbnail': 96, 'medium': 512}, 'WEBP', 80)
+            self.assertEqual(Image.open(io.BytesIO(rendered['medium'])).size, (50, 50))
+            self.assertEqual(Image.open(io.BytesIO(rendered['thumbnail'])).mode, 'RGBA')
+            jpeg = images.render(source.name, {'thumbnail': 32}, 'JPEG', 80)
+            self.assertEqual(Image.open(io.BytesIO(jpeg['thumbnail'])).mode, 'RGB')
@@ -0,0 +1,69 @@
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from users import urls as user_urls
+from users import recommendations
+from users.graph import follow_graph
+from social_media_api.testing import QueryBudgetMixin, route_names, seed_social_graph
+
+#maximum (queries, rows) per route, measured on the seeded graph with a 10 item page.
+#an N+1 on any list adds at least one query per item and fails these
+BUDGETS = {
+    'register': (11, 5),
+    'login': (3, 3),
+    'profile': (2, 2),
+    'user-export': (1, 1), #authentication only, the export is read while it streams
+    'user-list': (4, 20),
+    'user-detail': (3, 2),
+    'followers-list': (4, 12),
+    'following-list': (4, 12),
+    'user-recommendations': (5, 9), #the graph index rereads its log tail on every read here, once more for the read-time follow filter
+    'follow-user': (12, 6),
+    'unfollow-user': (9, 2),
+}
+
+class UserQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.people = seed_social_graph()
+        cls.user = cls.people[0]
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        follow_graph.sync_if_stale() #budgets are for a warm index, not the rebuild after an earlier test rolled back
+        recommendations.invalidate(self.user.id) #cached by an earlier test for a user with the same id
+
+    def check(self, name, method='get', args=(), data=None, expected_status=status.HTTP_200_OK):
+        max_queries, max_rows = BUDGETS[name]
+        return self.assert_within_budget(method, reverse(name, args=args), max_queries, max_rows, data, expected_status)
+
+    def test_every_route_has_a_budget(self):
+        """Should give every route in users/urls.py a query budget"""
+        self.assertEqual(route_names(user_urls), set(BUDGETS))
+
+    def test_account_routes(self):
+        """Should register, log in and read the profile within budget"""
+        data = {'username': 'budget', 'email': 'budget@example.com', 'password': 'pass123456'}
+        self.check('register', 'post', data=data, expected_status=status.HTTP_201_CREATED)
+        self.check('login', 'post', data={'username': 'budget', 'password': 'pass123456'})
+        self.check('profile')
+
+    def test_user_reads(self):
+        """Should list users and follow lists within budget"""
+        response = self.check('user-list')
+        self.assertEqual(len(response.data['results']), 10)
+        self.check('user-export')
+        self.check('user-detail', args=[self.people[1].id])
+        self.check('followers-list', args=[self.user.id])
+        self.check('following-list', args=[self.user.id])
+        response = self.check('user-recommendations')
+        self.assertEqual(len(response.data), 5) #everyone two hops ahead in the follow ring
+        self.check('user-recommendations') #cached ranking
+
+    def test_follow_routes(self):
+        """Should follow and unfollow within budget"""
+        stranger = self.people[-2]
+        self.check('follow-user', 'post', args=[stranger.id], expected_status=status.HTTP_201_CREATED)
+        self.check('unfollow-user', 'post', args=[stranger.id], expected_status=status.HTTP_204_NO_CONTENT)
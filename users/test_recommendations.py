@@ -0,0 +1,79 @@
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from users import counters
+from users.graph import follow_graph
+from users.models import User, Follow
+
+
+@override_settings(RECOMMENDATION_MAX_DEGREE=4)
+class RecommendationsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        names = ('me', 'a', 'b', 'c', 'hub', 'x', 'y', 'z', 'w', 'v')
+        self.users = {name: User.objects.create_user(username=name, email=f'{name}@example.com', password='pass123') for name in names}
+        for follower, followings in (
+            ('me', 'a b c hub'), ('a', 'x y'), ('b', 'x y z'), ('c', 'x me'), ('hub', 'x y z w v'), ('z', 'v'),
+        ):
+            for following in followings.split():
+                self.follow(follower, following)
+        token = Token.objects.create(user=self.users['me'])
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def follow(self, follower, following):
+        Follow.objects.create(follower=self.users[follower], following=self.users[following])
+        counters.follow_added(self.users[follower].id, self.users[following].id)
+
+    def recommended(self, **params):
+        response = self.client.get(reverse('user-recommendations'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(user['username'], user['mutual_friends']) for user in response.data]
+
+    def test_ranks_friends_of_friends_by_mutual_friends(self):
+        """Should rank accounts the user doesn't follow by mutual friends, skipping hubs, like the SQL fallback"""
+        expected = [('x', 4), ('y', 3), ('z', 2)] #counts include the hub, w and v are only reached through it
+        self.assertEqual(self.recommended(), expected)
+        self.assertEqual(self.recommended(limit=2), expected[:2])
+        cache.clear()
+        with override_settings(FOLLOW_GRAPH_INDEX=False):
+            self.assertEqual(self.recommended(), expected)
+
+    def test_follow_refreshes_the_cached_ranking(self):
+        """Should drop a newly followed account and add the accounts it follows without walking again"""
+        self.recommended()
+        response = self.client.post(reverse('follow-user', args=[self.users['z'].id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with mock.patch.object(follow_graph, 'two_hop_counts', wraps=follow_graph.two_hop_counts) as walk:
+            self.assertEqual(self.recommended(), [('x', 4), ('y', 3), ('v', 2)])
+        walk.assert_not_called()
+
+        self.client.post(reverse('unfollow-user', args=[self.users['z'].id]))
+        self.assertEqual(self.recommended(), [('x', 4), ('y', 3), ('z', 2)])
+
+    def test_follows_taken_elsewhere_drop_out_of_the_cached_ranking(self):
+        """Should leave out accounts followed through another worker, whose cache entry isn't updated"""
+        self.recommended()
+        self.follow('me', 'x') #counted, but the cached ranking is not told
+        self.assertEqual(self.recommended(), [('y', 3), ('z', 2)])
+        with override_settings(FOLLOW_GRAPH_INDEX=False):
+            self.assertEqual(self.recommended(), [('y', 3), ('z', 2)])
+
+    def test_walk_stops_at_the_deadline(self):
+        """Should return what the walk found so far once its time budget is spent"""
+        me = self.users['me'].id
+        paths, complete = follow_graph.two_hop_counts(me, 10, 4, deadline=time.perf_counter() - 1)
+        self.assertEqual((dict(paths), complete), ({}, False))
+        paths, complete = follow_graph.two_hop_counts(me, 10, 4, deadline=time.perf_counter() + 60)
+        self.assertTrue(complete)
+        self.assertEqual(paths[self.users['x'].id], 3)
+        self.assertNotIn(self.users['a'].id, paths) #already followed
+
+    def test_requires_authentication(self):
+        """Should refuse anonymous requests"""
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('user-recommendations')).status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,60 @@
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from users.models import Follow
+
+User = get_user_model()
+
+class SocialCountsTest(APITestCase):
+    def setUp(self):
+        # Viewer follows two friends; both friends follow the target
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='pass123')
+        self.target = User.objects.create_user(username='target', email='target@example.com', password='pass123')
+        self.friends = [
+            User.objects.create_user(username=f'friend{i}', email=f'friend{i}@example.com', password='pass123')
+            for i in range(2)
+        ]
+        self.token = Token.objects.create(user=self.viewer)
+        for friend in self.friends:
+            self.follow(self.viewer, friend)
+            self.follow(friend, self.target)
+
+    def follow(self, follower, following):#go through the API so counters are maintained
+        token, _ = Token.objects.get_or_create(user=follower)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.client.post(reverse('follow-user', args=[following.id]))
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_counts_follow_and_unfollow(self):
+        """Should keep follower and following counts on the user"""
+        self.target.refresh_from_db()
+        self.viewer.refresh_from_db()
+        self.assertEqual((self.target.follower_count, self.viewer.following_count), (2, 2))
+        self.client.post(reverse('unfollow-user', args=[self.friends[0].id]))
+        self.viewer.refresh_from_db()
+        self.assertEqual(self.viewer.following_count, 1)
+
+    def test_user_deletion_releases_counts(self):
+        """Should decrement the other side's counters when a user is deleted"""
+        self.friends[0].delete()
+        self.target.refresh_from_db()
+        self.viewer.refresh_from_db()
+        self.assertEqual((self.target.follower_count, self.viewer.following_count), (1, 1))
+
+    def test_mutual_friends_relative_to_viewer(self):
+        """Should count accounts the viewer follows that also follow the user"""
+        response = self.client.get(reverse('user-detail', args=[self.target.id]))
+        self.assertEqual(response.data['mutual_friends'], 2)
+        self.assertEqual(response.data['follower_count'], 2)
+
+    def test_user_list_query_count_is_constant(self):
+        """Should serialize a page of users without per-user queries"""
+        for i in range(10):
+            User.objects.create_user(username=f'zz{i}', email=f'zz{i}@example.com', password='pass123')
+        # page, count and one batched mutual friends query; auth is served from the token cache
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('user-list'))
+        mutuals = {user['username']: user['mutual_friends'] for user in response.data['results']}
+        self.assertEqual(mutuals['target'], 2)
+        self.assertEqual(Follow.objects.count(), 4)
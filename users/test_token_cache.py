@@ -0,0 +1,54 @@
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from rest_framework import status
+from users.authentication import LRUCache, token_cache
+
+User = get_user_model()
+
+class TokenCacheTest(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(username='cached', email='cached@example.com', password='pass123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.client.get(reverse('profile')) #warm the cache
+
+    def test_profile_served_without_queries(self):
+        """Should authenticate and read the profile from the cache"""
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_update_invalidates(self):
+        """Should serve the saved profile after an update"""
+        self.client.put(reverse('profile'), {'bio': 'fresh bio'})
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.data['bio'], 'fresh bio')
+
+    def test_deactivated_user_rejected(self):
+        """Should reject the cached token once the user is deactivated"""
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        """Should reject the cached token once it is deleted"""
+        self.token.delete()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_lru_evicts_and_expires(self):
+        """Should evict the least recently used entry and drop expired ones"""
+        removed = []
+        cache = LRUCache(max_size=2, ttl=60, on_remove=lambda key, value: removed.append(key))
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), removed), (1, None, ['b']))
+        cache.ttl = -1
+        cache.set('d', 4)
+        self.assertIsNone(cache.get('d'))
@@ -35,6 +35,14 @@ class UserAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('token', response.data)
 
+    def test_register_and_login_without_credentials(self):
+        """Should let anonymous clients register and log in"""
+        self.client.credentials()
+        data = {'username': 'anon', 'email': 'anon@example.com', 'password': 'anonpass123'}
+        self.assertEqual(self.client.post(reverse('register'), data).status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('login'), {'username': 'anon', 'password': 'anonpass123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_profile_view(self):
         """Should return authenticated user's profile"""
         url = reverse('profile')
@@ -1,11 +1,13 @@
 from django.urls import path
-from .views import RegisterView, LoginView, ProfileView, FollowUserView, UnfollowUserView, UserListView, UserDetailView, FollowersListView, FollowingListView
+from .views import RegisterView, LoginView, ProfileView, FollowUserView, UnfollowUserView, UserListView, UserDetailView, FollowersListView, FollowingListView, RecommendationsView, ExportView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('profile/', ProfileView.as_view(), name='profile'),
+    path('export/', ExportView.as_view(), name='user-export'),
     path('users/', UserListView.as_view(), name='user-list'),
+    path('users/recommendations/', RecommendationsView.as_view(), name='user-recommendations'),
     path('users/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
     path('users/<int:user_id>/followers/', FollowersListView.as_view(), name='followers-list'),
     path('users/<int:user_id>/following/', FollowingListView.as_view(), name='following-list'),
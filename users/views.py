@@ -1,3 +1,4 @@
+from functools import partial
 from django.shortcuts import render
 from rest_framework import status, permissions
 from rest_framework.response import Response
@@ -5,14 +6,24 @@ from rest_framework.views import APIView
 from .serializers import RegisterSerializer, LoginSerializer, ProfileSerializer, UserSerializer
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated
-from .models import Profile, Follow
+from .models import Follow
 from django.contrib.auth import get_user_model
 from rest_framework import generics
+from django.conf import settings
+from django.db import router, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from posts import live, timeline
+from . import counters, export, pictures, recommendations
+from .graph import follow_graph, Users
+from social_media_api.throttling import WRITE_THROTTLES
 
 User = get_user_model()
 # Create your views here.
 # User Registration View
 class RegisterView(APIView):
+    permission_classes = [permissions.AllowAny] #new users have no token yet
+
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
@@ -23,6 +34,8 @@ class RegisterView(APIView):
     
 # User Login View
 class LoginView(APIView):
+    permission_classes = [permissions.AllowAny]
+
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
@@ -35,16 +48,21 @@ class LoginView(APIView):
 class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request): # get the profile of the authenticated user
-        profile = Profile.objects.get(user=request.user)
+    def get(self, request): # get the profile of the authenticated user, loaded with the cached token
+        profile = request.user.profile
         serializer = ProfileSerializer(profile)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     def put(self, request): # update the profile of the authenticated user
-        profile = Profile.objects.get(user=request.user)
+        profile = request.user.profile
         serializer = ProfileSerializer(profile, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            if 'profile_picture' not in serializer.validated_data:
+                serializer.save()
+            else: #variants of a new picture are rendered after the response, see users/pictures.py
+                profile = serializer.save(picture_variants={})
+                if profile.profile_picture:
+                    transaction.on_commit(partial(pictures.pipeline.submit, profile.id, profile.user_id, profile.profile_picture.name))
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)    
 
@@ -73,6 +91,8 @@ class UserDetailView(generics.RetrieveAPIView):
 #view to follow a user
 class FollowUserView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = WRITE_THROTTLES
+    throttle_scope = 'follow'
 
     def post(self, request, user_id):
         try: #find user to follow
@@ -83,7 +103,13 @@ class FollowUserView(APIView):
         if target_user == request.user:
             return Response({"detail": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
         #create follow relationship if none    
-        follow, created = Follow.objects.get_or_create(follower=request.user, following=target_user)    
+        with transaction.atomic():
+            follow, created = Follow.objects.get_or_create(follower=request.user, following=target_user)    
+            if created: #backfill the new author's recent posts into the follower's timeline
+                counters.follow_added(request.user.id, target_user.id)
+                recommendations.follow_added(request.user.id, target_user.id)
+                timeline.backfill(request.user.id, target_user.id)
+                live.following_changed(request.user.id, target_user.id, True)
         
         if not created: #already following
             return Response({"detail": "You are already following this user."}, status=status.HTTP_400_BAD_REQUEST)
@@ -100,7 +126,12 @@ class UnfollowUserView(APIView):
         
         try:
             follow = Follow.objects.get(follower=request.user, following=target_user)
-            follow.delete() #unfollow the user
+            with transaction.atomic():
+                follow.delete() #unfollow the user
+                counters.follow_removed(request.user.id, target_user.id)
+                recommendations.follow_removed(request.user.id, target_user.id)
+                timeline.trim(request.user.id, target_user.id) #drop their posts from the timeline
+                live.following_changed(request.user.id, target_user.id, False)
             return Response({"detail": f"You have unfollowed {target_user.username}."}, status=status.HTTP_204_NO_CONTENT)
         except Follow.DoesNotExist:#no follow relationship exists
             return Response({"detail": "You are not following this user."}, status=status.HTTP_400_BAD_REQUEST)
@@ -112,7 +143,9 @@ class FollowersListView(generics.ListAPIView):
     
     def get_queryset(self):
         user_id = self.kwargs['user_id']
-        return User.objects.filter(following__following__id=user_id)  # users who follow the target user
+        if settings.FOLLOW_GRAPH_INDEX: #page of follower ids from the index, then one query for those users
+            return Users(follow_graph.followers_of(user_id))
+        return User.objects.filter(following__following__id=user_id).order_by('id')  # users who follow the target user
     
 
 class FollowingListView(generics.ListAPIView):
@@ -121,6 +154,50 @@ class FollowingListView(generics.ListAPIView):
     
     def get_queryset(self):
         user_id = self.kwargs['user_id']
-        return User.objects.filter(followers__follower__id=user_id)  # users whom the target user follows
-    
+        if settings.FOLLOW_GRAPH_INDEX:
+            return Users(follow_graph.following_of(user_id))
+        return User.objects.filter(followers__follower__id=user_id).order_by('id')  # users whom the target user follows
+
+
+#---------------------------people you may know-------------------------
+#accounts followed by the accounts the user follows, most mutual friends first; ?limit= up to RECOMMENDATION_CACHE_SIZE
+class RecommendationsView(generics.ListAPIView):
+    serializer_class = UserSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None #a ranked shortlist, not a collection to page through
+
+    def get_queryset(self):
+        try:
+            limit = int(self.request.query_params.get('limit', settings.RECOMMENDATION_LIMIT))
+        except ValueError:
+            limit = settings.RECOMMENDATION_LIMIT
+        limit = max(1, min(limit, settings.RECOMMENDATION_CACHE_SIZE))
+        return Users(recommendations.for_user(self.request.user.id, limit))
+
+
+#---------------------------data export-------------------------
+#the authenticated user's account, posts, comments, likes and follows as streamed NDJSON (see users/export.py),
+#gzipped when the client accepts it; ?cursor=<type>:<id> of the last line received resumes an interrupted export
+class ExportView(APIView):
+    permission_classes = [IsAuthenticated]
 
+    def get(self, request):
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                export.parse_cursor(cursor)
+            except ValueError:
+                return Response({'cursor': 'Expected <type>:<id> from the last line received.'}, status=status.HTTP_400_BAD_REQUEST)
+        using = router.db_for_read(User) #decided now, the lines are read after the request has left the middleware
+        content = export.chunks(request.user.id, cursor, using)
+        compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+        if compress:
+            content = export.gzipped(content)
+        if isinstance(request._request, ASGIRequest): #streamed batch by batch there too
+            content = export.aiterate(content)
+        response = StreamingHttpResponse(content, content_type='application/x-ndjson')
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        response['Content-Disposition'] = f'attachment; filename="{request.user.username}.ndjson"'
+        return response